@@ -1,3 +1,4 @@
+import uuid
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List
 
@@ -7,8 +8,12 @@ from app.core.permissions import check_write_permission
 from app.schemas.testcase import (
     TestFolderCreate,
     TestFolderUpdate,
-    TestFolder as TestFolderSchema
+    TestFolder as TestFolderSchema,
+    FolderTreeNode
 )
+from app.schemas.job import Job as JobSchema
+from app.services.cascade_delete import delete_with_dependents
+from app.services.folder_tree import build_tree, folder_path, is_in_subtree, move_folder
 
 router = APIRouter(redirect_slashes=False)
 
@@ -23,6 +28,26 @@ def create_folder(
 
     folder_data = folder_in.dict()
     folder_data['owner_id'] = current_user['id']
+
+    parent = None
+    if folder_data.get('parent_id'):
+        parent = folders_collection.get(folder_data['parent_id'])
+        if not parent:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="상위 폴더를 찾을 수 없습니다"
+            )
+        if parent.get('project_id') != folder_data.get('project_id'):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="다른 프로젝트의 폴더 아래에 만들 수 없습니다"
+            )
+
+    # Materialized path needs the id up front
+    folder_data['id'] = str(uuid.uuid4())
+    folder_data['path'] = folder_path(folder_data['id'], parent)
+
+    # Requires migrations/add_folder_paths.sql, like move_folder() and build_tree()
     folder = folders_collection.create(folder_data)
     return folder
 
@@ -48,6 +73,15 @@ def list_folders(
     return folders
 
 
+@router.get("/tree", response_model=List[FolderTreeNode])
+def get_folder_tree(
+    project_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Folder tree of a project with per-folder and per-subtree test case counts"""
+    return build_tree(project_id)
+
+
 @router.get("/{folder_id}", response_model=TestFolderSchema)
 def get_folder(
     folder_id: str,
@@ -80,18 +114,43 @@ def update_folder(
     check_write_permission(current_user, "테스트 폴더")
 
     update_data = folder_in.dict(exclude_unset=True)
-    folders_collection.update(folder_id, update_data)
+
+    # Re-parenting also moves the whole subtree, so it goes through move_folder()
+    new_parent_id = update_data.pop('parent_id', folder.get('parent_id'))
+    if new_parent_id != folder.get('parent_id'):
+        if new_parent_id:
+            new_parent = folders_collection.get(new_parent_id)
+            if not new_parent:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="상위 폴더를 찾을 수 없습니다"
+                )
+            # Paths and subtree queries are per project
+            if new_parent.get('project_id') != folder.get('project_id'):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="다른 프로젝트의 폴더로 이동할 수 없습니다"
+                )
+            if is_in_subtree(folder, new_parent):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="폴더를 자기 자신 또는 하위 폴더로 이동할 수 없습니다"
+                )
+        move_folder(folder_id, new_parent_id)
+
+    if update_data:
+        folders_collection.update(folder_id, update_data)
 
     updated_folder = folders_collection.get(folder_id)
     return updated_folder
 
 
-@router.delete("/{folder_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{folder_id}", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def delete_folder(
     folder_id: str,
     current_user: dict = Depends(get_current_user_firestore)
 ):
-    """Delete a folder"""
+    """Delete a folder now; subfolders are removed and test cases moved out by a background job"""
     folder = folders_collection.get(folder_id)
     if not folder:
         raise HTTPException(
@@ -101,5 +160,5 @@ def delete_folder(
 
     check_write_permission(current_user, "테스트 폴더")
 
-    folders_collection.delete(folder_id)
-    return None
+    job = delete_with_dependents('folder', folder, created_by=current_user['id'])
+    return job.to_dict()
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.core.security import get_current_user_firestore
+from app.schemas.job import Job as JobSchema
+from app.services.jobs import job_manager
+
+router = APIRouter(redirect_slashes=False)
+
+
+@router.get("/{job_id}", response_model=JobSchema)
+def get_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Status of a background job (cascade deletes, imports); visible to its creator and admins"""
+    job = job_manager.get(job_id)
+    if not job or (job.created_by != current_user['id'] and current_user.get('role') != 'admin'):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    return job.to_dict()
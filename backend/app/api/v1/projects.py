@@ -5,6 +5,8 @@ from app.db.supabase import projects_collection
 from app.core.security import get_current_user_firestore
 from app.core.permissions import check_creation_permission, check_modification_permission
 from app.schemas.project import ProjectCreate, ProjectUpdate, Project as ProjectSchema
+from app.schemas.job import Job as JobSchema
+from app.services.cascade_delete import delete_with_dependents
 
 router = APIRouter(redirect_slashes=False)
 
@@ -103,15 +105,16 @@ def update_project(
     return updated_project
 
 
-@router.delete("/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{project_id}", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def delete_project(
     project_id: str,
     current_user: dict = Depends(get_current_user_firestore)
 ):
+    """Delete a project now; its test cases, runs, folders and issues are removed by a background job"""
     project = projects_collection.get(project_id)
 
     # Check modification permission (IDOR protection)
     check_modification_permission(project, current_user, "프로젝트")
 
-    projects_collection.delete(project_id)
-    return None
+    job = delete_with_dependents('project', project, created_by=current_user['id'])
+    return job.to_dict()
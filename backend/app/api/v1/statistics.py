@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, Query
-from typing import Optional
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Callable, Iterable, Optional
+from datetime import datetime, timedelta, timezone
+from collections import Counter, defaultdict
 
 from app.db.supabase import (
     projects_collection,
@@ -16,8 +16,18 @@ from app.schemas.statistics import (
     TestRunStatistics,
     TrendStatistics,
     TrendData,
-    DashboardStatistics
+    DashboardStatistics,
+    TopFailingTestCase,
+    TopFailureStatistics,
+    PassRateAnalytics,
+    FlipAnalytics,
+    EnvironmentFailureAnalytics,
+    FlakinessStatistics
 )
+from app.services.failure_index import failure_index
+from app.services.flakiness import flakiness_service
+from app.services.result_analytics import result_analytics
+from app.services.testresult_bulk import UNTESTED, status_counts
 
 router = APIRouter()
 
@@ -29,69 +39,128 @@ def calculate_pass_rate(passed: int, total: int) -> float:
     return round((passed / total) * 100, 2)
 
 
+def _parse_datetime(value) -> Optional[datetime]:
+    """Supabase 타임스탬프(ISO 문자열 또는 datetime)를 timezone-aware datetime으로 변환"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# ---------------------------------------------------------------------------
+# 스트리밍 집계 파이프라인
+#
+# 테이블 전체를 리스트로 올리지 않고 iter_rows()로 페이지 단위로 읽으면서
+# 각 행을 카운터(reducer)에 접어 넣는다. 메모리 사용량은 결과 수와 무관하게
+# 한 페이지 + 카운터 크기로 일정하다.
+# ---------------------------------------------------------------------------
+
+
+class CountBy:
+    """행을 필드 값별로 세는 reducer"""
+
+    def __init__(self, field: str, default=None):
+        self.field = field
+        self.default = default
+        self.total = 0
+        self.counts = Counter()
+
+    def __call__(self, row: dict) -> None:
+        self.total += 1
+        self.counts[row.get(self.field, self.default)] += 1
+
+
+class CountByDate:
+    """since 이후 행을 날짜 키별로 세는 reducer"""
+
+    def __init__(self, field: str, since: datetime, date_format: str = '%Y-%m-%d'):
+        self.field = field
+        self.since = since
+        self.date_format = date_format
+        self.counts = defaultdict(int)
+
+    def __call__(self, row: dict) -> None:
+        value = _parse_datetime(row.get(self.field))
+        if value and value >= self.since:
+            self.counts[value.strftime(self.date_format)] += 1
+
+
+def fold_rows(rows: Iterable[dict], *reducers: Callable[[dict], None]) -> None:
+    """행 스트림을 한 건씩 모든 reducer에 접어 넣음"""
+    for row in rows:
+        for reducer in reducers:
+            reducer(row)
+
+
+def _top_failing_testcases(limit: int, project_id: Optional[str] = None, window: Optional[int] = None):
+    """실패 인덱스에서 상위 K개 조회 후 테스트 케이스 제목을 한 번에 조인"""
+    top_failed = failure_index.top_failures(limit=limit, project_id=project_id, window_days=window)
+    if not top_failed:
+        return []
+
+    testcases = testcases_collection.query('id', 'in', [tc_id for tc_id, _ in top_failed])
+    testcases_by_id = {tc['id']: tc for tc in testcases}
+
+    items = []
+    for tc_id, fail_count in top_failed:
+        tc = testcases_by_id.get(tc_id)
+        if tc:
+            items.append(TopFailingTestCase(
+                id=tc_id,
+                title=tc.get('title', 'Unknown'),
+                failure_count=fail_count,
+                priority=tc.get('priority', 'medium')
+            ))
+    return items
+
+
 @router.get("/overall", response_model=OverallStatistics)
 def get_overall_statistics(
     current_user: dict = Depends(get_current_user_firestore)
 ):
     """전체 시스템 통계 조회"""
 
-    # 프로젝트, 테스트케이스, 테스트런 수집
-    projects = projects_collection.list(limit=1000)
-    testcases = testcases_collection.list(limit=10000)
-    testruns = testruns_collection.list(limit=10000)
-    testresults = testresults_collection.list(limit=50000)
+    # 테스트케이스: 우선순위/테스트 타입별 분포
+    priority_dist = CountBy('priority', 'medium')
+    type_dist = CountBy('test_type', 'functional')
+    fold_rows(
+        testcases_collection.iter_rows(columns=['priority', 'test_type']),
+        priority_dist, type_dist
+    )
 
-    # 기본 카운트
-    total_projects = len(projects)
-    total_testcases = len(testcases)
-    total_testruns = len(testruns)
-    total_results = len(testresults)
+    # 테스트런: 상태별 카운트 및 최근 7일간 활동
+    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
+    testrun_status = CountBy('status')
+    recent_activity = CountByDate('created_at', seven_days_ago)
+    fold_rows(
+        testruns_collection.iter_rows(columns=['status', 'created_at']),
+        testrun_status, recent_activity
+    )
 
-    # 테스트 실행 상태 카운트
-    active_testruns = sum(1 for tr in testruns if tr.get('status') in ['planned', 'in_progress'])
-    completed_testruns = sum(1 for tr in testruns if tr.get('status') == 'completed')
+    # 테스트 결과: 상태별 카운트
+    result_status = CountBy('status')
+    fold_rows(testresults_collection.iter_rows(columns=['status']), result_status)
 
     # 전체 합격률 계산
-    passed_results = sum(1 for r in testresults if r.get('status') == 'passed')
-    overall_pass_rate = calculate_pass_rate(passed_results, total_results)
-
-    # 우선순위별 분포
-    priority_dist = defaultdict(int)
-    for tc in testcases:
-        priority = tc.get('priority', 'medium')
-        priority_dist[priority] += 1
-
-    # 테스트 타입별 분포
-    type_dist = defaultdict(int)
-    for tc in testcases:
-        test_type = tc.get('test_type', 'functional')
-        type_dist[test_type] += 1
-
-    # 최근 7일간 활동
-    from datetime import timezone
-    recent_activity = defaultdict(int)
-    seven_days_ago = datetime.now(timezone.utc) - timedelta(days=7)
-    for tr in testruns:
-        created_at = tr.get('created_at')
-        if created_at and isinstance(created_at, datetime):
-            # Ensure timezone-aware comparison
-            if created_at.tzinfo is None:
-                created_at = created_at.replace(tzinfo=timezone.utc)
-            if created_at >= seven_days_ago:
-                date_key = created_at.strftime('%Y-%m-%d')
-                recent_activity[date_key] += 1
+    overall_pass_rate = calculate_pass_rate(result_status.counts['passed'], result_status.total)
 
     return OverallStatistics(
-        total_projects=total_projects,
-        total_testcases=total_testcases,
-        total_testruns=total_testruns,
-        total_results=total_results,
+        total_projects=projects_collection.count(),
+        total_testcases=priority_dist.total,
+        total_testruns=testrun_status.total,
+        total_results=result_status.total,
         overall_pass_rate=overall_pass_rate,
-        active_testruns=active_testruns,
-        completed_testruns=completed_testruns,
-        recent_activity=dict(recent_activity),
-        priority_distribution=dict(priority_dist),
-        test_type_distribution=dict(type_dist)
+        active_testruns=testrun_status.counts['planned'] + testrun_status.counts['in_progress'],
+        completed_testruns=testrun_status.counts['completed'],
+        recent_activity=dict(recent_activity.counts),
+        priority_distribution=dict(priority_dist.counts),
+        test_type_distribution=dict(type_dist.counts)
     )
 
 
@@ -111,35 +180,35 @@ def get_project_statistics(
             detail="Project not found"
         )
 
-    # 프로젝트의 테스트케이스, 테스트런, 결과 조회
-    testcases = testcases_collection.query('project_id', '==', project_id)
-    testruns = testruns_collection.query('project_id', '==', project_id)
-
-    # 테스트 결과 수집 (모든 테스트런의 결과)
-    all_results = []
-    for tr in testruns:
-        results = testresults_collection.query('testrun_id', '==', tr['id'])
-        all_results.extend(results)
+    # 프로젝트의 테스트케이스 수, 테스트런 ID
+    total_testcases = testcases_collection.count([('project_id', '==', project_id)])
+    testrun_ids = [
+        tr['id'] for tr in testruns_collection.iter_rows(
+            filters=[('project_id', '==', project_id)],
+            columns=['id']
+        )
+    ]
 
-    # 상태별 카운트
-    passed_count = sum(1 for r in all_results if r.get('status') == 'passed')
-    failed_count = sum(1 for r in all_results if r.get('status') == 'failed')
-    blocked_count = sum(1 for r in all_results if r.get('status') == 'blocked')
-    skipped_count = sum(1 for r in all_results if r.get('status') == 'skipped')
+    # 테스트 결과 상태별 카운트 (모든 테스트런의 결과를 스트리밍 집계)
+    result_status = CountBy('status')
+    fold_rows(
+        testresults_collection.iter_rows_in('testrun_id', testrun_ids, columns=['status']),
+        result_status
+    )
 
     # 합격률 계산
-    pass_rate = calculate_pass_rate(passed_count, len(all_results))
+    pass_rate = calculate_pass_rate(result_status.counts['passed'], result_status.total)
 
     return ProjectStatistics(
         project_id=project_id,
         project_name=project.get('name', 'Unknown'),
-        total_testcases=len(testcases),
-        total_testruns=len(testruns),
-        total_results=len(all_results),
-        passed_count=passed_count,
-        failed_count=failed_count,
-        blocked_count=blocked_count,
-        skipped_count=skipped_count,
+        total_testcases=total_testcases,
+        total_testruns=len(testrun_ids),
+        total_results=result_status.total,
+        passed_count=result_status.counts['passed'],
+        failed_count=counts['failed'],
+        blocked_count=counts['blocked'],
+        skipped_count=counts['skipped'],
         pass_rate=pass_rate
     )
 
@@ -160,20 +229,15 @@ def get_testrun_statistics(
             detail="Test run not found"
         )
 
-    # 테스트 결과 조회
-    results = testresults_collection.query('testrun_id', '==', testrun_id)
+    # 케이스별 최신 결과의 상태별 카운트 (결과가 없는 케이스는 untested, 결과 버전별 캐시)
+    counts = Counter(status_counts(testrun_id))
 
-    # 테스트 케이스 수 (test_case_ids는 Firestore에만 존재, Supabase에서는 testrun_testcases 테이블 사용)
-    # Supabase에서는 testrun_testcases junction table을 통해 테스트 케이스 수를 계산해야 함
-    # 현재는 결과 수로 대체
-    total_tests = len(results)
+    # 테스트런에 포함된 테스트 케이스 수 (testrun_testcases 기준)
+    total_tests = sum(counts.values())
 
     # 상태별 카운트
-    tested_count = sum(1 for r in results if r.get('status') != 'untested')
-    passed_count = sum(1 for r in results if r.get('status') == 'passed')
-    failed_count = sum(1 for r in results if r.get('status') == 'failed')
-    blocked_count = sum(1 for r in results if r.get('status') == 'blocked')
-    skipped_count = sum(1 for r in results if r.get('status') == 'skipped')
+    tested_count = total_tests - counts[UNTESTED]
+    passed_count = counts['passed']
 
     # 진행률 및 합격률
     progress = calculate_pass_rate(tested_count, total_tests) if total_tests > 0 else 0.0
@@ -186,9 +250,9 @@ def get_testrun_statistics(
         total_tests=total_tests,
         tested_count=tested_count,
         passed_count=passed_count,
-        failed_count=failed_count,
-        blocked_count=blocked_count,
-        skipped_count=skipped_count,
+        failed_count=counts['failed'],
+        blocked_count=counts['blocked'],
+        skipped_count=counts['skipped'],
         pass_rate=pass_rate,
         progress=progress,
         created_at=testrun.get('created_at'),
@@ -203,7 +267,6 @@ def get_trend_statistics(
     current_user: dict = Depends(get_current_user_firestore)
 ):
     """추세 통계 조회 (시간별 합격률 추이)"""
-    from datetime import timezone
 
     # 기간 계산 (timezone-aware)
     now = datetime.now(timezone.utc)
@@ -220,40 +283,34 @@ def get_trend_statistics(
         start_date = now - timedelta(days=365)
         date_format = '%Y-%m'
 
-    # 테스트런 조회
+    # 기간 내 테스트런 조회 (기간 필터는 DB에서 적용)
+    filters = [('created_at', '>=', start_date.isoformat())]
     if project_id:
-        testruns = testruns_collection.query('project_id', '==', project_id)
-    else:
-        testruns = testruns_collection.list(limit=10000)
-
-    # 날짜별 데이터 수집
-    date_data = defaultdict(lambda: {'total': 0, 'passed': 0, 'failed': 0})
-
-    for tr in testruns:
-        created_at = tr.get('created_at')
-        if not created_at or not isinstance(created_at, datetime):
-            continue
+        filters.append(('project_id', '==', project_id))
 
-        # Ensure created_at is timezone-aware for comparison
-        if created_at.tzinfo is None:
-            created_at = created_at.replace(tzinfo=timezone.utc)
+    run_date_keys = {}
+    for tr in testruns_collection.iter_rows(filters=filters, columns=['created_at']):
+        created_at = _parse_datetime(tr.get('created_at'))
+        if created_at and created_at >= start_date:
+            run_date_keys[tr['id']] = created_at.strftime(date_format)
 
-        if created_at < start_date:
-            continue
-
-        date_key = created_at.strftime(date_format)
-
-        # 해당 테스트런의 결과 조회
-        results = testresults_collection.query('testrun_id', '==', tr['id'])
+    # 날짜별 데이터 수집 (테스트런 결과를 스트리밍 집계)
+    date_data = defaultdict(lambda: {'total': 0, 'passed': 0, 'failed': 0})
 
-        for r in results:
-            status = r.get('status')
-            if status in ['passed', 'failed', 'blocked', 'skipped']:
-                date_data[date_key]['total'] += 1
-                if status == 'passed':
-                    date_data[date_key]['passed'] += 1
-                elif status == 'failed':
-                    date_data[date_key]['failed'] += 1
+    def count_result(r: dict) -> None:
+        status = r.get('status')
+        if status in ['passed', 'failed', 'blocked', 'skipped']:
+            data = date_data[run_date_keys[r['testrun_id']]]
+            data['total'] += 1
+            if status == 'passed':
+                data['passed'] += 1
+            elif status == 'failed':
+                data['failed'] += 1
+
+    fold_rows(
+        testresults_collection.iter_rows_in('testrun_id', run_date_keys, columns=['testrun_id', 'status']),
+        count_result
+    )
 
     # TrendData 리스트 생성
     trend_list = []
@@ -275,6 +332,91 @@ def get_trend_statistics(
     )
 
 
+@router.get("/top-failures", response_model=TopFailureStatistics)
+def get_top_failures(
+    project_id: Optional[str] = None,
+    window: Optional[int] = Query(None, ge=1, le=365),
+    limit: int = Query(5, ge=1, le=100),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """자주 실패하는 테스트 케이스 TOP K (window: 최근 N일)"""
+    return TopFailureStatistics(
+        project_id=project_id,
+        window=window,
+        items=_top_failing_testcases(limit=limit, project_id=project_id, window=window)
+    )
+
+
+def _get_project_or_404(project_id: str) -> dict:
+    project = projects_collection.get(project_id)
+    if not project:
+        from fastapi import HTTPException, status
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return project
+
+
+@router.get("/analytics/pass-rates", response_model=PassRateAnalytics)
+def get_pass_rate_analytics(
+    project_id: str,
+    last_runs: int = Query(20, ge=1, le=500),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """테스트 케이스별 최근 N회 실행 합격률"""
+    _get_project_or_404(project_id)
+    return PassRateAnalytics(
+        project_id=project_id,
+        last_runs=last_runs,
+        items=result_analytics.pass_rates(project_id, last_runs)
+    )
+
+
+@router.get("/analytics/flips", response_model=FlipAnalytics)
+def get_flip_analytics(
+    project_id: str,
+    testcase_id: Optional[str] = None,
+    last_runs: Optional[int] = Query(None, ge=2, le=500),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """통과 ↔ 실패로 상태가 뒤바뀐 실행 목록"""
+    _get_project_or_404(project_id)
+    return FlipAnalytics(
+        project_id=project_id,
+        items=result_analytics.flips(project_id, testcase_id, last_runs)
+    )
+
+
+@router.get("/analytics/env-failures", response_model=EnvironmentFailureAnalytics)
+def get_environment_failure_analytics(
+    project_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """모든 환경에서 실패 중인 테스트 케이스"""
+    _get_project_or_404(project_id)
+    return EnvironmentFailureAnalytics(
+        project_id=project_id,
+        items=result_analytics.failing_on_every_environment(project_id)
+    )
+
+
+@router.get("/flakiness", response_model=FlakinessStatistics)
+def get_flakiness_statistics(
+    project_id: str,
+    window: int = Query(20, ge=2, le=200),
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """불안정한(flaky) 테스트 케이스 점수 (최근 N회 실행 기준, 점수 내림차순)"""
+    _get_project_or_404(project_id)
+    return FlakinessStatistics(
+        project_id=project_id,
+        window=window,
+        items=flakiness_service.ranked(project_id, window, limit)
+    )
+
+
 @router.get("/dashboard", response_model=DashboardStatistics)
 def get_dashboard_statistics(
     days: int = Query(7, ge=1, le=365),
@@ -285,31 +427,24 @@ def get_dashboard_statistics(
     # 전체 통계
     overall = get_overall_statistics(current_user)
 
+    # 최근 항목은 DB에서 정렬해 상위 5개만 조회 (ORDER BY ... DESC LIMIT 5)
     # 최근 프로젝트 (5개)
-    from datetime import timezone
-    min_datetime = datetime.min.replace(tzinfo=timezone.utc)
-    projects = projects_collection.list(limit=1000)
-    recent_projects = sorted(
-        projects,
-        key=lambda x: x.get('updated_at', min_datetime),
-        reverse=True
-    )[:5]
+    recent_projects = projects_collection.page(
+        order_by='updated_at', descending=True, limit=5,
+        columns=['id', 'name', 'key', 'updated_at']
+    )
 
     # 최근 테스트케이스 (5개)
-    testcases = testcases_collection.list(limit=1000)
-    recent_testcases = sorted(
-        testcases,
-        key=lambda x: x.get('updated_at', min_datetime),
-        reverse=True
-    )[:5]
+    recent_testcases = testcases_collection.page(
+        order_by='updated_at', descending=True, limit=5,
+        columns=['id', 'title', 'priority', 'test_type', 'updated_at']
+    )
 
     # 최근 테스트런 (5개, 통계 포함)
-    testruns = testruns_collection.list(limit=1000)
-    recent_testruns_data = sorted(
-        testruns,
-        key=lambda x: x.get('created_at', min_datetime),
-        reverse=True
-    )[:5]
+    recent_testruns_data = testruns_collection.page(
+        order_by='created_at', descending=True, limit=5,
+        columns=['id', 'created_at']
+    )
 
     recent_testruns = []
     for tr in recent_testruns_data:
@@ -317,28 +452,7 @@ def get_dashboard_statistics(
         recent_testruns.append(tr_stats)
 
     # 자주 실패하는 테스트케이스 TOP 5
-    testcase_failures = defaultdict(int)
-    all_results = testresults_collection.list(limit=50000)
-
-    for r in all_results:
-        if r.get('status') == 'failed':
-            testcase_id = r.get('testcase_id')  # Supabase uses testcase_id
-            if testcase_id:
-                testcase_failures[testcase_id] += 1
-
-    # 실패 횟수로 정렬
-    top_failed = sorted(testcase_failures.items(), key=lambda x: x[1], reverse=True)[:5]
-
-    top_failed_testcases = []
-    for tc_id, fail_count in top_failed:
-        tc = testcases_collection.get(tc_id)
-        if tc:
-            top_failed_testcases.append({
-                'id': tc_id,
-                'title': tc.get('title', 'Unknown'),
-                'failure_count': fail_count,
-                'priority': tc.get('priority', 'medium')
-            })
+    top_failed_testcases = [item.dict() for item in _top_failing_testcases(limit=5)]
 
     return DashboardStatistics(
         overall=overall,
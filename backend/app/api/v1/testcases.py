@@ -1,16 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
 from fastapi.responses import StreamingResponse
-from typing import List
+from typing import List, Optional
 from io import BytesIO
-from openpyxl import Workbook, load_workbook
+from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
 from pydantic import BaseModel
 
-from app.db.supabase import testcases_collection, testcase_history_collection, projects_collection
+from app.db.supabase import call_rpc, testcases_collection, projects_collection, folders_collection
 from app.core.security import get_current_user_firestore
 from app.core.permissions import check_write_permission
-from app.schemas.testcase import TestCaseCreate, TestCaseUpdate, TestCase as TestCaseSchema
+from app.schemas.testcase import (
+    TestCaseCreate,
+    TestCaseUpdate,
+    TestCase as TestCaseSchema,
+    TestCaseBulkCreate,
+    TestCaseBulkUpdate,
+    TestCaseBulkMove,
+    BulkOperationResult,
+    TestCaseHistoryDiff,
+    TestCaseSearchResult,
+    TestCaseFacets,
+    DuplicateClusters
+)
 from app.services.ai_testcase_generator import generate_testcases_from_prd
+from app.services import change_events
+from app.services.flakiness import flakiness_service
+from app.services.testcase_import import import_testcase_rows, iter_excel_rows, submit_excel_import
+from app.services.jobs import job_manager
+from app.services.testcase_export import EXPORTERS, EXPORT_FORMATS
+from app.services.cascade_delete import delete_with_dependents
+from app.services.testcase_bulk import bulk_create, bulk_move, bulk_update
+from app.services.testcase_versions import update_versions
+from app.services.testcase_history import history_store
+from app.services import testcase_search
+from app.services.testcase_facets import facet_index
+from app.services.testcase_similarity import similarity_index
+from app.schemas.job import Job as JobSchema
 
 router = APIRouter(redirect_slashes=False)
 
@@ -66,7 +91,8 @@ def create_testcase(
             testcase = testcases_collection.create(testcase_data)
         else:
             raise e
-            
+
+    change_events.publish('testcase', None, testcase)
     return testcase
 
 
@@ -75,16 +101,144 @@ def list_testcases(
     project_id: str = None,
     skip: int = 0,
     limit: int = 100,
+    sort: Optional[str] = Query(None, regex='^flakiness$'),
+    tags: Optional[str] = Query(None, description="Comma-separated tags"),
+    tag_mode: str = Query('and', regex='^(and|or)$'),
+    folder_id: Optional[str] = None,
+    recursive: bool = False,
     current_user: dict = Depends(get_current_user_firestore)
 ):
+    if sort and not project_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="sort=flakiness requires project_id"
+        )
+
+    filters = []
     if project_id:
+        filters.append(('project_id', '==', project_id))
+    tag_list = [t.strip() for t in tags.split(',') if t.strip()] if tags else []
+    if tag_list:
+        # AND: case has every tag (@>), OR: case has any of them (&&)
+        filters.append(('tags', 'contains' if tag_mode == 'and' else 'overlaps', tag_list))
+
+    if folder_id and recursive:
+        # Folder and all of its subfolders, via the folders' materialized paths
+        testcases = call_rpc('list_subtree_testcases', {'p_folder_id': folder_id}, filters)
+    elif folder_id or tag_list:
+        if folder_id:
+            filters.append(('folder_id', '==', folder_id))
+        testcases = testcases_collection.query_complex(filters)
+    elif project_id:
         testcases = testcases_collection.query('project_id', '==', project_id)
     else:
         testcases = testcases_collection.list(limit=limit)
 
+    if sort == 'flakiness':
+        # Most flaky first; cases without results keep their relative order at the end
+        scores = flakiness_service.scores(project_id)
+        testcases.sort(key=lambda tc: scores.get(tc['id'], {}).get('score', -1.0), reverse=True)
+
     return testcases[skip:skip+limit]
 
 
+@router.get("/facets", response_model=TestCaseFacets)
+def get_testcase_facets(
+    project_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Test case counts by tag, priority, test type and folder in one call"""
+    return facet_index.facets(project_id)
+
+
+@router.get("/export")
+def export_testcases(
+    project_id: str,
+    format: str = Query('xlsx', regex='^(xlsx|csv|jsonl)$'),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Export all test cases of a project as a streamed xlsx/csv/jsonl download"""
+    project = projects_collection.get(project_id)
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+
+    filename = f"testcases_{project.get('key') or project_id}.{format}"
+    return StreamingResponse(
+        EXPORTERS[format](project),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@router.post("/bulk", response_model=BulkOperationResult)
+def bulk_create_testcases(
+    bulk_in: TestCaseBulkCreate,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Create many test cases at once; invalid items are reported, not fatal"""
+    check_write_permission(current_user, "테스트케이스")
+    return bulk_create(bulk_in.items, current_user.get('id')).to_dict()
+
+
+@router.patch("/bulk", response_model=BulkOperationResult)
+def bulk_update_testcases(
+    bulk_in: TestCaseBulkUpdate,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Update many test cases at once, recording a history version for each"""
+    check_write_permission(current_user, "테스트케이스")
+    return bulk_update(bulk_in.items, current_user['id']).to_dict()
+
+
+@router.post("/bulk/move", response_model=BulkOperationResult)
+def bulk_move_testcases(
+    move_in: TestCaseBulkMove,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Move many test cases into a folder (or to the project root) in one statement per chunk"""
+    check_write_permission(current_user, "테스트케이스")
+
+    project_id = None
+    if move_in.folder_id:
+        folder = folders_collection.get(move_in.folder_id)
+        if not folder:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Folder not found"
+            )
+        # Cases can only move into a folder of their own project
+        project_id = folder['project_id']
+
+    return bulk_move(move_in.testcase_ids, move_in.folder_id, project_id).to_dict()
+
+
+@router.get("/search", response_model=TestCaseSearchResult)
+def search_testcases(
+    q: str = Query(..., min_length=1, max_length=200),
+    project_id: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Ranked full-text search over title, description, steps, expected result and tags"""
+    total, items = testcase_search.search(q, project_id=project_id, skip=skip, limit=limit)
+    return {"total": total, "items": items}
+
+
+@router.get("/duplicates", response_model=DuplicateClusters)
+def get_duplicate_testcases(
+    project_id: str,
+    threshold: float = Query(0.7, ge=0.5, le=1.0),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Clusters of near-duplicate test cases in a project (MinHash similarity)"""
+    clusters = similarity_index.clusters(project_id, threshold=threshold)
+    return {"project_id": project_id, "threshold": threshold, "clusters": clusters}
+
+
 @router.get("/{testcase_id}", response_model=TestCaseSchema)
 def get_testcase(
     testcase_id: str,
@@ -115,43 +269,26 @@ def update_testcase(
             detail="Test case not found"
         )
 
-    # Get current version number
-    history_records = testcase_history_collection.query('testcase_id', '==', testcase_id)
-    new_version = len(history_records) + 1
-
-    # Save current state to history before updating
-    history_data = {
-        'testcase_id': testcase_id,
-        'version': new_version,
-        'title': testcase.get('title'),
-        'description': testcase.get('description'),
-        'preconditions': testcase.get('preconditions'),
-        'steps': testcase.get('steps'),
-        'expected_result': testcase.get('expected_result'),
-        'priority': testcase.get('priority'),
-        'test_type': testcase.get('test_type'),
-        'modified_by': current_user['id'],  # Supabase uses modified_by instead of changed_by
-        'change_note': testcase_in.dict().get('change_note', None)  # Pydantic v1 uses .dict()
-    }
-    testcase_history_collection.create(history_data)
-
-    # Update testcase
+    # Update testcase and save its previous state to history in one statement
     update_data = testcase_in.dict(exclude_unset=True)  # Pydantic v1 uses .dict()
-    if 'change_note' in update_data:
-        del update_data['change_note']
-
-    testcases_collection.update(testcase_id, update_data)
+    change_note = update_data.pop('change_note', None)
+    updated_testcase = update_versions([(testcase, update_data, change_note)], current_user['id']).get(testcase_id)
+    if not updated_testcase:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Test case was modified by another request; reload and try again"
+        )
 
-    # Return updated testcase
-    updated_testcase = testcases_collection.get(testcase_id)
+    change_events.publish('testcase', testcase, updated_testcase)
     return updated_testcase
 
 
-@router.delete("/{testcase_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{testcase_id}", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def delete_testcase(
     testcase_id: str,
     current_user: dict = Depends(get_current_user_firestore)
 ):
+    """Delete a test case now; its history, results and run links are removed by a background job"""
     # Check if user has permission to delete test cases (viewer and developer cannot delete)
     check_write_permission(current_user, "테스트케이스")
 
@@ -162,15 +299,19 @@ def delete_testcase(
             detail="Test case not found"
         )
 
-    testcases_collection.delete(testcase_id)
-    return None
+    job = delete_with_dependents('testcase', testcase, created_by=current_user['id'])
+    return job.to_dict()
 
 
 @router.get("/{testcase_id}/history")
 def get_testcase_history(
     testcase_id: str,
+    version: Optional[int] = Query(None, ge=1),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
     current_user: dict = Depends(get_current_user_firestore)
 ):
+    """History records newest first, paginated; ?version= returns a single version"""
     testcase = testcases_collection.get(testcase_id)
     if not testcase:
         raise HTTPException(
@@ -178,11 +319,40 @@ def get_testcase_history(
             detail="Test case not found"
         )
 
-    history_records = testcase_history_collection.query('testcase_id', '==', testcase_id)
-    # Sort by version descending
-    history_records.sort(key=lambda x: x.get('version', 0), reverse=True)
+    if version is not None:
+        record = history_store.get_version(testcase, version)
+        if not record:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="History version not found"
+            )
+        return record
+
+    return history_store.get_page(testcase, skip=skip, limit=limit)
+
+
+@router.get("/{testcase_id}/history/diff", response_model=TestCaseHistoryDiff)
+def get_testcase_history_diff(
+    testcase_id: str,
+    from_version: int = Query(..., alias="from", ge=1),
+    to_version: int = Query(..., alias="to", ge=1),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Field-by-field, line-level diff between two versions (the current version included)"""
+    testcase = testcases_collection.get(testcase_id)
+    if not testcase:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test case not found"
+        )
 
-    return history_records
+    diff = history_store.diff_versions(testcase, from_version, to_version)
+    if diff is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="History version not found"
+        )
+    return diff
 
 
 @router.get("/template/download")
@@ -278,7 +448,7 @@ def download_template(
 
 
 @router.post("/import/excel")
-async def import_excel(
+def import_excel(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user_firestore)
 ):
@@ -293,69 +463,9 @@ async def import_excel(
         )
 
     try:
-        # Read Excel file
-        contents = await file.read()
-        wb = load_workbook(BytesIO(contents))
-        ws = wb.active
-
-        # Skip header row
-        imported_count = 0
-        errors = []
-
-        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-            if not row or not any(row):  # Skip empty rows
-                continue
-
-            try:
-                project_name, title, description, preconditions, steps, expected_result, priority, test_type = row[:8]
-
-                # Validate required fields
-                if not all([project_name, title, steps, expected_result, priority, test_type]):
-                    errors.append(f"행 {row_num}: 필수 필드가 누락되었습니다")
-                    continue
-
-                # Find project by name
-                projects = projects_collection.query('name', '==', str(project_name))
-                if not projects:
-                    errors.append(f"행 {row_num}: 프로젝트 '{project_name}'을(를) 찾을 수 없습니다")
-                    continue
-
-                project = projects[0]
-                project_id = project['id']
-
-                # Validate priority
-                if priority not in ['high', 'medium', 'low']:
-                    errors.append(f"행 {row_num}: 우선순위는 high, medium, low 중 하나여야 합니다")
-                    continue
-
-                # Validate test_type
-                if test_type not in ['functional', 'regression', 'smoke', 'integration', 'performance', 'security']:
-                    errors.append(f"행 {row_num}: 테스트 유형은 functional, regression, smoke, integration, performance, security 중 하나여야 합니다")
-                    continue
-
-                # Create test case
-                testcase_data = {
-                    'project_id': str(project_id),
-                    'title': str(title),
-                    'description': str(description) if description else None,
-                    'preconditions': str(preconditions) if preconditions else None,
-                    'steps': str(steps),
-                    'expected_result': str(expected_result),
-                    'priority': str(priority),
-                    'test_type': str(test_type)
-                }
-
-                testcases_collection.create(testcase_data)
-                imported_count += 1
-
-            except Exception as e:
-                errors.append(f"행 {row_num}: {str(e)}")
-
-        return {
-            "imported_count": imported_count,
-            "errors": errors,
-            "success": imported_count > 0
-        }
+        # Stream rows straight from the (spooled) upload with a read-only workbook
+        report = import_testcase_rows(iter_excel_rows(file.file))
+        return report.to_dict()
 
     except Exception as e:
         raise HTTPException(
@@ -364,6 +474,43 @@ async def import_excel(
         )
 
 
+@router.post("/import/jobs", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
+def create_import_job(
+    file: UploadFile = File(...),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Start a background import of an Excel file; poll GET /import/jobs/{job_id} for progress"""
+    check_write_permission(current_user, "테스트케이스")
+
+    if not file.filename.endswith('.xlsx'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only Excel files (.xlsx) are allowed"
+        )
+
+    job = submit_excel_import(file.file, created_by=current_user['id'])
+    return job.to_dict()
+
+
+@router.get("/import/jobs/{job_id}", response_model=JobSchema)
+def get_import_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Import job status: rows processed / inserted / failed and per-row errors"""
+    job = job_manager.get(job_id)
+    if (
+        not job
+        or not job.kind.startswith('testcase_import')
+        or (job.created_by != current_user['id'] and current_user.get('role') != 'admin')
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
+    return job.to_dict()
+
+
 @router.post("/ai/generate", response_model=AIGenerateResponse)
 def generate_testcases_with_ai(
     request: AIGenerateRequest,
@@ -388,6 +535,10 @@ def generate_testcases_with_ai(
             project_name=project.get('name', '')
         )
 
+        # Flag generated cases that look like existing ones so the user can drop them
+        for testcase in generated_testcases:
+            testcase['possible_duplicates'] = similarity_index.find_similar(request.project_id, testcase)
+
         # Return generated test cases (not saved to database yet - user can review and edit)
         return AIGenerateResponse(
             testcases=generated_testcases,
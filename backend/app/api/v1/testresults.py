@@ -4,6 +4,8 @@ from typing import List
 from app.db.supabase import testresults_collection
 from app.core.security import get_current_user_firestore
 from app.core.permissions import check_write_permission
+from app.services import change_events
+from app.services.testresult_bulk import RESULT_FIELDS, ResultReport, upsert_results
 from app.schemas.testrun import (
     TestResultCreate,
     TestResultUpdate,
@@ -36,15 +38,21 @@ def create_testresult(
     # Check if user has permission to create test results (viewer and developer cannot create)
     check_write_permission(current_user, "테스트 결과")
 
-    from datetime import datetime
-    result_data = result_in.dict()  # Pydantic v1 uses .dict()
-
-    # Use Supabase field names
-    result_data['executed_by'] = current_user['id']
-    result_data['executed_at'] = datetime.utcnow().isoformat()
+    # The case's result in the run is updated if it already has one
+    # (one result per case and run, see migrations/add_testresult_run_case_unique.sql)
+    fields = result_in.dict(include=set(RESULT_FIELDS), exclude_unset=True)
+    if 'status' in fields:
+        fields['status'] = result_in.status.value
 
-    result = testresults_collection.create(result_data)
-    return result
+    report = ResultReport()
+    upsert_results(result_in.testrun_id, [(0, result_in.testcase_id, fields)], current_user['id'], report)
+    outcome = report.results[0]
+    if outcome['error']:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Test result could not be saved: {outcome['error']}"
+        )
+    return testresults_collection.get(outcome['id'])
 
 
 @router.get("/{result_id}", response_model=TestResultSchema)
@@ -88,6 +96,7 @@ def update_testresult(
 
     # Return updated result
     updated_result = testresults_collection.get(result_id)
+    change_events.publish('testresult', result, updated_result)
     return updated_result
 
 
@@ -104,4 +113,5 @@ def delete_testresult(
         )
 
     testresults_collection.delete(result_id)
+    change_events.publish('testresult', result, None)
     return None
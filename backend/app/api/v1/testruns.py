@@ -1,8 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
-import uuid
-
-from app.db.supabase import testruns_collection, testresults_collection, testrun_testcases_collection, users_collection
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+import xml.etree.ElementTree as ET
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import asyncio
+import json
+
+from app.db.supabase import (
+    folders_collection,
+    testcases_collection,
+    testruns_collection,
+    testresults_collection,
+    testrun_testcases_collection,
+    users_collection
+)
 from app.core.security import get_current_user_firestore
 from app.core.permissions import check_write_permission
 from app.schemas.testrun import (
@@ -11,12 +22,36 @@ from app.schemas.testrun import (
     TestRun as TestRunSchema,
     TestResultCreate,
     TestResultUpdate,
-    TestResult as TestResultSchema
+    TestResult as TestResultSchema,
+    TestResultStatus,
+    TestResultBulkResponse,
+    TestResultBulkSubmit,
+    JUnitIngestResult,
+    TestRunBundle,
+    TestRunComparison,
+    TestRunMembershipResult,
+    TestRunSelectionRules,
+    TestRunTestCasesChange
 )
+from app.schemas.job import Job as JobSchema
+from app.services import change_events
+from app.services.cascade_delete import delete_with_dependents
+from app.services.testrun_cache import testrun_cache
+from app.services.junit_ingest import ingest_junit
+from app.services.testresult_bulk import status_counts, submit_results
+from app.services.testrun_bundle import build_bundle, bundle_etag
+from app.services.testrun_clone import clone_testrun
+from app.services.testrun_compare import compare_runs
+from app.services.testrun_events import broker
+from app.services.testrun_selection import resolve_rules
+from app.services.testrun_membership import add_testcases, remove_testcases, sync_testcases
 from app.services.notifications import notify_testrun_assigned, notify_testrun_completed
 
 router = APIRouter(redirect_slashes=False)
 
+# Seconds between keep-alive comments on idle event streams
+EVENT_KEEPALIVE_SECONDS = 15
+
 
 def _get_testrun_testcase_ids(testrun_id: str) -> List[str]:
     """Get test case IDs for a test run from junction table"""
@@ -25,20 +60,34 @@ def _get_testrun_testcase_ids(testrun_id: str) -> List[str]:
 
 
 def _sync_testrun_testcases(testrun_id: str, testcase_ids: List[str]):
-    """Sync test case IDs in junction table for a test run"""
-    # Delete existing associations
-    existing = testrun_testcases_collection.query('testrun_id', '==', testrun_id)
-    for record in existing:
-        testrun_testcases_collection.delete(record['id'])
-
-    # Create new associations
-    for testcase_id in testcase_ids:
-        junction_data = {
-            'id': str(uuid.uuid4()),
-            'testrun_id': testrun_id,
-            'testcase_id': testcase_id
-        }
-        testrun_testcases_collection.create(junction_data)
+    """Sync test case IDs in junction table for a test run
+
+    Only the difference to the current membership is written.
+    """
+    sync_testcases(testrun_id, testcase_ids)
+
+
+def _get_testrun_for_write(testrun_id: str, current_user: dict) -> dict:
+    testrun = testruns_collection.get(testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+    check_write_permission(current_user, "테스트 실행")
+    return testrun
+
+
+def _resolve_selection(project_id: str, rules: TestRunSelectionRules) -> List[str]:
+    folder = None
+    if rules.folder_id:
+        folder = folders_collection.get(rules.folder_id)
+        if not folder or folder.get('project_id') != project_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="폴더를 찾을 수 없습니다"
+            )
+    return resolve_rules(project_id, rules.dict(), folder)
 
 
 @router.post("", response_model=TestRunSchema, status_code=status.HTTP_201_CREATED)
@@ -55,6 +104,12 @@ def create_testrun(
     # Extract test_case_ids (not stored in testruns table)
     test_case_ids = testrun_data.pop('test_case_ids', [])
 
+    # Resolve selection rules before creating anything, so a bad rule creates no run
+    testrun_data.pop('selection', None)
+    if testrun_in.selection:
+        selected = _resolve_selection(testrun_in.project_id, testrun_in.selection)
+        test_case_ids = list(dict.fromkeys(test_case_ids + selected))
+
     # Remove fields that don't exist in Supabase schema
     testrun_data.pop('milestone', None)
 
@@ -106,6 +161,22 @@ def list_testruns(
     return testruns[skip:skip+limit]
 
 
+@router.get("/compare", response_model=TestRunComparison)
+def compare_testruns(
+    base: str,
+    head: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Regressions and fixes between two runs (e.g. build A vs build B), by latest result per case"""
+    for testrun_id in (base, head):
+        if not testruns_collection.get(testrun_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Test run not found: {testrun_id}"
+            )
+    return compare_runs(base, head)
+
+
 @router.get("/{testrun_id}", response_model=TestRunSchema)
 def get_testrun(
     testrun_id: str,
@@ -124,6 +195,65 @@ def get_testrun(
     return testrun
 
 
+@router.get("/{testrun_id}/bundle", response_model=TestRunBundle)
+def get_testrun_bundle(
+    testrun_id: str,
+    request: Request,
+    response: Response,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Run, test case summaries, latest result per case and counters in one response
+
+    Supports revalidation: a matching If-None-Match gets 304 without a body.
+    """
+    testrun = testruns_collection.get(testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+
+    etag = bundle_etag(testrun)
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')} or if_none_match.strip() == '*':
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return build_bundle(testrun)
+
+
+@router.post("/{testrun_id}/clone", response_model=TestRunSchema, status_code=status.HTTP_201_CREATED)
+def clone_testrun_endpoint(
+    testrun_id: str,
+    only: Optional[str] = Query(None, description="Comma-separated latest result statuses to keep, e.g. failed,blocked"),
+    environment: Optional[str] = None,
+    name: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """New planned run with the cases of this one (or only those whose latest result is in `only`)"""
+    check_write_permission(current_user, "테스트 실행")
+    testrun = testruns_collection.get(testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+
+    statuses = None
+    if only:
+        statuses = list(dict.fromkeys(s.strip() for s in only.split(',') if s.strip()))
+        valid = {s.value for s in TestResultStatus}
+        invalid = [s for s in statuses if s not in valid]
+        if invalid or not statuses:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid status in only: {', '.join(invalid)} (allowed: {', '.join(sorted(valid))})"
+            )
+
+    return clone_testrun(testrun, statuses, environment=environment, name=name)
+
+
 @router.put("/{testrun_id}", response_model=TestRunSchema)
 def update_testrun(
     testrun_id: str,
@@ -215,11 +345,12 @@ def update_testrun(
     return updated_testrun
 
 
-@router.delete("/{testrun_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete("/{testrun_id}", response_model=JobSchema, status_code=status.HTTP_202_ACCEPTED)
 def delete_testrun(
     testrun_id: str,
     current_user: dict = Depends(get_current_user_firestore)
 ):
+    """Delete a test run now; its results and test case links are removed by a background job"""
     testrun = testruns_collection.get(testrun_id)
     if not testrun:
         raise HTTPException(
@@ -230,8 +361,77 @@ def delete_testrun(
     # Check if user has permission to delete test runs
     check_write_permission(current_user, "테스트 실행")
 
-    testruns_collection.delete(testrun_id)
-    return None
+    job = delete_with_dependents('testrun', testrun, created_by=current_user['id'])
+    return job.to_dict()
+
+
+@router.post("/{testrun_id}/testcases", response_model=TestRunMembershipResult)
+def add_testrun_testcases(
+    testrun_id: str,
+    change: TestRunTestCasesChange,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Add test cases to a run; cases that are already members are ignored"""
+    testrun = _get_testrun_for_write(testrun_id, current_user)
+
+    requested = list(dict.fromkeys(change.test_case_ids))
+    found = {
+        row['id']: row['project_id']
+        for row in testcases_collection.iter_rows_in('id', requested, columns=['project_id'])
+    }
+    missing = [testcase_id for testcase_id in requested if testcase_id not in found]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Test cases not found: {', '.join(missing[:20])}"
+        )
+    foreign = [testcase_id for testcase_id in requested if found[testcase_id] != testrun['project_id']]
+    if foreign:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Test cases belong to another project: {', '.join(foreign[:20])}"
+        )
+
+    added = add_testcases(testrun_id, requested)
+    return {
+        'testrun_id': testrun_id,
+        'added': added,
+        'total': testrun_testcases_collection.count([('testrun_id', '==', testrun_id)])
+    }
+
+
+@router.post("/{testrun_id}/testcases/select", response_model=TestRunMembershipResult)
+def select_testrun_testcases(
+    testrun_id: str,
+    rules: TestRunSelectionRules,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Add every test case of the run's project that matches the rules"""
+    testrun = _get_testrun_for_write(testrun_id, current_user)
+
+    added = add_testcases(testrun_id, _resolve_selection(testrun['project_id'], rules))
+    return {
+        'testrun_id': testrun_id,
+        'added': added,
+        'total': testrun_testcases_collection.count([('testrun_id', '==', testrun_id)])
+    }
+
+
+@router.delete("/{testrun_id}/testcases", response_model=TestRunMembershipResult)
+def remove_testrun_testcases(
+    testrun_id: str,
+    change: TestRunTestCasesChange,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Remove test cases from a run; their results are kept"""
+    _get_testrun_for_write(testrun_id, current_user)
+
+    removed_count = remove_testcases(testrun_id, change.test_case_ids)
+    return {
+        'testrun_id': testrun_id,
+        'removed_count': removed_count,
+        'total': testrun_testcases_collection.count([('testrun_id', '==', testrun_id)])
+    }
 
 
 @router.get("/{testrun_id}/results", response_model=List[TestResultSchema])
@@ -246,8 +446,125 @@ def get_testrun_results(
             detail="Test run not found"
         )
 
-    results = testresults_collection.query('testrun_id', '==', testrun_id)
-    return results
+    results = testrun_cache.get_or_compute(
+        'results', testrun_id,
+        lambda: testresults_collection.query('testrun_id', '==', testrun_id)
+    )
+    return list(results)
+
+
+@router.post("/{testrun_id}/results/bulk", response_model=TestResultBulkResponse)
+def submit_testrun_results(
+    testrun_id: str,
+    submission: TestResultBulkSubmit,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Record many verdicts at once; each case's current result is updated or created"""
+    testrun = testruns_collection.get(testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+    check_write_permission(current_user, "테스트 결과")
+
+    report = submit_results(testrun_id, submission.items, current_user['id'])
+
+    # Run counters once, after all writes
+    return {'testrun_id': testrun_id, **report.to_dict(), 'status_counts': status_counts(testrun_id)}
+
+
+@router.post("/{testrun_id}/results/junit", response_model=JUnitIngestResult)
+def ingest_junit_report(
+    testrun_id: str,
+    file: UploadFile = File(...),
+    add_missing: bool = Query(True, description="Add matched test cases that are not part of the run yet"),
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Record the results of a JUnit/xUnit XML report (pytest --junitxml, Surefire, ...)"""
+    testrun = testruns_collection.get(testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+    check_write_permission(current_user, "테스트 결과")
+
+    if not (file.filename or '').lower().endswith('.xml'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="JUnit XML 파일(.xml)만 업로드 가능합니다"
+        )
+
+    try:
+        return ingest_junit(
+            testrun_id, testrun['project_id'], file.file, current_user['id'], add_missing=add_missing
+        )
+    except ET.ParseError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid JUnit XML: {e}"
+        )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/{testrun_id}/events")
+async def stream_testrun_events(
+    testrun_id: str,
+    current_user: dict = Depends(get_current_user_firestore)
+):
+    """Server-Sent Events: a counter snapshot, then every result change and the updated counters
+
+    Events: `snapshot` and `counters` ({testrun_id, status_counts}, counted as
+    in the bundle), `result` ({result, deleted, previous_status}). Counters are
+    recounted (through the results-version cache) after each batch rather than
+    patched, so results racing with the snapshot are never counted twice.
+    After `snapshot` is sent again (the client fell behind), clients should
+    refetch the results list.
+    """
+    testrun = await run_in_threadpool(testruns_collection.get, testrun_id)
+    if not testrun:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Test run not found"
+        )
+
+    async def events():
+        subscription = broker.subscribe(testrun_id)
+        try:
+            counts = await run_in_threadpool(status_counts, testrun_id)
+            yield _sse('snapshot', {'testrun_id': testrun_id, 'status_counts': counts})
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), EVENT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+
+                # Send whatever has piled up, then one counters update for all of it
+                batch = [message]
+                while not subscription.queue.empty():
+                    batch.append(subscription.queue.get_nowait())
+                if any(item['type'] == 'resync' for item in batch):
+                    counts = await run_in_threadpool(status_counts, testrun_id)
+                    yield _sse('snapshot', {'testrun_id': testrun_id, 'status_counts': counts})
+                    continue
+
+                for item in batch:
+                    yield _sse('result', item)
+                counts = await run_in_threadpool(status_counts, testrun_id)
+                yield _sse('counters', {'testrun_id': testrun_id, 'status_counts': counts})
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/results", response_model=TestResultSchema, status_code=status.HTTP_201_CREATED)
@@ -258,6 +575,7 @@ def create_testresult(
     result_data = result_in.dict()  # Pydantic v1 uses .dict()
     result_data['tester_id'] = current_user['id']
     result = testresults_collection.create(result_data)
+    change_events.publish('testresult', None, result)
     return result
 
 
@@ -279,4 +597,5 @@ def update_testresult(
 
     # Return updated result
     updated_result = testresults_collection.get(result_id)
+    change_events.publish('testresult', result, updated_result)
     return updated_result
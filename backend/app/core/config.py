@@ -13,6 +13,8 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    # Live test run events: "memory" (single process) or "redis" (fan-out across workers via REDIS_URL)
+    EVENTS_BACKEND: str = "memory"
 
     # JWT
     SECRET_KEY: str
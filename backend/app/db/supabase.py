@@ -3,7 +3,7 @@ Supabase client configuration and helper functions
 """
 import os
 import uuid
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 from supabase import create_client, Client, ClientOptions
 from datetime import datetime, timezone
 
@@ -60,9 +60,19 @@ except Exception as e:
 class SupabaseCollection:
     """Helper class for Supabase table operations (similar to Firestore collection)"""
 
-    def __init__(self, table_name: str):
+    def __init__(self, table_name: str, soft_delete: bool = False):
         self.table_name = table_name
         self.table = supabase.table(table_name)
+        # Reads and updates skip rows with deleted_at set (migrations/add_soft_delete.sql)
+        self.soft_delete = soft_delete
+
+    def _live(self, query):
+        if self.soft_delete:
+            query = query.is_("deleted_at", "null")
+        return query
+
+    def _select(self, columns: str = "*", **kwargs):
+        return self._live(self.table.select(columns, **kwargs))
 
     def get(self, doc_id: str) -> Optional[Dict]:
         """Get a single document by ID"""
@@ -72,7 +82,7 @@ class SupabaseCollection:
 
         for attempt in range(max_retries):
             try:
-                result = self.table.select("*").eq("id", doc_id).execute()
+                result = self._select("*").eq("id", doc_id).execute()
                 if result.data and len(result.data) > 0:
                     return result.data[0]
                 return None
@@ -93,7 +103,7 @@ class SupabaseCollection:
 
         for attempt in range(max_retries):
             try:
-                result = self.table.select("*").eq(field, value).execute()
+                result = self._select("*").eq(field, value).execute()
                 if result.data and len(result.data) > 0:
                     return result.data[0]
                 return None
@@ -114,7 +124,7 @@ class SupabaseCollection:
 
         for attempt in range(max_retries):
             try:
-                result = self.table.select("*").range(offset, offset + limit - 1).execute()
+                result = self._select("*").range(offset, offset + limit - 1).execute()
                 return result.data or []
             except Exception as e:
                 error_msg = str(e).lower()
@@ -134,7 +144,7 @@ class SupabaseCollection:
 
         for attempt in range(max_retries):
             try:
-                query = self.table.select("*")
+                query = self._select("*")
 
                 if operator == "==":
                     query = query.eq(field, value)
@@ -183,13 +193,73 @@ class SupabaseCollection:
             return result.data[0]
         raise Exception("Failed to create document")
 
+    def create_many(self, rows: List[Dict], chunk_size: int = 500) -> List[Dict]:
+        """Create documents with one bulk INSERT per chunk
+
+        Ids and timestamps are filled in the same way as create().
+        """
+        now = datetime.utcnow().isoformat()
+        created = []
+        for i in range(0, len(rows), chunk_size):
+            chunk = []
+            for data in rows[i:i + chunk_size]:
+                data_copy = data.copy()
+                if 'id' not in data_copy or not data_copy['id']:
+                    data_copy['id'] = str(uuid.uuid4())
+                if 'created_at' not in data_copy:
+                    data_copy['created_at'] = now
+                if 'updated_at' not in data_copy and not self.table_name.endswith('_history'):
+                    data_copy['updated_at'] = now
+                chunk.append(data_copy)
+
+            result = self.table.insert(chunk).execute()
+            created.extend(result.data or [])
+        return created
+
+    def upsert_many(
+        self,
+        rows: List[Dict],
+        on_conflict: str = "id",
+        chunk_size: int = 500,
+        ignore_duplicates: bool = False
+    ) -> List[Dict]:
+        """INSERT ... ON CONFLICT DO UPDATE in chunks; rows must carry the conflict columns
+
+        With ignore_duplicates it is ON CONFLICT DO NOTHING, and only the
+        inserted rows are returned.
+        """
+        now = datetime.utcnow().isoformat()
+        upserted = []
+        for i in range(0, len(rows), chunk_size):
+            chunk = []
+            for data in rows[i:i + chunk_size]:
+                data_copy = data.copy()
+                if not self.table_name.endswith('_history'):
+                    data_copy['updated_at'] = now
+                chunk.append(data_copy)
+
+            result = self._execute_with_retry(
+                "upsert_many",
+                lambda: self.table.upsert(chunk, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
+            )
+            upserted.extend(result.data or [])
+        return upserted
+
+    def update_where(self, filters: List[tuple], data: Dict) -> List[Dict]:
+        """Apply the same update to every row matching filters; returns updated rows"""
+        data_copy = data.copy()
+        data_copy['updated_at'] = datetime.utcnow().isoformat()
+        query = self._live(self._apply_filters(self.table.update(data_copy), filters))
+        result = query.execute()
+        return result.data or []
+
     def update(self, doc_id: str, data: Dict) -> Dict:
         """Update a document"""
         # Add updated_at timestamp
         data_copy = data.copy()
         data_copy['updated_at'] = datetime.utcnow().isoformat()
 
-        result = self.table.update(data_copy).eq("id", doc_id).execute()
+        result = self._live(self.table.update(data_copy).eq("id", doc_id)).execute()
         if result.data and len(result.data) > 0:
             return result.data[0]
         raise Exception("Failed to update document")
@@ -198,13 +268,31 @@ class SupabaseCollection:
         """Delete a document"""
         self.table.delete().eq("id", doc_id).execute()
 
+    def mark_deleted(self, doc_id: str) -> None:
+        """Hide a document from reads until it is deleted (soft_delete collections)"""
+        now = datetime.utcnow().isoformat()
+        self.table.update({'deleted_at': now, 'updated_at': now}).eq("id", doc_id).execute()
+
+    def delete_where(self, filters: List[tuple]) -> int:
+        """Delete every row matching filters in one statement; returns the number deleted"""
+        result = self._execute_with_retry(
+            "delete_where",
+            lambda: self._apply_filters(self.table.delete(count="exact", returning="minimal"), filters)
+        )
+        return result.count or 0
+
     def query_complex(self, filters: List[tuple]) -> List[Dict]:
         """Complex query with multiple filters
         Args:
             filters: List of (field, operator, value) tuples
         """
-        query = self.table.select("*")
+        query = self._apply_filters(self._select("*"), filters)
+        result = query.execute()
+        return result.data or []
 
+    @staticmethod
+    def _apply_filters(query, filters: List[tuple]):
+        """Apply (field, operator, value) filter tuples to a query builder"""
         for field, operator, value in filters:
             if operator == "==":
                 query = query.eq(field, value)
@@ -220,18 +308,133 @@ class SupabaseCollection:
                 query = query.lte(field, value)
             elif operator == "in":
                 query = query.in_(field, value)
+            elif operator == "contains":  # array column contains all values
+                query = query.contains(field, value)
+            elif operator == "overlaps":  # array column contains any value
+                query = query.overlaps(field, value)
+            elif operator == "like":  # SQL LIKE pattern, e.g. a path prefix 'abc/%'
+                query = query.like(field, value)
+        return query
+
+    def _execute_with_retry(self, operation: str, build_query):
+        """Execute a freshly built query, retrying on transient connection errors"""
+        import time
+        max_retries = 3
+        retry_delay = 0.5
 
-        result = query.execute()
+        for attempt in range(max_retries):
+            try:
+                return build_query().execute()
+            except Exception as e:
+                error_msg = str(e).lower()
+                if attempt < max_retries - 1 and any(err in error_msg for err in ['timeout', 'connection', 'temporarily unavailable', 'resource']):
+                    print(f"⚠️  Retry {attempt + 1}/{max_retries} for {operation}({self.table_name}): {type(e).__name__}")
+                    time.sleep(retry_delay * (attempt + 1))
+                    continue
+                print(f"❌ Error in {operation}({self.table_name}): {type(e).__name__}: {e}")
+                raise
+
+    def iter_rows(
+        self,
+        filters: Optional[List[tuple]] = None,
+        columns: Optional[List[str]] = None,
+        page_size: int = 1000
+    ) -> Iterator[Dict]:
+        """Iterate over matching rows one page at a time
+
+        Uses keyset pagination on id, so only one page is held in memory and
+        deep pages cost the same as the first one.
+
+        Args:
+            filters: List of (field, operator, value) tuples
+            columns: Columns to fetch (id is always included); all if None
+            page_size: Rows fetched per round-trip
+        """
+        select = "*" if not columns else ",".join(dict.fromkeys(["id", *columns]))
+        last_id = None
+
+        while True:
+            def build_query():
+                query = self._apply_filters(self._select(select), filters or [])
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                return query.order("id").limit(page_size)
+
+            rows = self._execute_with_retry("iter_rows", build_query).data or []
+            yield from rows
+
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def iter_deleted(self, columns: Optional[List[str]] = None, page_size: int = 1000) -> Iterator[Dict]:
+        """Iterate over hidden rows (deleted_at set) of a soft_delete collection, keyset-paginated like iter_rows()"""
+        select = "*" if not columns else ",".join(dict.fromkeys(["id", *columns]))
+        last_id = None
+
+        while True:
+            def build_query():
+                query = self.table.select(select).not_.is_("deleted_at", "null")
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+                return query.order("id").limit(page_size)
+
+            rows = self._execute_with_retry("iter_deleted", build_query).data or []
+            yield from rows
+
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]["id"]
+
+    def iter_rows_in(
+        self,
+        field: str,
+        values: List[Any],
+        filters: Optional[List[tuple]] = None,
+        columns: Optional[List[str]] = None,
+        chunk_size: int = 100
+    ) -> Iterator[Dict]:
+        """iter_rows() over `field IN values`, split into chunks to keep URLs short"""
+        values = list(values)
+        for i in range(0, len(values), chunk_size):
+            chunk_filters = list(filters or []) + [(field, "in", values[i:i + chunk_size])]
+            yield from self.iter_rows(filters=chunk_filters, columns=columns)
+
+    def page(
+        self,
+        filters: Optional[List[tuple]] = None,
+        order_by: str = "id",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+        columns: Optional[List[str]] = None
+    ) -> List[Dict]:
+        """One ordered page of matching rows (LIMIT/OFFSET)"""
+        select = "*" if not columns else ",".join(columns)
+        result = self._execute_with_retry(
+            "page",
+            lambda: self._apply_filters(self._select(select), filters or [])
+                .order(order_by, desc=descending)
+                .range(offset, offset + limit - 1)
+        )
         return result.data or []
 
+    def count(self, filters: Optional[List[tuple]] = None) -> int:
+        """Count matching rows without transferring them"""
+        result = self._execute_with_retry(
+            "count",
+            lambda: self._apply_filters(self._select("id", count="exact"), filters or []).limit(1)
+        )
+        return result.count or 0
+
 
 # Initialize collections
 users_collection = SupabaseCollection("users")
-projects_collection = SupabaseCollection("projects")
-folders_collection = SupabaseCollection("folders")
-testcases_collection = SupabaseCollection("testcases")
+projects_collection = SupabaseCollection("projects", soft_delete=True)
+folders_collection = SupabaseCollection("folders", soft_delete=True)
+testcases_collection = SupabaseCollection("testcases", soft_delete=True)
 testcase_history_collection = SupabaseCollection("testcase_history")
-testruns_collection = SupabaseCollection("testruns")
+testruns_collection = SupabaseCollection("testruns", soft_delete=True)
 testrun_testcases_collection = SupabaseCollection("testrun_testcases")
 testresults_collection = SupabaseCollection("testresults")
 testresult_history_collection = SupabaseCollection("testresult_history")
@@ -239,6 +442,19 @@ issues_collection = SupabaseCollection("issues")
 issue_history_collection = SupabaseCollection("issue_history")
 
 
+def call_rpc(function_name: str, params: Dict, filters: Optional[List[tuple]] = None) -> List[Dict]:
+    """Call a Postgres function (see backend/migrations) and return its rows
+
+    filters are applied to the rows of set-returning functions, like query_complex().
+    """
+    query = SupabaseCollection._apply_filters(supabase.rpc(function_name, params), filters or [])
+    result = query.execute()
+    data = result.data
+    if data is None:
+        return []
+    return data if isinstance(data, list) else [data]
+
+
 # Supabase Storage for file uploads
 def upload_file(bucket_name: str, file_path: str, file_data: bytes) -> str:
     """Upload file to Supabase Storage
@@ -5,8 +5,9 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from app.core.config import settings
-from app.api.v1 import auth, projects, testcases, testruns, testresults, users, folders, statistics, issues
+from app.api.v1 import auth, projects, testcases, testruns, testresults, users, folders, statistics, issues, jobs
 from app.middleware import SecurityHeadersMiddleware
+from app.services.cascade_delete import start_sweeper
 import traceback
 
 # Rate limiter
@@ -128,6 +129,12 @@ async def rate_limit_middleware(request: Request, call_next):
     return await call_next(request)
 
 
+@app.on_event("startup")
+def resume_cascade_deletes():
+    """Finish cascade deletes interrupted by a restart, then keep sweeping for failed ones"""
+    start_sweeper()
+
+
 # Include routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
 app.include_router(projects.router, prefix=f"{settings.API_V1_STR}/projects", tags=["projects"])
@@ -138,6 +145,7 @@ app.include_router(testresults.router, prefix=f"{settings.API_V1_STR}/testresult
 app.include_router(users.router, prefix=f"{settings.API_V1_STR}/users", tags=["users"])
 app.include_router(statistics.router, prefix=f"{settings.API_V1_STR}/statistics", tags=["statistics"])
 app.include_router(issues.router, prefix=f"{settings.API_V1_STR}/issues", tags=["issues"])
+app.include_router(jobs.router, prefix=f"{settings.API_V1_STR}/jobs", tags=["jobs"])
 
 
 @app.get("/")
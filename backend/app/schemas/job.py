@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+
+class Job(BaseModel):
+    """백그라운드 작업 상태"""
+    id: str
+    kind: str
+    status: str  # 'pending', 'running', 'completed', 'failed'
+    progress: Dict[str, Any] = {}
+    errors: List[str] = []
+    result: Optional[Any] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
@@ -76,3 +76,73 @@ class DashboardStatistics(BaseModel):
     recent_testcases: List[Dict]
     recent_testruns: List[TestRunStatistics]
     top_failed_testcases: Optional[List[Dict]] = []
+
+
+class TopFailingTestCase(BaseModel):
+    """자주 실패하는 테스트 케이스"""
+    id: str
+    title: str
+    failure_count: int
+    priority: Optional[str] = None
+
+
+class TopFailureStatistics(BaseModel):
+    """실패 횟수 상위 테스트 케이스"""
+    project_id: Optional[str] = None
+    window: Optional[int] = None  # 최근 N일 (None이면 전체 기간)
+    items: List[TopFailingTestCase]
+
+
+class CasePassRate(BaseModel):
+    """테스트 케이스별 최근 N회 실행 합격률"""
+    testcase_id: str
+    runs: int
+    passed: int
+    failed: int
+    pass_rate: float
+
+
+class PassRateAnalytics(BaseModel):
+    project_id: str
+    last_runs: int
+    items: List[CasePassRate]
+
+
+class FlipEvent(BaseModel):
+    """통과/실패 상태가 뒤바뀐 실행"""
+    testcase_id: str
+    testrun_id: str
+    from_status: str
+    to_status: str
+
+
+class FlipAnalytics(BaseModel):
+    project_id: str
+    items: List[FlipEvent]
+
+
+class EnvironmentFailure(BaseModel):
+    """모든 환경에서 최근 결과가 실패인 테스트 케이스"""
+    testcase_id: str
+    environments: List[str]
+
+
+class EnvironmentFailureAnalytics(BaseModel):
+    project_id: str
+    items: List[EnvironmentFailure]
+
+
+class FlakinessScore(BaseModel):
+    """테스트 케이스 불안정성(flaky) 점수"""
+    testcase_id: str
+    runs: int
+    transition_rate: float  # 통과 ↔ 실패 전환 비율
+    entropy: float  # 상태 분포 엔트로피 (0~1)
+    env_divergence: float  # 환경별 합격률 차이 (0~1)
+    score: float
+
+
+class FlakinessStatistics(BaseModel):
+    project_id: str
+    window: int
+    items: List[FlakinessScore]
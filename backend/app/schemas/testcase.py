@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional, List
+from typing import Any, Optional, List
 from datetime import datetime
 from enum import Enum
 
@@ -80,6 +80,18 @@ class TestFolder(TestFolderInDB):
     pass
 
 
+class FolderTreeNode(BaseModel):
+    id: str
+    name: str
+    parent_id: Optional[str] = None
+    testcase_count: int  # Test cases directly in this folder
+    total_count: int  # Test cases in this folder and all subfolders
+    children: List['FolderTreeNode'] = []
+
+
+FolderTreeNode.update_forward_refs()
+
+
 class TestCaseBase(BaseModel):
     title: str = Field(..., min_length=1, max_length=500)
     description: Optional[str] = Field(None, max_length=5000)
@@ -173,6 +185,7 @@ class TestCaseUpdate(BaseModel):
 class TestCaseInDB(TestCaseBase):
     id: str  # Firestore uses string IDs
     project_id: str  # Firestore uses string IDs
+    version: Optional[int] = None  # Incremented on every update (see testcase_versions)
     created_at: datetime
     updated_at: datetime
 
@@ -182,3 +195,99 @@ class TestCaseInDB(TestCaseBase):
 
 class TestCase(TestCaseInDB):
     pass
+
+
+class HistoryDiffChunk(BaseModel):
+    type: str  # 'equal', 'insert', 'delete'
+    lines: List[str]
+
+
+class HistoryFieldDiff(BaseModel):
+    field: str
+    changed: bool
+    chunks: Optional[List[HistoryDiffChunk]] = None  # Text fields
+    old_value: Optional[Any] = None  # priority, test_type, tags
+    new_value: Optional[Any] = None
+
+
+class TestCaseHistoryDiff(BaseModel):
+    testcase_id: str
+    from_version: int
+    to_version: int
+    fields: List[HistoryFieldDiff]
+
+
+class TestCaseSearchHit(BaseModel):
+    id: str
+    project_id: Optional[str] = None
+    folder_id: Optional[str] = None
+    title: Optional[str] = None
+    priority: Optional[str] = None
+    test_type: Optional[str] = None
+    score: float
+
+
+class TestCaseSearchResult(BaseModel):
+    total: int
+    items: List[TestCaseSearchHit]
+
+
+class FacetCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+
+class TestCaseFacets(BaseModel):
+    project_id: str
+    total: int
+    tags: List[FacetCount]
+    priority: List[FacetCount]
+    test_type: List[FacetCount]
+    folder_id: List[FacetCount]
+
+
+class SimilarTestCase(BaseModel):
+    id: str
+    title: str
+    similarity: float  # Estimated Jaccard similarity of the case texts
+
+
+class DuplicateCluster(BaseModel):
+    size: int
+    max_similarity: float
+    testcases: List[SimilarTestCase]
+
+
+class DuplicateClusters(BaseModel):
+    project_id: str
+    threshold: float
+    clusters: List[DuplicateCluster]
+
+
+class TestCaseBulkCreate(BaseModel):
+    # Items are validated one by one against TestCaseCreate so errors are reported per item
+    items: List[dict] = Field(..., min_items=1, max_items=1000)
+
+
+class TestCaseBulkUpdate(BaseModel):
+    # Each item is {"id": ..., <TestCaseUpdate fields>}
+    items: List[dict] = Field(..., min_items=1, max_items=1000)
+
+
+class TestCaseBulkMove(BaseModel):
+    testcase_ids: List[str] = Field(..., min_items=1, max_items=5000)
+    folder_id: Optional[str] = None  # None moves the cases to the project root
+
+
+class BulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status: str  # 'created', 'updated', 'moved', 'error'
+    version: Optional[int] = None  # New version of updated test cases
+    error: Optional[str] = None
+
+
+class BulkOperationResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
@@ -1,8 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
 from datetime import datetime
 from enum import Enum
 
+from app.schemas.testcase import TestPriority, TestType
+
 
 class TestRunStatus(str, Enum):
     PLANNED = "planned"
@@ -28,9 +30,24 @@ class TestRunBase(BaseModel):
     milestone: Optional[str] = None
 
 
+class TestRunSelectionRules(BaseModel):
+    """Server-side test case selection; a case must match every given rule"""
+    folder_id: Optional[str] = None
+    recursive: bool = True  # Include subfolders of folder_id
+    tags: List[str] = []
+    tag_mode: str = Field('and', regex='^(and|or)$')
+    priorities: List[TestPriority] = []
+    test_types: List[TestType] = []
+    search: Optional[str] = None  # Full-text query, as in GET /testcases/search
+
+    class Config:
+        use_enum_values = True
+
+
 class TestRunCreate(TestRunBase):
     project_id: str  # Firestore uses string IDs
     test_case_ids: list[str] = []  # Firestore uses string IDs
+    selection: Optional[TestRunSelectionRules] = None  # Cases matching these rules are added as well
 
 
 class TestRunUpdate(BaseModel):
@@ -43,6 +60,18 @@ class TestRunUpdate(BaseModel):
     test_case_ids: Optional[list[str]] = None  # Firestore uses string IDs
 
 
+class TestRunTestCasesChange(BaseModel):
+    """Test cases to add to or remove from a run"""
+    test_case_ids: List[str] = Field(..., min_items=1, max_items=5000)
+
+
+class TestRunMembershipResult(BaseModel):
+    testrun_id: str
+    added: List[str] = []
+    removed_count: int = 0
+    total: int
+
+
 # Simple TestCase schema to avoid circular imports
 class TestCaseSimple(BaseModel):
     id: str  # Firestore uses string IDs
@@ -92,6 +121,48 @@ class TestResultUpdate(BaseModel):
     # defect_url and execution_time removed - not in Supabase schema
 
 
+class TestResultBulkEntry(BaseModel):
+    testcase_id: str
+    status: TestResultStatus
+    actual_result: Optional[str] = None
+    comment: Optional[str] = None
+
+
+class TestResultBulkSubmit(BaseModel):
+    # Entries are validated one by one (TestResultBulkEntry) so a bad entry is reported, not fatal
+    items: List[dict] = Field(..., min_items=1, max_items=1000)
+
+
+class TestResultBulkItem(BaseModel):
+    index: int
+    testcase_id: Optional[str] = None
+    id: Optional[str] = None  # Result id
+    status: str  # 'created', 'updated', 'error'
+    error: Optional[str] = None
+
+
+class TestResultBulkResponse(BaseModel):
+    testrun_id: str
+    succeeded: int
+    failed: int
+    results: List[TestResultBulkItem]
+    status_counts: Dict[str, int] = {}  # Latest result of each case by status (untested if none), after the write
+
+
+class JUnitIngestResult(BaseModel):
+    testrun_id: str
+    total_cases: int  # <testcase> entries in the report
+    status_counts: Dict[str, int] = {}  # Report entries by status
+    matched_testcases: int
+    added_to_run: int = 0  # Matched cases that were not part of the run yet
+    not_in_run: int = 0  # Matched cases skipped because they are not part of the run
+    unmatched_count: int
+    unmatched: List[str] = []  # First unmatched report entries (classname.name)
+    succeeded: int
+    failed: int
+    errors: List[TestResultBulkItem] = []
+
+
 class TestResultHistory(BaseModel):
     status: TestResultStatus
     comment: Optional[str] = None
@@ -117,3 +188,47 @@ class TestResultInDB(TestResultBase):
 
 class TestResult(TestResultInDB):
     pass
+
+
+class TestRunBundleResult(BaseModel):
+    id: str
+    status: TestResultStatus
+    comment: Optional[str] = None
+    executed_by: Optional[str] = None
+    executed_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class TestRunBundleCase(BaseModel):
+    id: str
+    title: Optional[str] = None
+    priority: Optional[str] = None
+    test_type: Optional[str] = None
+    folder_id: Optional[str] = None
+    latest_result: Optional[TestRunBundleResult] = None
+
+
+class TestRunBundle(BaseModel):
+    testrun: TestRun
+    testcases: List[TestRunBundleCase]
+    status_counts: Dict[str, int]  # Latest result of each case by status; cases without one count as untested
+    total: int
+
+
+class TestRunCompareEntry(BaseModel):
+    testcase_id: str
+    title: Optional[str] = None
+    base_status: Optional[str] = None  # None: not part of the base run
+    head_status: Optional[str] = None  # None: not part of the head run
+
+
+class TestRunComparison(BaseModel):
+    base_id: str
+    head_id: str
+    counts: Dict[str, int]  # base_total, head_total and the size of every category below
+    newly_failing: List[TestRunCompareEntry]  # Failed in head, not failed in base
+    fixed: List[TestRunCompareEntry]  # Failed in base, passed in head
+    still_failing: List[TestRunCompareEntry]
+    untested_in_head: List[TestRunCompareEntry]  # In both runs, no verdict in head yet
+    added: List[TestRunCompareEntry]  # Only in head
+    removed: List[TestRunCompareEntry]  # Only in base
@@ -0,0 +1,249 @@
+"""
+Cascading deletes as background jobs
+
+The parent row is hidden in the request (deleted_at, see
+migrations/add_soft_delete.sql), so it disappears immediately; its
+dependents (junction rows, results, history, issues, subfolders) are
+removed afterwards by a background job following DEPENDENTS, and the parent
+row itself is deleted last. Deleting it first would let the database's ON
+DELETE CASCADE remove the dependents silently. Dependents without
+dependents of their own are removed with one set-based DELETE per chunk of
+parent ids; the others are paged, cascaded, and then deleted by id. Deleted
+test cases and results are published as change events so the in-memory
+indexes drop them.
+
+Jobs live in memory, so a restart or a failed job leaves the parent hidden
+with its cascade unfinished. The sweeper (started with the app, then every
+SWEEP_INTERVAL_SECONDS) resubmits the cascade for every hidden row that has
+no job running in this process; a cascade is idempotent, so resuming one
+half done is safe.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.db.supabase import (
+    folders_collection,
+    issue_history_collection,
+    issues_collection,
+    projects_collection,
+    testcase_history_collection,
+    testcases_collection,
+    testresult_history_collection,
+    testresults_collection,
+    testrun_testcases_collection,
+    testruns_collection
+)
+from app.services import change_events
+from app.services.jobs import Job, job_manager
+
+logger = logging.getLogger(__name__)
+
+# Parent ids per `fk IN (...)` filter, and child ids per delete, to keep URLs short
+ID_CHUNK_SIZE = 100
+
+SWEEP_INTERVAL_SECONDS = 600
+
+COLLECTIONS = {
+    'project': projects_collection,
+    'testrun': testruns_collection,
+    'testcase': testcases_collection,
+    'testresult': testresults_collection,
+    'folder': folders_collection,
+    'issue': issues_collection,
+    'testcase_history': testcase_history_collection,
+    'testrun_testcase': testrun_testcases_collection,
+    'testresult_history': testresult_history_collection,
+    'issue_history': issue_history_collection
+}
+
+# Entities hidden by delete_with_dependents() until their cascade finishes
+SOFT_DELETE_ENTITIES = ['project', 'testrun', 'folder', 'testcase']
+
+# Entities whose deletions are published as change events, with the columns listeners need
+EVENT_COLUMNS = {
+    'testcase': ['project_id', 'folder_id'],
+    'testresult': ['testrun_id', 'testcase_id', 'status']
+}
+
+
+class Dependent(NamedTuple):
+    entity: str
+    fk: str
+    action: str = 'delete'  # 'delete' or 'nullify'
+
+
+DEPENDENTS: Dict[str, List[Dependent]] = {
+    'project': [
+        Dependent('testcase', 'project_id'),
+        Dependent('testrun', 'project_id'),
+        Dependent('folder', 'project_id'),
+        Dependent('issue', 'project_id')
+    ],
+    'testrun': [
+        Dependent('testrun_testcase', 'testrun_id'),
+        Dependent('testresult', 'testrun_id'),
+        Dependent('issue', 'testrun_id', 'nullify')
+    ],
+    'testcase': [
+        Dependent('testcase_history', 'testcase_id'),
+        Dependent('testrun_testcase', 'testcase_id'),
+        Dependent('testresult', 'testcase_id'),
+        Dependent('issue', 'testcase_id', 'nullify')
+    ],
+    'folder': [
+        Dependent('folder', 'parent_id'),
+        # Test cases outlive their folder, as with ON DELETE SET NULL
+        Dependent('testcase', 'folder_id', 'nullify')
+    ],
+    'testresult': [
+        Dependent('testresult_history', 'testresult_id')
+    ],
+    'issue': [
+        Dependent('issue_history', 'issue_id')
+    ]
+}
+
+
+def _chunks(items: List, size: int = ID_CHUNK_SIZE) -> Iterator[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _pages(rows: Iterable[dict], size: int = ID_CHUNK_SIZE) -> Iterator[List[dict]]:
+    page: List[dict] = []
+    for row in rows:
+        page.append(row)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+class CascadeDeleter:
+    """Deletes the dependents of a set of rows, reporting counts to a job"""
+
+    def __init__(self, job: Optional[Job] = None):
+        self.job = job
+        self.deleted: Counter = Counter()
+        self.nullified: Counter = Counter()
+
+    def report(self, step: str) -> None:
+        if self.job:
+            self.job.update(step=step, deleted=dict(self.deleted), nullified=dict(self.nullified))
+
+    def _nullify(self, dependent: Dependent, parent_ids: List[str]) -> None:
+        collection = COLLECTIONS[dependent.entity]
+        if dependent.entity not in EVENT_COLUMNS:
+            updated = collection.update_where([(dependent.fk, 'in', parent_ids)], {dependent.fk: None})
+            self.nullified[dependent.entity] += len(updated)
+            return
+        # Listeners need before/after rows
+        rows = collection.iter_rows(filters=[(dependent.fk, 'in', parent_ids)])
+        for page in _pages(rows):
+            before = {row['id']: row for row in page}
+            updated = collection.update_where([('id', 'in', list(before))], {dependent.fk: None})
+            for row in updated:
+                change_events.publish(dependent.entity, before.get(row['id']), row)
+            self.nullified[dependent.entity] += len(updated)
+
+    def _delete(self, dependent: Dependent, parent_ids: List[str]) -> None:
+        collection = COLLECTIONS[dependent.entity]
+        parent_filter = [(dependent.fk, 'in', parent_ids)]
+        if dependent.entity not in DEPENDENTS and dependent.entity not in EVENT_COLUMNS:
+            self.deleted[dependent.entity] += collection.delete_where(parent_filter)
+            return
+
+        rows = collection.iter_rows(filters=parent_filter, columns=EVENT_COLUMNS.get(dependent.entity))
+        for page in _pages(rows):
+            ids = [row['id'] for row in page]
+            self.cascade(dependent.entity, ids)
+            self.deleted[dependent.entity] += collection.delete_where([('id', 'in', ids)])
+            if dependent.entity in EVENT_COLUMNS:
+                for row in page:
+                    change_events.publish(dependent.entity, row, None)
+
+    def cascade(self, entity: str, ids: List[str]) -> None:
+        """Remove everything that depends on the given rows (not the rows themselves)"""
+        for dependent in DEPENDENTS.get(entity, []):
+            for parent_ids in _chunks(ids):
+                if dependent.action == 'nullify':
+                    self._nullify(dependent, parent_ids)
+                else:
+                    self._delete(dependent, parent_ids)
+                self.report(f"{entity}.{dependent.entity}")
+
+
+# Cascades queued or running in this process, by (entity, id)
+_in_flight: Dict[Tuple[str, str], Job] = {}
+_in_flight_lock = threading.Lock()
+
+
+def _submit_cascade(entity: str, row_id: str, created_by: Optional[str] = None) -> Tuple[Job, bool]:
+    """Queue the cascade of a hidden row; (job, False) if one is already queued or running"""
+    key = (entity, row_id)
+    collection = COLLECTIONS[entity]
+
+    def run(job: Job) -> dict:
+        try:
+            deleter = CascadeDeleter(job)
+            deleter.cascade(entity, [row_id])
+            collection.delete(row_id)
+            deleter.deleted[entity] += 1
+            deleter.report('done')
+            logger.info(f"Cascade delete of {entity} {row_id}: deleted {dict(deleter.deleted)}")
+            return {'deleted': dict(deleter.deleted), 'nullified': dict(deleter.nullified)}
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+
+    with _in_flight_lock:
+        if key in _in_flight:
+            return _in_flight[key], False
+        job = job_manager.submit(f'cascade_delete_{entity}', run, created_by=created_by)
+        _in_flight[key] = job
+        return job, True
+
+
+def delete_with_dependents(entity: str, row: dict, created_by: Optional[str] = None) -> Job:
+    """Hide a row now; delete its dependents and then the row in a background job"""
+    collection = COLLECTIONS[entity]
+    collection.mark_deleted(row['id'])
+    if entity in EVENT_COLUMNS:
+        change_events.publish(entity, row, None)
+
+    # A sweep may have picked the row up already; its job is returned then
+    job, _ = _submit_cascade(entity, row['id'], created_by=created_by)
+    return job
+
+
+def resume_pending_deletes() -> List[Job]:
+    """Resubmit the cascade of every hidden row that has none running here"""
+    jobs = []
+    for entity in SOFT_DELETE_ENTITIES:
+        for row in COLLECTIONS[entity].iter_deleted(columns=['id']):
+            job, submitted = _submit_cascade(entity, row['id'])
+            if submitted:
+                jobs.append(job)
+    if jobs:
+        logger.info(f"Resumed {len(jobs)} unfinished cascade deletes")
+    return jobs
+
+
+def _sweep_forever(interval: float) -> None:
+    while True:
+        try:
+            resume_pending_deletes()
+        except Exception as e:
+            logger.error(f"Cascade delete sweep failed: {type(e).__name__}: {e}")
+        time.sleep(interval)
+
+
+def start_sweeper(interval: float = SWEEP_INTERVAL_SECONDS) -> threading.Thread:
+    """Sweep now and then every `interval` seconds on a daemon thread"""
+    thread = threading.Thread(target=_sweep_forever, args=(interval,), name='cascade-delete-sweeper', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,84 @@
+"""
+In-process change notifications for write endpoints
+
+Write endpoints publish (before, after) row pairs per entity ("testresult",
+"testcase", ...) so derived indexes and caches can update incrementally
+instead of rescanning whole tables. A create has before=None, a delete
+has after=None.
+"""
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[Optional[dict], Optional[dict]], None]
+
+_listeners: Dict[str, List[Listener]] = defaultdict(list)
+
+
+def subscribe(entity: str, listener: Listener) -> Listener:
+    """Register a listener for changes to an entity (usable as a decorator)"""
+    _listeners[entity].append(listener)
+    return listener
+
+
+def publish(entity: str, before: Optional[dict], after: Optional[dict]) -> None:
+    """Notify all listeners of a change
+
+    Listener failures are logged and never propagate to the write endpoint,
+    since the database write has already succeeded at this point.
+    """
+    for listener in list(_listeners.get(entity, ())):
+        try:
+            listener(before, after)
+        except Exception as e:
+            logger.error(f"Change listener {getattr(listener, '__name__', listener)} failed for {entity}: {e}")
+
+
+class LoadBuffer:
+    """Holds back changes that arrive while a lazily loaded index is loading
+
+    A change published before the load starts is already in the rows the
+    load reads; one published after it finished is applied directly. Changes
+    published during the load may or may not be in what it read, so they are
+    queued and replayed once it is done (index updates must be idempotent).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loading = False
+        self._pending: List[Tuple[Optional[dict], Optional[dict]]] = []
+        self.loaded = False
+
+    def start(self) -> None:
+        """Call before the load's first query"""
+        with self._lock:
+            self._loading = True
+
+    def offer(self, before: Optional[dict], after: Optional[dict]) -> bool:
+        """True if the caller should apply the change now; queued or not needed otherwise"""
+        with self._lock:
+            if self._loading:
+                self._pending.append((before, after))
+                return False
+            return self.loaded
+
+    def finish(self, apply: Listener) -> None:
+        """Replay the queued changes through apply and mark the index loaded"""
+        while True:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if not pending:
+                    self._loading = False
+                    self.loaded = True
+                    return
+            for before, after in pending:
+                apply(before, after)
+
+    def abort(self) -> None:
+        """The load failed: drop queued changes, the next load reads them anyway"""
+        with self._lock:
+            self._loading = False
+            self._pending = []
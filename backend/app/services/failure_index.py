@@ -0,0 +1,147 @@
+"""
+Per-test-case failure counters for "top failing test cases" queries
+
+Instead of scanning every test result on each dashboard request, failed
+results are counted once per process into daily buckets per test case and
+kept current through result change events. Any top-K over the last N days
+is then answered from memory.
+"""
+import heapq
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from app.db.supabase import testresults_collection, testruns_collection
+from app.services import change_events
+
+logger = logging.getLogger(__name__)
+
+
+def _result_day(result: dict) -> date:
+    """Day a result was recorded (executed_at, falling back to timestamps)"""
+    for field in ('executed_at', 'updated_at', 'created_at'):
+        value = result.get(field)
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, str) and len(value) >= 10:
+            try:
+                return date.fromisoformat(value[:10])
+            except ValueError:
+                continue
+    return datetime.now(timezone.utc).date()
+
+
+class FailureIndex:
+    """Failure counts per test case, bucketed by day"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changes = change_events.LoadBuffer()
+        # result_id -> (testcase_id, day) for results currently in 'failed' state
+        self._failed: Dict[str, Tuple[str, date]] = {}
+        # testcase_id -> {day: failure count}
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._case_project: Dict[str, str] = {}
+        self._run_project: Dict[str, Optional[str]] = {}
+
+    def _project_for_run(self, testrun_id: str) -> Optional[str]:
+        if testrun_id not in self._run_project:
+            testrun = testruns_collection.get(testrun_id)
+            self._run_project[testrun_id] = testrun.get('project_id') if testrun else None
+        return self._run_project[testrun_id]
+
+    def _add(self, result: dict) -> None:
+        result_id = result.get('id')
+        testcase_id = result.get('testcase_id')
+        if not result_id or not testcase_id or result_id in self._failed:
+            return
+        day = _result_day(result)
+        self._failed[result_id] = (testcase_id, day)
+        self._counts[testcase_id][day] += 1
+        project_id = self._project_for_run(result.get('testrun_id'))
+        if project_id:
+            self._case_project[testcase_id] = project_id
+
+    def _remove(self, result_id: Optional[str]) -> None:
+        entry = self._failed.pop(result_id, None)
+        if not entry:
+            return
+        testcase_id, day = entry
+        buckets = self._counts[testcase_id]
+        buckets[day] -= 1
+        if buckets[day] <= 0:
+            del buckets[day]
+        if not buckets:
+            del self._counts[testcase_id]
+
+    def _ensure_loaded(self) -> None:
+        if self._changes.loaded:
+            return
+        with self._lock:
+            if self._changes.loaded:
+                return
+            # Writes landing while the rows are read are replayed afterwards
+            self._changes.start()
+            try:
+                for testrun in testruns_collection.iter_rows(columns=['project_id']):
+                    self._run_project[testrun['id']] = testrun.get('project_id')
+                failed_results = testresults_collection.iter_rows(
+                    filters=[('status', '==', 'failed')],
+                    columns=['testrun_id', 'testcase_id', 'executed_at', 'updated_at', 'created_at']
+                )
+                for result in failed_results:
+                    self._add(result)
+            except Exception:
+                self._changes.abort()
+                self._failed.clear()
+                self._counts.clear()
+                raise
+            self._changes.finish(self._apply)
+            logger.info(f"Failure index loaded: {len(self._failed)} failed results, {len(self._counts)} test cases")
+
+    def _apply(self, before: Optional[dict], after: Optional[dict]) -> None:
+        with self._lock:
+            if before:
+                self._remove(before.get('id'))
+            if after:
+                self._remove(after.get('id'))
+                if after.get('status') == 'failed':
+                    self._add(after)
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        """Keep counters in sync with a single result write"""
+        # Before the load nothing needs maintaining: the load reads current state
+        if self._changes.offer(before, after):
+            self._apply(before, after)
+
+    def top_failures(
+        self,
+        limit: int = 5,
+        project_id: Optional[str] = None,
+        window_days: Optional[int] = None
+    ) -> List[Tuple[str, int]]:
+        """Top-K (testcase_id, failure_count) pairs, most failures first"""
+        self._ensure_loaded()
+        cutoff = None
+        if window_days:
+            cutoff = datetime.now(timezone.utc).date() - timedelta(days=window_days - 1)
+
+        with self._lock:
+            totals = []
+            for testcase_id, buckets in self._counts.items():
+                if project_id and self._case_project.get(testcase_id) != project_id:
+                    continue
+                if cutoff is None:
+                    count = sum(buckets.values())
+                else:
+                    count = sum(n for day, n in buckets.items() if day >= cutoff)
+                if count > 0:
+                    totals.append((testcase_id, count))
+
+        return heapq.nlargest(limit, totals, key=lambda item: item[1])
+
+
+failure_index = FailureIndex()
+change_events.subscribe('testresult', failure_index.apply_change)
@@ -0,0 +1,167 @@
+"""
+Flaky test detection over result history
+
+Scores every case of a project from its last N executed results in the
+project's result matrix (see result_analytics):
+
+- transition_rate: passed <-> failed flips / (verdicts - 1)
+- entropy: Shannon entropy of the status distribution, normalized to 0..1
+- env_divergence: spread (max - min) of per-environment pass rates
+
+Scores are computed in one vectorized batch per project, cached, and on
+result writes only the affected cases are recomputed.
+"""
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services import change_events
+from app.services.result_analytics import (
+    FAILED,
+    PASSED,
+    STATUS_CODES,
+    flip_mask,
+    last_executions,
+    result_analytics
+)
+
+DEFAULT_WINDOW = 20
+
+# Weights of the combined score
+TRANSITION_WEIGHT = 0.5
+ENTROPY_WEIGHT = 0.3
+DIVERGENCE_WEIGHT = 0.2
+
+EXECUTED_CODES = [code for code in STATUS_CODES.values() if code > STATUS_CODES['untested']]
+
+
+def score_matrix(status: np.ndarray, environments: np.ndarray, window: int) -> Dict[str, np.ndarray]:
+    """Vectorized flakiness metrics for each row of a chronological status matrix"""
+    status = last_executions(status, window)
+    runs = (status > STATUS_CODES['untested']).sum(axis=1)
+
+    # Transition rate between consecutive passed/failed verdicts
+    flipped, _ = flip_mask(status)
+    verdicts = ((status == PASSED) | (status == FAILED)).sum(axis=1)
+    transition_rate = np.divide(
+        flipped.sum(axis=1), verdicts - 1,
+        out=np.zeros(len(runs)), where=verdicts > 1
+    )
+
+    # Normalized Shannon entropy of the executed status distribution
+    counts = np.stack([(status == code).sum(axis=1) for code in EXECUTED_CODES], axis=1)
+    probabilities = np.divide(counts, runs[:, None], out=np.zeros(counts.shape), where=runs[:, None] > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(probabilities > 0, -probabilities * np.log2(probabilities), 0.0)
+    entropy = terms.sum(axis=1) / np.log2(len(EXECUTED_CODES))
+
+    # Spread of per-environment pass rates
+    env_names = sorted({env for env in environments if env})
+    if len(env_names) > 1:
+        env_rates = []
+        for env in env_names:
+            env_status = status[:, environments == env]
+            env_runs = (env_status > STATUS_CODES['untested']).sum(axis=1)
+            env_passed = (env_status == PASSED).sum(axis=1)
+            rate = np.divide(env_passed, env_runs, out=np.full(len(runs), np.nan), where=env_runs > 0)
+            env_rates.append(rate)
+        env_rates = np.stack(env_rates, axis=1)
+        covered = (~np.isnan(env_rates)).sum(axis=1)
+        with np.errstate(all='ignore'):
+            spread = np.nanmax(env_rates, axis=1) - np.nanmin(env_rates, axis=1)
+        env_divergence = np.where(covered > 1, spread, 0.0)
+    else:
+        env_divergence = np.zeros(len(runs))
+
+    score = (
+        TRANSITION_WEIGHT * transition_rate
+        + ENTROPY_WEIGHT * entropy
+        + DIVERGENCE_WEIGHT * env_divergence
+    )
+    return {
+        'runs': runs,
+        'transition_rate': transition_rate,
+        'entropy': entropy,
+        'env_divergence': env_divergence,
+        'score': score
+    }
+
+
+class FlakinessService:
+    """Cached flakiness scores per (project, window), refreshed per dirty case"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._scores: Dict[Tuple[str, int], Dict[str, dict]] = {}
+        self._dirty: Dict[str, Set[str]] = defaultdict(set)
+
+    def _compute(self, project_id: str, window: int, case_ids: Optional[List[str]] = None) -> Dict[str, dict]:
+        matrix = result_analytics.matrix(project_id)
+        status, order = matrix.chronological()
+        environments = np.array([matrix.run_environments[col] or '' for col in order], dtype=object)
+        if case_ids is None:
+            case_ids = matrix.case_ids
+        else:
+            case_ids = [case_id for case_id in case_ids if case_id in matrix.case_index]
+        rows = np.array([matrix.case_index[case_id] for case_id in case_ids], dtype=np.intp)
+
+        metrics = score_matrix(status[rows], environments, window)
+        scores = {}
+        for i, case_id in enumerate(case_ids):
+            scores[case_id] = {
+                'testcase_id': case_id,
+                'runs': int(metrics['runs'][i]),
+                'transition_rate': round(float(metrics['transition_rate'][i]), 4),
+                'entropy': round(float(metrics['entropy'][i]), 4),
+                'env_divergence': round(float(metrics['env_divergence'][i]), 4),
+                'score': round(float(metrics['score'][i]), 4)
+            }
+        return scores
+
+    def scores(self, project_id: str, window: int = DEFAULT_WINDOW) -> Dict[str, dict]:
+        """testcase_id -> score dict for every case with results in the project"""
+        with self._lock:
+            key = (project_id, window)
+            cached = self._scores.get(key)
+            dirty = self._dirty.pop(project_id, set())
+            if cached is None:
+                cached = self._compute(project_id, window)
+                self._scores[key] = cached
+            elif dirty:
+                cached.update(self._compute(project_id, window, list(dirty)))
+            if dirty:
+                # Other cached windows of this project still need these cases
+                for (other_project, other_window), other in self._scores.items():
+                    if other_project == project_id and other_window != window:
+                        other.update(self._compute(project_id, other_window, list(dirty)))
+            return cached
+
+    def ranked(self, project_id: str, window: int = DEFAULT_WINDOW, limit: Optional[int] = None) -> List[dict]:
+        items = sorted(self.scores(project_id, window).values(), key=lambda item: item['score'], reverse=True)
+        return items[:limit] if limit else items
+
+    def invalidate(self, project_id: Optional[str] = None) -> None:
+        with self._lock:
+            if project_id is None:
+                self._scores.clear()
+                self._dirty.clear()
+                return
+            for key in [key for key in self._scores if key[0] == project_id]:
+                del self._scores[key]
+            self._dirty.pop(project_id, None)
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        """Mark the cases touched by a result write for recomputation"""
+        with self._lock:
+            for row in (before, after):
+                if not row:
+                    continue
+                project_id = result_analytics.project_for_run(row.get('testrun_id'))
+                if project_id and any(key[0] == project_id for key in self._scores):
+                    self._dirty[project_id].add(row.get('testcase_id'))
+
+
+flakiness_service = FlakinessService()
+change_events.subscribe('testresult', flakiness_service.apply_change)
@@ -0,0 +1,67 @@
+"""
+Folder hierarchy helpers (materialized paths)
+
+Every folder stores path = '/<root id>/.../<own id>/' (see
+migrations/add_folder_paths.sql, which is required), so a whole subtree is
+a single prefix match. Re-parenting rewrites the moved subtree's paths in one statement via
+move_folder().
+"""
+from typing import Dict, List, Optional
+
+from app.db.supabase import call_rpc, folders_collection
+
+
+def folder_path(folder_id: str, parent: Optional[dict]) -> str:
+    """Materialized path of a folder placed under `parent` (None = project root)"""
+    prefix = parent.get('path') if parent else None
+    return f"{prefix or '/'}{folder_id}/"
+
+
+def is_in_subtree(folder: dict, candidate: dict) -> bool:
+    """True if candidate is folder itself or one of its descendants"""
+    if candidate['id'] == folder['id']:
+        return True
+    return bool(folder.get('path')) and (candidate.get('path') or '').startswith(folder['path'])
+
+
+def subtree_folder_ids(folder: dict) -> List[str]:
+    """Ids of a folder and all of its descendants (one prefix query)"""
+    if not folder.get('path'):
+        return [folder['id']]
+    rows = folders_collection.iter_rows(filters=[('path', 'like', f"{folder['path']}%")], columns=['path'])
+    return [row['id'] for row in rows]
+
+
+def move_folder(folder_id: str, new_parent_id: Optional[str]) -> None:
+    """Re-parent a folder and rewrite the paths of its subtree atomically"""
+    call_rpc('move_folder', {'p_folder_id': folder_id, 'p_new_parent_id': new_parent_id})
+
+
+def build_tree(project_id: str) -> List[dict]:
+    """Nested folder tree of a project with direct and subtree test case counts"""
+    rows = call_rpc('folder_tree_counts', {'p_project_id': project_id})
+    nodes: Dict[str, dict] = {
+        row['id']: {
+            'id': row['id'],
+            'name': row['name'],
+            'parent_id': row.get('parent_id'),
+            'testcase_count': row.get('testcase_count') or 0,
+            'total_count': row.get('testcase_count') or 0,
+            'children': []
+        }
+        for row in rows
+    }
+    paths = {row['id']: row.get('path') or '' for row in rows}
+
+    # Deepest folders first, so each subtree total is final before it is added to its parent
+    for folder_id in sorted(nodes, key=lambda i: paths[i].count('/'), reverse=True):
+        parent = nodes.get(nodes[folder_id]['parent_id'])
+        if parent:
+            parent['total_count'] += nodes[folder_id]['total_count']
+
+    roots = []
+    for folder_id in sorted(nodes, key=lambda i: nodes[i]['name']):
+        node = nodes[folder_id]
+        parent = nodes.get(node['parent_id'])
+        (parent['children'] if parent else roots).append(node)
+    return roots
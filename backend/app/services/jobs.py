@@ -0,0 +1,115 @@
+"""
+Background job runner with progress reporting
+
+Long-running work (large imports, cascading deletes) is submitted here and
+executed on a small worker pool, so the HTTP request can return a job id
+immediately. The job function receives its Job and updates job.progress as
+it goes; clients poll the job for status, counters and errors.
+"""
+import logging
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+MAX_RETAINED_JOBS = 200
+MAX_JOB_ERRORS = 1000
+
+
+class Job:
+    """State of one background job"""
+
+    def __init__(self, kind: str, created_by: Optional[str] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.created_by = created_by
+        self.status = 'pending'  # pending -> running -> completed | failed
+        self.progress: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self.result: Any = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress) -> None:
+        with self._lock:
+            self.progress.update(progress)
+
+    def add_error(self, message: str) -> None:
+        with self._lock:
+            if len(self.errors) < MAX_JOB_ERRORS:
+                self.errors.append(message)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('completed', 'failed')
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'progress': dict(self.progress),
+                'errors': list(self.errors),
+                'result': self.result,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps the most recent ones for polling"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_retained: int = MAX_RETAINED_JOBS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_retained = max_retained
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], created_by: Optional[str] = None) -> Job:
+        """Queue fn(job) for background execution and return the job immediately"""
+        job = Job(kind, created_by)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _evict(self) -> None:
+        # Drop the oldest finished jobs beyond the retention limit
+        if len(self._jobs) <= self._max_retained:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+            if len(self._jobs) <= self._max_retained:
+                break
+            del self._jobs[job_id]
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        job.status = 'running'
+        job.started_at = datetime.now(timezone.utc)
+        try:
+            job.result = fn(job)
+            job.status = 'completed'
+        except Exception as e:
+            logger.error(f"Background job {job.kind} {job.id} failed: {type(e).__name__}: {e}")
+            traceback.print_exc()
+            job.add_error(str(e))
+            job.status = 'failed'
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+
+
+job_manager = JobManager()
@@ -0,0 +1,189 @@
+"""
+JUnit / xUnit XML report ingestion
+
+Reports are stream-parsed with iterparse: every <testcase> is reduced to
+(name, classname, status, message) when its end tag is seen and then dropped
+from the tree, so memory stays constant however large the report is.
+Parsing goes through defusedxml with DTDs forbidden, so entity expansion
+("billion laughs") and external entities are rejected as parse errors.
+
+Report entries are matched to test cases of the run's project through a
+name index built with one projected scan: a test case id appearing in the
+name, a tag equal to the qualified name ("tests.test_login.test_ok") or to
+the bare name, or a title equal to the (normalized) name. Several report
+entries for the same case (parametrized tests) are folded into one verdict,
+which is written with the bulk result upsert.
+"""
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+import defusedxml.ElementTree as DefusedET
+from defusedxml import DefusedXmlException
+
+from app.db.supabase import testcases_collection
+from app.services.testresult_bulk import ResultReport, upsert_results
+from app.services.testrun_membership import add_testcases, get_testcase_ids
+
+MAX_MESSAGE_LENGTH = 2000
+MAX_REPORTED_NAMES = 200
+
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', re.IGNORECASE)
+_PARAMS_RE = re.compile(r'\[.*\]$')
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+# Most severe first; several report entries for one case keep the most severe
+STATUS_RANK = {'failed': 0, 'passed': 1, 'skipped': 2}
+
+
+def _local(tag: str) -> str:
+    """Tag name without an XML namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def normalize_key(text: Optional[str]) -> str:
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+
+def _parse_events(fileobj: BinaryIO) -> Iterator[Tuple[str, ET.Element]]:
+    try:
+        yield from DefusedET.iterparse(fileobj, events=('start', 'end'), forbid_dtd=True)
+    except DefusedXmlException as e:
+        raise ET.ParseError(f"forbidden XML construct ({type(e).__name__})") from e
+
+
+def iter_junit_cases(fileobj: BinaryIO) -> Iterator[dict]:
+    """Yield {name, classname, status, message} per <testcase>; raises ET.ParseError"""
+    stack: List[ET.Element] = []
+    for event, elem in _parse_events(fileobj):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local(elem.tag) != 'testcase':
+            continue
+
+        status = 'passed'
+        message = None
+        for child in elem:
+            tag = _local(child.tag)
+            if tag in ('failure', 'error'):
+                status = 'failed'
+                message = child.get('message') or (child.text or '').strip() or tag
+                break
+            if tag == 'skipped':
+                status = 'skipped'
+                message = child.get('message') or (child.text or '').strip() or None
+        yield {
+            'name': elem.get('name') or '',
+            'classname': elem.get('classname') or '',
+            'status': status,
+            'message': message[:MAX_MESSAGE_LENGTH] if message else None
+        }
+
+        # Finished siblings are never looked at again
+        if stack:
+            del stack[-1][:]
+        else:
+            elem.clear()
+
+
+class NameIndex:
+    """Normalized names/keys of a project's test cases -> testcase id"""
+
+    def __init__(self, project_id: str):
+        self.ids: Set[str] = set()
+        self._keys: Dict[str, Optional[str]] = {}
+        rows = testcases_collection.iter_rows(
+            filters=[('project_id', '==', project_id)], columns=['title', 'tags']
+        )
+        for row in rows:
+            self.ids.add(row['id'])
+            for tag in row.get('tags') or []:
+                self._add(tag, row['id'])
+            self._add(row.get('title'), row['id'])
+
+    def _add(self, text: Optional[str], testcase_id: str) -> None:
+        key = normalize_key(text)
+        if not key:
+            return
+        current = self._keys.get(key, testcase_id)
+        # A key shared by two cases identifies neither
+        self._keys[key] = testcase_id if current == testcase_id else None
+
+    def lookup(self, name: str, classname: str = '') -> Optional[str]:
+        for match in _UUID_RE.findall(name):
+            if match.lower() in self.ids:
+                return match.lower()
+
+        bare = _PARAMS_RE.sub('', name)
+        candidates = [f"{classname}.{name}", f"{classname}.{bare}"] if classname else []
+        candidates += [name, bare]
+        if bare.lower().startswith('test'):
+            candidates.append(bare[4:])
+        for candidate in candidates:
+            testcase_id = self._keys.get(normalize_key(candidate))
+            if testcase_id:
+                return testcase_id
+        return None
+
+
+def ingest_junit(
+    testrun_id: str,
+    project_id: str,
+    fileobj: BinaryIO,
+    executed_by: str,
+    add_missing: bool = True
+) -> dict:
+    """Record the verdicts of a JUnit report in a test run"""
+    index = NameIndex(project_id)
+    verdicts: Dict[str, dict] = {}
+    counts = defaultdict(int)
+    unmatched: List[str] = []
+    unmatched_count = 0
+    total = 0
+
+    for case in iter_junit_cases(fileobj):
+        total += 1
+        counts[case['status']] += 1
+        testcase_id = index.lookup(case['name'], case['classname'])
+        if not testcase_id:
+            unmatched_count += 1
+            if len(unmatched) < MAX_REPORTED_NAMES:
+                unmatched.append(f"{case['classname']}.{case['name']}" if case['classname'] else case['name'])
+            continue
+        current = verdicts.get(testcase_id)
+        if current is None or STATUS_RANK[case['status']] < STATUS_RANK[current['status']]:
+            verdicts[testcase_id] = {'status': case['status'], 'actual_result': case['message'], 'comment': None}
+
+    members = get_testcase_ids(testrun_id)
+    outside = [testcase_id for testcase_id in verdicts if testcase_id not in members]
+    added = add_testcases(testrun_id, outside) if add_missing and outside else []
+    if not add_missing:
+        for testcase_id in outside:
+            del verdicts[testcase_id]
+
+    report = ResultReport()
+    upsert_results(
+        testrun_id,
+        [(position, testcase_id, fields) for position, (testcase_id, fields) in enumerate(verdicts.items())],
+        executed_by,
+        report
+    )
+    summary = report.to_dict()
+    return {
+        'testrun_id': testrun_id,
+        'total_cases': total,
+        'status_counts': dict(counts),
+        'matched_testcases': len(verdicts),
+        'added_to_run': len(added),
+        'not_in_run': 0 if add_missing else len(outside),
+        'unmatched_count': unmatched_count,
+        'unmatched': unmatched,
+        'succeeded': summary['succeeded'],
+        'failed': summary['failed'],
+        'errors': [item for item in summary['results'] if item['status'] == 'error']
+    }
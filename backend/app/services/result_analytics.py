@@ -0,0 +1,350 @@
+"""
+Columnar in-memory analytics over test result history
+
+A project's results are loaded once into a compact case x run matrix of
+int8 status codes (plus per-run timestamps and environments) and kept
+current through result change events. Matrix-style questions such as
+"pass rate over the last 20 runs" or "cases failing on every environment"
+are then answered with vectorized NumPy operations instead of per-row
+Python loops over database results.
+
+A run can hold several results for one case (re-runs); a cell holds the
+latest of them by updated_at, as latest_results() does. A write makes its
+row the latest, so it is stored directly; a deleted or moved result may
+have been the latest, so its cell is marked stale and re-read from the
+database (batched per run) before the next query.
+"""
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.db.supabase import testresults_collection, testruns_collection
+from app.services import change_events
+from app.services.testresult_bulk import latest_results
+
+logger = logging.getLogger(__name__)
+
+# Status codes stored in the matrix; NO_RESULT marks a case that is not in a run
+NO_RESULT = -1
+STATUS_CODES = {'untested': 0, 'passed': 1, 'failed': 2, 'blocked': 3, 'skipped': 4}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+PASSED = STATUS_CODES['passed']
+FAILED = STATUS_CODES['failed']
+
+MAX_CACHED_PROJECTS = 16
+
+
+def _grow(array: np.ndarray, rows: int, cols: int, fill) -> np.ndarray:
+    """Return array enlarged (capacity doubling) to hold at least rows x cols"""
+    cur_rows, cur_cols = array.shape
+    if rows <= cur_rows and cols <= cur_cols:
+        return array
+    new_rows = max(rows, cur_rows * 2 if rows > cur_rows else cur_rows)
+    new_cols = max(cols, cur_cols * 2 if cols > cur_cols else cur_cols)
+    grown = np.full((new_rows, new_cols), fill, dtype=array.dtype)
+    grown[:cur_rows, :cur_cols] = array
+    return grown
+
+
+def _last_executed(status: np.ndarray) -> np.ndarray:
+    """Column index of the most recent executed result at or before each column
+
+    status must already be in chronological column order. Returns -1 where a
+    case has no executed result yet.
+    """
+    executed = status > STATUS_CODES['untested']
+    cols = np.arange(status.shape[1])
+    marks = np.where(executed, cols, -1)
+    return np.maximum.accumulate(marks, axis=1) if status.shape[1] else marks
+
+
+def last_executions(status: np.ndarray, n: int) -> np.ndarray:
+    """Mask everything but each case's last N executed results to NO_RESULT
+
+    status must be in chronological column order.
+    """
+    executed = status > STATUS_CODES['untested']
+    # Rank executions from the newest backwards and keep the first N
+    newest_first = executed[:, ::-1]
+    in_window = (newest_first & (np.cumsum(newest_first, axis=1) <= n))[:, ::-1]
+    return np.where(in_window, status, NO_RESULT).astype(np.int8)
+
+
+def flip_mask(status: np.ndarray):
+    """(flipped, previous status) where a verdict differs from the prior one
+
+    Only passed/failed verdicts count; untested, blocked and skipped cells
+    are neither flips nor reset the previous verdict.
+    """
+    verdict = (status == PASSED) | (status == FAILED)
+    cols = np.arange(status.shape[1])
+    marks = np.where(verdict, cols, -1)
+    last = np.maximum.accumulate(marks, axis=1) if status.shape[1] else marks
+    # Previous verdict column strictly before each column
+    previous = np.full_like(last, -1)
+    previous[:, 1:] = last[:, :-1]
+    prev_status = np.take_along_axis(status, np.maximum(previous, 0), axis=1)
+    flipped = verdict & (previous >= 0) & (status != prev_status)
+    return flipped, prev_status
+
+
+class ResultMatrix:
+    """One project's results as a case x run int8 status matrix"""
+
+    def __init__(self, project_id: str):
+        self.project_id = project_id
+        self.case_ids: List[str] = []
+        self.case_index: Dict[str, int] = {}
+        self.run_ids: List[str] = []
+        self.run_index: Dict[str, int] = {}
+        self.run_environments: List[Optional[str]] = []
+        self._run_times = np.zeros(0, dtype='datetime64[s]')
+        self._status = np.full((0, 0), NO_RESULT, dtype=np.int8)
+        # (testrun_id, testcase_id) cells to re-read from the database
+        self._stale: Set[Tuple[str, str]] = set()
+        self.version = 0
+
+    # -- construction -----------------------------------------------------
+
+    def _case_row(self, testcase_id: str) -> int:
+        row = self.case_index.get(testcase_id)
+        if row is None:
+            row = len(self.case_ids)
+            self.case_ids.append(testcase_id)
+            self.case_index[testcase_id] = row
+            self._status = _grow(self._status, row + 1, len(self.run_ids), NO_RESULT)
+        return row
+
+    def add_run(self, testrun: dict) -> int:
+        col = self.run_index.get(testrun['id'])
+        if col is not None:
+            self.run_environments[col] = testrun.get('environment')
+            return col
+        col = len(self.run_ids)
+        self.run_ids.append(testrun['id'])
+        self.run_index[testrun['id']] = col
+        self.run_environments.append(testrun.get('environment'))
+        created_at = str(testrun.get('created_at') or '')[:19] or 'NaT'
+        try:
+            timestamp = np.datetime64(created_at, 's')
+        except ValueError:
+            timestamp = np.datetime64('NaT', 's')
+        self._run_times = np.append(self._run_times, timestamp)
+        self._status = _grow(self._status, len(self.case_ids), col + 1, NO_RESULT)
+        return col
+
+    def set_result(self, testrun_id: str, testcase_id: str, status: Optional[str]) -> None:
+        """Store a result (status=None clears the cell)"""
+        col = self.run_index.get(testrun_id)
+        if col is None:
+            return
+        row = self._case_row(testcase_id)
+        self._status[row, col] = STATUS_CODES.get(status, NO_RESULT) if status else NO_RESULT
+        self._stale.discard((testrun_id, testcase_id))
+        self.version += 1
+
+    def mark_stale(self, testrun_id: str, testcase_id: str) -> None:
+        if testrun_id in self.run_index:
+            self._stale.add((testrun_id, testcase_id))
+
+    def refresh_stale(self) -> None:
+        """Re-read the latest result of every stale cell, one query per run"""
+        if not self._stale:
+            return
+        by_run: Dict[str, List[str]] = defaultdict(list)
+        for testrun_id, testcase_id in self._stale:
+            by_run[testrun_id].append(testcase_id)
+        self._stale = set()
+        for testrun_id, testcase_ids in by_run.items():
+            latest = latest_results(testrun_id, testcase_ids, columns=['testcase_id', 'status', 'updated_at'])
+            for testcase_id in testcase_ids:
+                result = latest.get(testcase_id)
+                self.set_result(testrun_id, testcase_id, result['status'] if result else None)
+
+    @classmethod
+    def load(cls, project_id: str) -> 'ResultMatrix':
+        matrix = cls(project_id)
+        testruns = list(testruns_collection.iter_rows(
+            filters=[('project_id', '==', project_id)],
+            columns=['created_at', 'environment']
+        ))
+        testruns.sort(key=lambda tr: str(tr.get('created_at') or ''))
+        for testrun in testruns:
+            matrix.add_run(testrun)
+
+        # Latest result per (case, run); re-runs leave older rows behind
+        latest: Dict[Tuple[int, int], Tuple[str, int]] = {}
+        results = testresults_collection.iter_rows_in(
+            'testrun_id', matrix.run_ids, columns=['testrun_id', 'testcase_id', 'status', 'updated_at']
+        )
+        for result in results:
+            cell = (matrix._case_row(result['testcase_id']), matrix.run_index[result['testrun_id']])
+            updated_at = str(result.get('updated_at') or '')
+            current = latest.get(cell)
+            if current is None or updated_at > current[0]:
+                latest[cell] = (updated_at, STATUS_CODES.get(result.get('status'), NO_RESULT))
+        rows = [row for row, _ in latest]
+        cols = [col for _, col in latest]
+        codes = [code for _, code in latest.values()]
+        if rows:
+            matrix._status[np.array(rows), np.array(cols)] = np.array(codes, dtype=np.int8)
+
+        logger.info(f"Result matrix loaded for project {project_id}: {len(matrix.case_ids)} cases x {len(matrix.run_ids)} runs")
+        return matrix
+
+    # -- views ------------------------------------------------------------
+
+    def chronological(self, last_runs: Optional[int] = None):
+        """(status matrix, run column indices) with runs ordered oldest → newest"""
+        order = np.argsort(self._run_times, kind='stable')
+        if last_runs:
+            order = order[-last_runs:]
+        return self._status[:len(self.case_ids)][:, order], order
+
+    # -- queries ----------------------------------------------------------
+
+    def pass_rates(self, last_runs: int = 20) -> List[dict]:
+        """Pass rate per case over its last N executed runs"""
+        status, _ = self.chronological()
+        window = last_executions(status, last_runs)
+
+        runs = (window > STATUS_CODES['untested']).sum(axis=1)
+        passed = (window == PASSED).sum(axis=1)
+        failed = (window == FAILED).sum(axis=1)
+        rates = np.divide(passed, runs, out=np.zeros(len(runs)), where=runs > 0) * 100
+
+        return [
+            {
+                'testcase_id': self.case_ids[i],
+                'runs': int(runs[i]),
+                'passed': int(passed[i]),
+                'failed': int(failed[i]),
+                'pass_rate': round(float(rates[i]), 2)
+            }
+            for i in np.flatnonzero(runs)
+        ]
+
+    def flips(self, testcase_id: Optional[str] = None, last_runs: Optional[int] = None) -> List[dict]:
+        """Runs where a case flipped between passed and failed"""
+        status, order = self.chronological(last_runs)
+        case_rows = np.arange(status.shape[0])
+        if testcase_id is not None:
+            if testcase_id not in self.case_index:
+                return []
+            case_rows = np.array([self.case_index[testcase_id]])
+            status = status[case_rows]
+
+        flipped, prev_status = flip_mask(status)
+
+        events = []
+        for row, col in zip(*np.nonzero(flipped)):
+            events.append({
+                'testcase_id': self.case_ids[case_rows[row]],
+                'testrun_id': self.run_ids[order[col]],
+                'from_status': STATUS_NAMES[int(prev_status[row, col])],
+                'to_status': STATUS_NAMES[int(status[row, col])]
+            })
+        return events
+
+    def failing_on_every_environment(self) -> List[dict]:
+        """Cases whose latest result is 'failed' on every environment of the project"""
+        status, order = self.chronological()
+        environments = np.array([self.run_environments[col] or '' for col in order], dtype=object)
+        env_names = sorted({env for env in environments if env})
+        if not env_names or not status.shape[0]:
+            return []
+
+        failing_everywhere = np.ones(status.shape[0], dtype=bool)
+        for env in env_names:
+            env_status = status[:, environments == env]
+            last = _last_executed(env_status)[:, -1]
+            latest = np.where(last >= 0, env_status[np.arange(len(last)), np.maximum(last, 0)], NO_RESULT)
+            failing_everywhere &= latest == FAILED
+
+        return [
+            {'testcase_id': self.case_ids[i], 'environments': env_names}
+            for i in np.flatnonzero(failing_everywhere)
+        ]
+
+
+class ResultAnalytics:
+    """Per-project result matrices, loaded lazily and refreshed incrementally"""
+
+    def __init__(self, max_projects: int = MAX_CACHED_PROJECTS):
+        self._lock = threading.RLock()
+        self._matrices: 'OrderedDict[str, ResultMatrix]' = OrderedDict()
+        self._run_project: Dict[str, Optional[str]] = {}
+        self._max_projects = max_projects
+
+    def matrix(self, project_id: str) -> ResultMatrix:
+        with self._lock:
+            matrix = self._matrices.get(project_id)
+            if matrix is None:
+                matrix = ResultMatrix.load(project_id)
+                self._matrices[project_id] = matrix
+                for run_id in matrix.run_ids:
+                    self._run_project[run_id] = project_id
+                while len(self._matrices) > self._max_projects:
+                    self._matrices.popitem(last=False)
+            self._matrices.move_to_end(project_id)
+            matrix.refresh_stale()
+            return matrix
+
+    def pass_rates(self, project_id: str, last_runs: int = 20) -> List[dict]:
+        with self._lock:
+            return self.matrix(project_id).pass_rates(last_runs)
+
+    def flips(self, project_id: str, testcase_id: Optional[str] = None, last_runs: Optional[int] = None) -> List[dict]:
+        with self._lock:
+            return self.matrix(project_id).flips(testcase_id, last_runs)
+
+    def failing_on_every_environment(self, project_id: str) -> List[dict]:
+        with self._lock:
+            return self.matrix(project_id).failing_on_every_environment()
+
+    def invalidate(self, project_id: Optional[str] = None) -> None:
+        with self._lock:
+            if project_id is None:
+                self._matrices.clear()
+            else:
+                self._matrices.pop(project_id, None)
+
+    def project_for_run(self, testrun_id: str) -> Optional[str]:
+        with self._lock:
+            if testrun_id not in self._run_project:
+                self._testrun(testrun_id)
+            return self._run_project[testrun_id]
+
+    def _testrun(self, testrun_id: str) -> Optional[dict]:
+        testrun = testruns_collection.get(testrun_id)
+        self._run_project[testrun_id] = testrun.get('project_id') if testrun else None
+        return testrun
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        """Mirror a single result write into the loaded matrix, if any"""
+        with self._lock:
+            if not self._matrices:
+                return
+            row = after or before
+            testrun_id = row.get('testrun_id')
+            testrun = None
+            if testrun_id not in self._run_project:
+                testrun = self._testrun(testrun_id)
+            matrix = self._matrices.get(self._run_project.get(testrun_id))
+            if matrix is None:
+                return
+            if testrun_id not in matrix.run_index:
+                matrix.add_run(testrun or self._testrun(testrun_id) or {'id': testrun_id})
+            if before and (not after or before.get('testcase_id') != after.get('testcase_id')):
+                # Other results of the pair may remain; the cell falls back to the newest of them
+                matrix.mark_stale(testrun_id, before['testcase_id'])
+            if after:
+                # A write stamps updated_at, so the written row is the pair's latest
+                matrix.set_result(testrun_id, after['testcase_id'], after.get('status'))
+
+
+result_analytics = ResultAnalytics()
+change_events.subscribe('testresult', result_analytics.apply_change)
@@ -0,0 +1,201 @@
+"""
+Bulk test case create / update / move
+
+Each item is validated on its own (TestCaseCreate / TestCaseUpdate) so one
+bad item is reported instead of failing the whole request. Valid items are
+written with set-based statements per chunk: one INSERT for creates, one
+update_testcases_versioned() call for updates (only the submitted columns
+are written, together with the history, and only to cases still at the
+version that was read), and one UPDATE ... WHERE id IN (...) for moves. A chunk that fails as a whole is retried item
+by item to pinpoint the failing rows.
+"""
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.db.supabase import testcases_collection
+from app.schemas.testcase import TestCaseCreate, TestCaseUpdate
+from app.services import change_events
+from app.services.testcase_versions import update_versions
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 500
+
+
+class BulkReport:
+    """Per-item outcome of a bulk operation"""
+
+    def __init__(self):
+        self.results: List[dict] = []
+
+    def ok(self, index: int, testcase_id: str, status: str, version: Optional[int] = None) -> None:
+        self.results.append({
+            'index': index, 'id': testcase_id, 'status': status, 'version': version, 'error': None
+        })
+
+    def error(self, index: int, message: str, testcase_id: Optional[str] = None) -> None:
+        self.results.append({
+            'index': index, 'id': testcase_id, 'status': 'error', 'version': None, 'error': message
+        })
+
+    def to_dict(self) -> dict:
+        results = sorted(self.results, key=lambda item: item['index'])
+        failed = sum(1 for item in results if item['status'] == 'error')
+        return {'succeeded': len(results) - failed, 'failed': failed, 'results': results}
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+    )
+
+
+def _chunks(items: List, size: int = BULK_CHUNK_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _insert_testcases(rows: List[dict]) -> List[dict]:
+    try:
+        created = testcases_collection.create_many(rows)
+    except Exception as e:
+        # Same schema fallback as the single create endpoint
+        if "Could not find the 'created_by' column" not in str(e):
+            raise
+        created = testcases_collection.create_many(
+            [{k: v for k, v in row.items() if k != 'created_by'} for row in rows]
+        )
+    for testcase in created:
+        change_events.publish('testcase', None, testcase)
+    return created
+
+
+def _update_testcases(pending: List[Tuple[int, dict, dict, Optional[str]]], modified_by: str) -> Dict[str, dict]:
+    updated = update_versions(
+        [(testcase, update_data, change_note) for _, testcase, update_data, change_note in pending], modified_by
+    )
+    for _, testcase, _, _ in pending:
+        if testcase['id'] in updated:
+            change_events.publish('testcase', testcase, updated[testcase['id']])
+    return updated
+
+
+def bulk_create(items: List[dict], created_by: str) -> BulkReport:
+    report = BulkReport()
+    valid: List[Tuple[int, dict]] = []
+    for index, item in enumerate(items):
+        try:
+            # json round-trip turns enums into plain strings, as in create_testcase
+            data = json.loads(TestCaseCreate(**item).json())
+        except ValidationError as e:
+            report.error(index, _validation_message(e))
+            continue
+        data['tags'] = data.get('tags') or []
+        data['created_by'] = created_by
+        valid.append((index, data))
+
+    for chunk in _chunks(valid):
+        try:
+            created = _insert_testcases([data for _, data in chunk])
+            # PostgREST returns inserted rows in input order
+            for (index, _), row in zip(chunk, created):
+                report.ok(index, row['id'], 'created')
+            continue
+        except Exception as e:
+            logger.warning(f"Bulk insert of {len(chunk)} test cases failed, retrying one by one: {e}")
+
+        for index, data in chunk:
+            try:
+                row = _insert_testcases([data])[0]
+                report.ok(index, row['id'], 'created')
+            except Exception as e:
+                report.error(index, str(e))
+    return report
+
+
+def bulk_update(items: List[dict], modified_by: str) -> BulkReport:
+    report = BulkReport()
+    updates: List[Tuple[int, str, dict, Optional[str]]] = []
+    seen = set()
+    for index, item in enumerate(items):
+        testcase_id = item.get('id')
+        if not testcase_id:
+            report.error(index, "id is required")
+            continue
+        if testcase_id in seen:
+            report.error(index, "Duplicate id in request", testcase_id)
+            continue
+        try:
+            testcase_in = TestCaseUpdate(**{k: v for k, v in item.items() if k != 'id'})
+        except ValidationError as e:
+            report.error(index, _validation_message(e), testcase_id)
+            continue
+        seen.add(testcase_id)
+        update_data = json.loads(testcase_in.json(exclude_unset=True))
+        change_note = update_data.pop('change_note', None)
+        updates.append((index, testcase_id, update_data, change_note))
+
+    for chunk in _chunks(updates):
+        ids = [testcase_id for _, testcase_id, _, _ in chunk]
+        current = {row['id']: row for row in testcases_collection.iter_rows_in('id', ids)}
+
+        pending = []
+        for index, testcase_id, update_data, change_note in chunk:
+            testcase = current.get(testcase_id)
+            if not testcase:
+                report.error(index, "Test case not found", testcase_id)
+                continue
+            pending.append((index, testcase, update_data, change_note))
+
+        def record(items: List[Tuple[int, dict, dict, Optional[str]]], updated: Dict[str, dict]) -> None:
+            for index, testcase, _, _ in items:
+                if testcase['id'] in updated:
+                    report.ok(index, testcase['id'], 'updated', updated[testcase['id']].get('version'))
+                else:
+                    report.error(index, "Test case was changed or deleted concurrently", testcase['id'])
+
+        try:
+            record(pending, _update_testcases(pending, modified_by))
+            continue
+        except Exception as e:
+            logger.warning(f"Bulk update of {len(pending)} test cases failed, retrying one by one: {e}")
+
+        for entry in pending:
+            try:
+                record([entry], _update_testcases([entry], modified_by))
+            except Exception as e:
+                report.error(entry[0], str(e), entry[1]['id'])
+    return report
+
+
+def bulk_move(testcase_ids: List[str], folder_id: Optional[str], project_id: Optional[str] = None) -> BulkReport:
+    """Move cases into folder_id; with project_id, only cases of that project (the folder's) are moved"""
+    report = BulkReport()
+    positions: Dict[str, int] = {}
+    for index, testcase_id in enumerate(testcase_ids):
+        if testcase_id in positions:
+            report.error(index, "Duplicate id in request", testcase_id)
+            continue
+        positions[testcase_id] = index
+
+    for chunk in _chunks(list(positions)):
+        before = {row['id']: row for row in testcases_collection.iter_rows_in('id', chunk)}
+        filters = [('id', 'in', chunk)]
+        if project_id is not None:
+            filters.append(('project_id', '==', project_id))
+        moved = {
+            row['id']: row
+            for row in testcases_collection.update_where(filters, {'folder_id': folder_id})
+        }
+        for testcase_id in chunk:
+            if testcase_id in moved:
+                change_events.publish('testcase', before.get(testcase_id), moved[testcase_id])
+                report.ok(positions[testcase_id], testcase_id, 'moved')
+            elif testcase_id in before:
+                report.error(positions[testcase_id], "Test case belongs to another project", testcase_id)
+            else:
+                report.error(positions[testcase_id], "Test case not found", testcase_id)
+    return report
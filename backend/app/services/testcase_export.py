@@ -0,0 +1,131 @@
+"""
+Streaming test case export (xlsx, csv, jsonl)
+
+Rows are paged from the database with keyset pagination (iter_rows) and
+written out as they arrive, so memory stays bounded regardless of project
+size. CSV and JSONL chunks are yielded straight to the response; xlsx is
+built with openpyxl's write_only mode into a temp file (a zip container
+cannot be emitted before it is finalized) and then streamed from disk.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from typing import Iterator, List
+
+from openpyxl import Workbook
+
+from app.db.supabase import testcases_collection
+
+EXPORT_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson'
+}
+
+EXPORT_COLUMNS = [
+    'id', 'title', 'description', 'preconditions', 'steps', 'expected_result',
+    'priority', 'test_type', 'tags', 'folder_id', 'created_at', 'updated_at'
+]
+
+# The first eight columns match the import template, so exports can be re-imported
+SHEET_HEADERS = [
+    "프로젝트 이름", "제목", "설명", "사전조건", "수행방법", "예상결과", "우선순위", "테스트 유형",
+    "ID", "태그", "폴더 ID", "생성일", "수정일"
+]
+
+
+def _iter_testcases(project_id: str) -> Iterator[dict]:
+    return testcases_collection.iter_rows(
+        filters=[('project_id', '==', project_id)],
+        columns=EXPORT_COLUMNS,
+        page_size=EXPORT_PAGE_SIZE
+    )
+
+
+def _sheet_row(project_name: str, tc: dict) -> List:
+    return [
+        project_name,
+        tc.get('title'),
+        tc.get('description'),
+        tc.get('preconditions'),
+        tc.get('steps'),
+        tc.get('expected_result'),
+        tc.get('priority'),
+        tc.get('test_type'),
+        tc.get('id'),
+        ', '.join(tc.get('tags') or []),
+        tc.get('folder_id'),
+        tc.get('created_at'),
+        tc.get('updated_at')
+    ]
+
+
+def iter_csv(project: dict) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so that Excel opens Korean text as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(SHEET_HEADERS)
+    # Send the header right away so the download starts immediately
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    for tc in _iter_testcases(project['id']):
+        writer.writerow(_sheet_row(project.get('name', ''), tc))
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def iter_jsonl(project: dict) -> Iterator[bytes]:
+    chunk = []
+    size = 0
+    first_sent = False
+    for tc in _iter_testcases(project['id']):
+        line = json.dumps({**tc, 'project_id': project['id']}, ensure_ascii=False, default=str) + '\n'
+        chunk.append(line)
+        size += len(line)
+        # The first row goes out alone so the download starts immediately
+        if size >= STREAM_CHUNK_SIZE or (len(chunk) == 1 and not first_sent):
+            first_sent = True
+            yield ''.join(chunk).encode('utf-8')
+            chunk, size = [], 0
+
+    yield ''.join(chunk).encode('utf-8')
+
+
+def iter_xlsx(project: dict) -> Iterator[bytes]:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("테스트 케이스")
+    ws.append(SHEET_HEADERS)
+    for tc in _iter_testcases(project['id']):
+        ws.append(_sheet_row(project.get('name', ''), tc))
+
+    fd, path = tempfile.mkstemp(prefix='tcms-export-', suffix='.xlsx')
+    os.close(fd)
+    try:
+        wb.save(path)
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(STREAM_CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.unlink(path)
+
+
+EXPORTERS = {
+    'xlsx': iter_xlsx,
+    'csv': iter_csv,
+    'jsonl': iter_jsonl
+}
@@ -0,0 +1,111 @@
+"""
+Faceted counts of test cases per project
+
+Counts by tag, priority, test_type and folder are kept per project in
+memory, built on first use with one projected scan and maintained through
+"testcase" change events, so /testcases/facets answers without reading the
+test cases. Tag filtering of list queries is done in the database
+(tags @> / && with the GIN index from migrations/add_testcase_tags_index.sql).
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.db.supabase import testcases_collection
+from app.services import change_events
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = ['tags', 'priority', 'test_type', 'folder_id']
+
+
+def _facet_values(testcase: dict) -> Tuple[str, Dict[str, List]]:
+    return testcase.get('project_id'), {
+        'tags': list(dict.fromkeys(testcase.get('tags') or [])),
+        'priority': [testcase.get('priority')],
+        'test_type': [testcase.get('test_type')],
+        'folder_id': [testcase.get('folder_id')]
+    }
+
+
+class FacetIndex:
+    """Per-project Counters of facet values, updated per test case write"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changes = change_events.LoadBuffer()
+        self._docs: Dict[str, Tuple[str, Dict[str, List]]] = {}
+        self._counts: Dict[str, Dict[str, Counter]] = defaultdict(lambda: {f: Counter() for f in FACET_FIELDS})
+        self._totals: Counter = Counter()
+
+    def _add(self, testcase: dict) -> None:
+        self._remove(testcase['id'])
+        project_id, values = _facet_values(testcase)
+        self._docs[testcase['id']] = (project_id, values)
+        self._totals[project_id] += 1
+        counts = self._counts[project_id]
+        for field, field_values in values.items():
+            counts[field].update(field_values)
+
+    def _remove(self, testcase_id: Optional[str]) -> None:
+        doc = self._docs.pop(testcase_id, None)
+        if doc is None:
+            return
+        project_id, values = doc
+        self._totals[project_id] -= 1
+        counts = self._counts[project_id]
+        for field, field_values in values.items():
+            counts[field].subtract(field_values)
+            for value in field_values:
+                if counts[field][value] <= 0:
+                    del counts[field][value]
+
+    def _ensure_loaded(self) -> None:
+        if self._changes.loaded:
+            return
+        with self._lock:
+            if self._changes.loaded:
+                return
+            # Writes landing while the rows are read are replayed afterwards
+            self._changes.start()
+            try:
+                for testcase in testcases_collection.iter_rows(columns=['project_id'] + FACET_FIELDS):
+                    self._add(testcase)
+            except Exception:
+                self._changes.abort()
+                self._docs.clear()
+                self._counts.clear()
+                self._totals.clear()
+                raise
+            self._changes.finish(self._apply)
+            logger.info(f"Facet index loaded: {len(self._docs)} test cases")
+
+    def _apply(self, before: Optional[dict], after: Optional[dict]) -> None:
+        with self._lock:
+            if after:
+                self._add(after)
+            elif before:
+                self._remove(before.get('id'))
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        # Before the load nothing needs maintaining: the load reads current state
+        if self._changes.offer(before, after):
+            self._apply(before, after)
+
+    def facets(self, project_id: str) -> dict:
+        """Counts by tag, priority, test_type and folder, most frequent first"""
+        self._ensure_loaded()
+        with self._lock:
+            counts = self._counts.get(project_id) or {f: Counter() for f in FACET_FIELDS}
+            result = {'project_id': project_id, 'total': self._totals.get(project_id, 0)}
+            for field in FACET_FIELDS:
+                result[field] = [
+                    {'value': value, 'count': count}
+                    for value, count in counts[field].most_common()
+                ]
+            return result
+
+
+facet_index = FacetIndex()
+change_events.subscribe('testcase', facet_index.apply_change)
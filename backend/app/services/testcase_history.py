@@ -0,0 +1,251 @@
+"""
+Delta-compressed test case history
+
+The large text fields (DELTA_FIELDS) of a history record are stored as a
+reverse delta against the next newer version; every SNAPSHOT_INTERVAL-th
+version, and every record written before deltas existed (delta IS NULL), is
+a full snapshot. Reverse deltas need nothing but the row being replaced and
+the row replacing it, so writing a version never reads the history.
+
+A version is rebuilt by walking up to the nearest full snapshot (or the
+live test case row), at most SNAPSHOT_INTERVAL records, and applying deltas
+downwards. History records never change once written, so materialized
+versions are kept in an LRU.
+
+Diffs between two versions (diff_versions) are line-level Myers diffs per
+field; since versions are immutable they are memoized as well.
+
+Delta format: {field: {"ops": [...]}} where an int n > 0 copies n lines of
+the newer text, n < 0 skips -n lines, and a string is inserted as is; or
+{field: {"value": text}} when a plain copy is smaller.
+"""
+import json
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+
+from app.db.supabase import testcase_history_collection
+from app.services import change_events
+from app.services.text_diff import diff_lines
+
+SNAPSHOT_INTERVAL = 10
+MAX_CACHED_VERSIONS = 2048
+MAX_CACHED_DIFFS = 256
+
+DELTA_FIELDS = ['description', 'preconditions', 'steps', 'expected_result']
+TEXT_FIELDS = ['title'] + DELTA_FIELDS
+VALUE_FIELDS = ['priority', 'test_type', 'tags']
+
+
+def encode_text_delta(source: Optional[str], target: Optional[str]) -> dict:
+    """Delta that turns source into target"""
+    if source is None or target is None:
+        return {'value': target}
+    a = source.splitlines(keepends=True)
+    b = target.splitlines(keepends=True)
+    ops: List = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            ops.append(i2 - i1)
+            continue
+        if i2 > i1:
+            ops.append(-(i2 - i1))
+        if j2 > j1:
+            ops.append(''.join(b[j1:j2]))
+    if len(json.dumps(ops, ensure_ascii=False)) >= len(json.dumps(target, ensure_ascii=False)):
+        return {'value': target}
+    return {'ops': ops}
+
+
+def apply_text_delta(source: Optional[str], delta: dict) -> Optional[str]:
+    if 'value' in delta:
+        return delta['value']
+    lines = (source or '').splitlines(keepends=True)
+    out: List[str] = []
+    pos = 0
+    for op in delta['ops']:
+        if isinstance(op, str):
+            out.append(op)
+        elif op > 0:
+            out.extend(lines[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return ''.join(out)
+
+
+def encode_delta(newer: dict, older: dict) -> dict:
+    """Reverse delta of the large text fields: rebuilds `older` from `newer`"""
+    return {
+        field: encode_text_delta(newer.get(field), older.get(field))
+        for field in DELTA_FIELDS
+        if newer.get(field) != older.get(field)
+    }
+
+
+def is_snapshot_version(version: int) -> bool:
+    return version % SNAPSHOT_INTERVAL == 0
+
+
+class HistoryStore:
+    """Rebuilds history versions from snapshots + deltas, with an LRU of results"""
+
+    def __init__(self, max_entries: int = MAX_CACHED_VERSIONS):
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Tuple[str, int], dict]' = OrderedDict()
+        self._max_entries = max_entries
+        self._diffs: 'OrderedDict[Tuple[str, int, int], dict]' = OrderedDict()
+
+    def _get(self, key: Tuple[str, int]) -> Optional[dict]:
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None:
+                self._entries.move_to_end(key)
+            return record
+
+    def _put(self, key: Tuple[str, int], record: dict) -> None:
+        with self._lock:
+            self._entries[key] = record
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, testcase_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == testcase_id]:
+                del self._entries[key]
+            for key in [key for key in self._diffs if key[0] == testcase_id]:
+                del self._diffs[key]
+
+    @staticmethod
+    def _fetch(testcase_id: str, start: int) -> Dict[int, dict]:
+        rows = testcase_history_collection.query_complex([
+            ('testcase_id', '==', testcase_id),
+            ('version', '>=', start),
+            ('version', '<=', start + SNAPSHOT_INTERVAL)
+        ])
+        return {row['version']: row for row in rows}
+
+    def _materialize(self, testcase: dict, version: int, rows: Dict[int, dict]) -> Optional[dict]:
+        testcase_id = testcase['id']
+        cached = self._get((testcase_id, version))
+        if cached is not None:
+            return cached
+        if version not in rows:
+            rows.update(self._fetch(testcase_id, version))
+            if version not in rows:
+                return None
+
+        # Walk up to something complete: a cached version, a snapshot, or the live row
+        chain: List[dict] = []
+        current_version = testcase.get('version') or 0
+        u = version
+        while True:
+            cached = self._get((testcase_id, u))
+            if cached is not None:
+                base = cached
+                break
+            row = rows.get(u)
+            if row is None and u < current_version:
+                rows.update(self._fetch(testcase_id, u))
+                row = rows.get(u)
+            if row is None:
+                base = testcase
+                break
+            if row.get('delta') is None:
+                base = {k: v for k, v in row.items() if k != 'delta'}
+                self._put((testcase_id, u), base)
+                break
+            chain.append(row)
+            u += 1
+
+        # Apply reverse deltas downwards
+        record = base
+        for row in reversed(chain):
+            newer = record
+            record = {k: v for k, v in row.items() if k != 'delta'}
+            delta = row['delta'] or {}
+            for field in DELTA_FIELDS:
+                record[field] = (
+                    apply_text_delta(newer.get(field), delta[field]) if field in delta else newer.get(field)
+                )
+            self._put((testcase_id, row['version']), record)
+        return record
+
+    def get_version(self, testcase: dict, version: int) -> Optional[dict]:
+        """Full history record of one version, or None if it does not exist"""
+        record = self._materialize(testcase, version, {})
+        return dict(record) if record is not None else None
+
+    def get_page(self, testcase: dict, skip: int = 0, limit: int = 20) -> List[dict]:
+        """Full history records, newest first"""
+        rows = testcase_history_collection.page(
+            filters=[('testcase_id', '==', testcase['id'])],
+            order_by='version',
+            descending=True,
+            limit=limit,
+            offset=skip
+        )
+        known = {row['version']: row for row in rows}
+        # Newest first, so each version is one delta away from the one before it
+        return [dict(self._materialize(testcase, row['version'], known)) for row in rows]
+
+    def resolve(self, testcase: dict, version: int) -> Optional[dict]:
+        """State of any version, the current one included"""
+        if version == testcase.get('version'):
+            return testcase
+        return self.get_version(testcase, version)
+
+    def diff_versions(self, testcase: dict, from_version: int, to_version: int) -> Optional[dict]:
+        """Field-by-field diff of two versions, or None if either does not exist"""
+        key = (testcase['id'], from_version, to_version)
+        with self._lock:
+            cached = self._diffs.get(key)
+            if cached is not None:
+                self._diffs.move_to_end(key)
+                return cached
+
+        old = self.resolve(testcase, from_version)
+        new = self.resolve(testcase, to_version)
+        if old is None or new is None:
+            return None
+
+        fields = []
+        for field in TEXT_FIELDS:
+            changed = old.get(field) != new.get(field)
+            fields.append({
+                'field': field,
+                'changed': changed,
+                'chunks': diff_lines(old.get(field), new.get(field)) if changed else []
+            })
+        for field in VALUE_FIELDS:
+            fields.append({
+                'field': field,
+                'changed': old.get(field) != new.get(field),
+                'old_value': old.get(field),
+                'new_value': new.get(field)
+            })
+        result = {
+            'testcase_id': testcase['id'],
+            'from_version': from_version,
+            'to_version': to_version,
+            'fields': fields
+        }
+
+        with self._lock:
+            self._diffs[key] = result
+            while len(self._diffs) > MAX_CACHED_DIFFS:
+                self._diffs.popitem(last=False)
+        return result
+
+
+history_store = HistoryStore()
+
+
+def _drop_deleted(before: Optional[dict], after: Optional[dict]) -> None:
+    if before and not after:
+        history_store.invalidate(before['id'])
+
+
+change_events.subscribe('testcase', _drop_deleted)
@@ -0,0 +1,237 @@
+"""
+Streaming test case import pipeline
+
+Rows are read one at a time from a read-only openpyxl workbook, validated
+against a project name -> id map resolved once up front, and written with
+chunked bulk inserts. Only one batch of rows is held in memory, so peak
+memory does not grow with the sheet size.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+from pydantic import ValidationError
+
+from app.db.supabase import projects_collection, testcases_collection
+from app.schemas.testcase import TestCaseCreate
+from app.services import change_events
+from app.services.jobs import Job, job_manager
+from app.services.testcase_similarity import similarity_index
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+VALID_PRIORITIES = ['high', 'medium', 'low']
+VALID_TEST_TYPES = ['functional', 'regression', 'smoke', 'integration', 'performance', 'security']
+
+
+class ImportReport:
+    """Running counters and per-row errors of an import"""
+
+    def __init__(self):
+        self.processed_count = 0
+        self.imported_count = 0
+        self.failed_count = 0
+        self.errors: List[str] = []
+        # Rows that were imported but look like existing test cases
+        self.duplicate_count = 0
+        self.duplicate_warnings: List[str] = []
+
+    def add_error(self, message: str) -> None:
+        self.failed_count += 1
+        # Keep the error list bounded; failed_count stays exact
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+    def add_duplicate_warning(self, message: str) -> None:
+        self.duplicate_count += 1
+        if len(self.duplicate_warnings) < MAX_REPORTED_ERRORS:
+            self.duplicate_warnings.append(message)
+
+    def to_dict(self) -> dict:
+        return {
+            "processed_count": self.processed_count,
+            "imported_count": self.imported_count,
+            "failed_count": self.failed_count,
+            "errors": self.errors,
+            "duplicate_count": self.duplicate_count,
+            "duplicate_warnings": self.duplicate_warnings,
+            "success": self.imported_count > 0
+        }
+
+
+def iter_excel_rows(fileobj) -> Iterator[Tuple[int, tuple]]:
+    """Yield (row number, values) for each data row of the active sheet"""
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        # Skip header row
+        for row_num, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+            yield row_num, row
+    finally:
+        wb.close()
+
+
+def load_project_ids() -> Dict[str, str]:
+    """Project name -> id map, resolved with a single projected scan"""
+    return {
+        str(project['name']): project['id']
+        for project in projects_collection.iter_rows(columns=['name'])
+    }
+
+
+def validate_row(row_num: int, row: tuple, project_ids: Dict[str, str]) -> Tuple[Optional[dict], Optional[str]]:
+    """Convert a sheet row into testcase data, or return an error message"""
+    row = tuple(row[:8]) + (None,) * (8 - len(row[:8]))
+    project_name, title, description, preconditions, steps, expected_result, priority, test_type = row
+
+    # Validate required fields
+    if not all([project_name, title, steps, expected_result, priority, test_type]):
+        return None, f"행 {row_num}: 필수 필드가 누락되었습니다"
+
+    project_id = project_ids.get(str(project_name))
+    if not project_id:
+        return None, f"행 {row_num}: 프로젝트 '{project_name}'을(를) 찾을 수 없습니다"
+
+    # Validate priority
+    if priority not in VALID_PRIORITIES:
+        return None, f"행 {row_num}: 우선순위는 high, medium, low 중 하나여야 합니다"
+
+    # Validate test_type
+    if test_type not in VALID_TEST_TYPES:
+        return None, f"행 {row_num}: 테스트 유형은 {', '.join(VALID_TEST_TYPES)} 중 하나여야 합니다"
+
+    testcase_data = {
+        'project_id': str(project_id),
+        'title': str(title),
+        'description': str(description) if description else None,
+        'preconditions': str(preconditions) if preconditions else None,
+        'steps': str(steps),
+        'expected_result': str(expected_result),
+        'priority': str(priority),
+        'test_type': str(test_type)
+    }
+
+    # Same length/content rules as the create API
+    try:
+        TestCaseCreate(**testcase_data)
+    except ValidationError as e:
+        messages = "; ".join(err['msg'] for err in e.errors())
+        return None, f"행 {row_num}: {messages}"
+
+    return testcase_data, None
+
+
+def _insert_batch(batch: List[Tuple[int, dict]], report: ImportReport) -> List[dict]:
+    try:
+        created = testcases_collection.create_many([data for _, data in batch])
+        report.imported_count += len(created)
+        return created
+    except Exception as e:
+        logger.warning(f"Bulk insert of {len(batch)} test cases failed, retrying row by row: {e}")
+
+    created = []
+    for row_num, data in batch:
+        try:
+            created.append(testcases_collection.create(data))
+            report.imported_count += 1
+        except Exception as e:
+            report.add_error(f"행 {row_num}: {str(e)}")
+    return created
+
+
+def _flush(batch: List[Tuple[int, dict]], report: ImportReport) -> List[dict]:
+    """Bulk insert a validated batch; fall back to per-row inserts to pinpoint failures"""
+    if not batch:
+        return []
+    created = _insert_batch(batch, report)
+    for testcase in created:
+        change_events.publish('testcase', None, testcase)
+    return created
+
+
+def import_testcase_rows(
+    rows: Iterable[Tuple[int, tuple]],
+    report: Optional[ImportReport] = None,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    on_batch: Optional[Callable[[ImportReport], None]] = None
+) -> ImportReport:
+    """Validate and insert (row number, values) rows in batches"""
+    report = report or ImportReport()
+    project_ids = load_project_ids()
+    batch: List[Tuple[int, dict]] = []
+
+    def flush():
+        _flush(batch, report)
+        batch.clear()
+        if on_batch:
+            on_batch(report)
+
+    for row_num, row in rows:
+        if not row or not any(row):  # Skip empty rows
+            continue
+        report.processed_count += 1
+
+        testcase_data, error = validate_row(row_num, row, project_ids)
+        if error:
+            report.add_error(error)
+            continue
+
+        # Flag likely duplicates of existing cases; the row is still imported
+        matches = similarity_index.find_similar(testcase_data['project_id'], testcase_data, limit=1)
+        if matches:
+            match = matches[0]
+            report.add_duplicate_warning(
+                f"행 {row_num}: 기존 테스트 케이스 '{match['title']}'와(과) 유사합니다 (유사도 {match['similarity']:.2f})"
+            )
+
+        batch.append((row_num, testcase_data))
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return report
+
+
+def _report_progress(job: Job, report: ImportReport) -> None:
+    job.update(
+        processed_count=report.processed_count,
+        imported_count=report.imported_count,
+        failed_count=report.failed_count,
+        duplicate_count=report.duplicate_count
+    )
+    for message in report.errors[len(job.errors):]:
+        job.add_error(message)
+
+
+def submit_excel_import(fileobj, created_by: Optional[str] = None) -> Job:
+    """Spool an uploaded workbook to disk and import it in the background"""
+    # The upload is closed once the request returns, so keep our own copy
+    with tempfile.NamedTemporaryFile(prefix='tcms-import-', suffix='.xlsx', delete=False) as tmp:
+        shutil.copyfileobj(fileobj, tmp, length=1024 * 1024)
+        path = tmp.name
+
+    def run(job: Job) -> dict:
+        report = ImportReport()
+        _report_progress(job, report)
+        try:
+            with open(path, 'rb') as f:
+                import_testcase_rows(
+                    iter_excel_rows(f),
+                    report=report,
+                    on_batch=lambda r: _report_progress(job, r)
+                )
+        finally:
+            os.unlink(path)
+            _report_progress(job, report)
+        return {
+            "success": report.imported_count > 0,
+            "duplicate_warnings": report.duplicate_warnings
+        }
+
+    return job_manager.submit('testcase_import_excel', run, created_by=created_by)
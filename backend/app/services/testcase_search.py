@@ -0,0 +1,66 @@
+"""
+Full-text search over test cases
+
+Runs in Postgres (migrations/add_testcase_search.sql): a trigram GIN index
+over title, tags, description, steps and expected result answers substring
+queries, which works for Korean (no spaces between morphemes, no stemming
+needed) as well as for Latin text. A query matches a case when every one of
+its words occurs in it; title and tag matches rank first.
+
+The index is kept current by Postgres itself, so the API holds no search
+state and needs no warm-up.
+"""
+import unicodedata
+from typing import List, Optional, Set, Tuple
+
+from app.db.supabase import call_rpc
+
+# Returned with each hit so the UI can render results without another fetch
+SUMMARY_FIELDS = ['project_id', 'folder_id', 'title', 'priority', 'test_type']
+
+IDS_PAGE_SIZE = 1000
+
+
+def _normalize(query: str) -> str:
+    return unicodedata.normalize('NFKC', query)
+
+
+def search(
+    query: str,
+    project_id: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 20
+) -> Tuple[int, List[dict]]:
+    """(total matches, one page of ranked hits)"""
+    params = {'p_query': _normalize(query), 'p_project_id': project_id, 'p_limit': limit, 'p_offset': skip}
+    rows = call_rpc('search_testcases', params)
+    if rows:
+        total = rows[0]['total']
+    elif skip:
+        # Past the last page: the window count is only returned with rows
+        first = call_rpc('search_testcases', {**params, 'p_limit': 1, 'p_offset': 0})
+        total = first[0]['total'] if first else 0
+    else:
+        total = 0
+    hits = [
+        {'id': row['id'], **{field: row.get(field) for field in SUMMARY_FIELDS}, 'score': round(row['score'], 4)}
+        for row in rows
+    ]
+    return total, hits
+
+
+def matching_ids(query: str, project_id: Optional[str] = None) -> Set[str]:
+    """Ids of every case matching the query, unranked"""
+    ids: Set[str] = set()
+    last_id = None
+    while True:
+        rows = call_rpc('search_testcase_ids', {
+            'p_query': _normalize(query),
+            'p_project_id': project_id,
+            'p_after': last_id,
+            'p_limit': IDS_PAGE_SIZE
+        })
+        ids.update(row['id'] for row in rows)
+        if len(rows) < IDS_PAGE_SIZE:
+            return ids
+        last_id = rows[-1]['id']
@@ -0,0 +1,242 @@
+"""
+Near-duplicate detection for test cases (MinHash + LSH)
+
+Each case's title, description, steps and expected result are normalized
+and cut into character 3-gram shingles; a NUM_PERM-value MinHash signature
+estimates the Jaccard similarity of two shingle sets. Signatures are split
+into BANDS bands, and cases sharing any band bucket (within a project) are
+the only pairs ever compared, so finding duplicates of one case, or all
+clusters of a project, never compares every pair.
+
+The index is built on first use and maintained through "testcase" change
+events.
+"""
+import logging
+import re
+import threading
+import unicodedata
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.db.supabase import testcases_collection
+from app.services import change_events
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS  # LSH candidate threshold ~ (1/16)^(1/4) = 0.5
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.7
+MAX_MATCHES = 5
+
+TEXT_FIELDS = ['title', 'description', 'steps', 'expected_result']
+
+# One random 64-bit seed per hash function; shingle hashes are XORed with the
+# seed and passed through the splitmix64 finalizer
+_rng = np.random.RandomState(20240611)
+_SEEDS = _rng.randint(0, 2 ** 63 - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalized_text(testcase: dict) -> str:
+    parts = []
+    for field in TEXT_FIELDS:
+        value = testcase.get(field)
+        if isinstance(value, list):  # AI output has steps as a list
+            value = ' '.join(str(v) for v in value)
+        if value:
+            parts.append(str(value))
+    text = unicodedata.normalize('NFKC', ' '.join(parts)).casefold()
+    return _NON_WORD_RE.sub(' ', text).strip()
+
+
+def signature(testcase: dict) -> Optional[np.ndarray]:
+    """MinHash signature of a case's text, or None if it has no text"""
+    text = normalized_text(testcase)
+    if not text:
+        return None
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles)
+    )
+    z = hashes[:, None] ^ _SEEDS[None, :]
+    with np.errstate(over='ignore'):
+        z = (z ^ (z >> np.uint64(30))) * _MIX_1
+        z = (z ^ (z >> np.uint64(27))) * _MIX_2
+    z ^= z >> np.uint64(31)
+    # Minimum of every hash function over the shingles
+    return z.min(axis=0)
+
+
+def _band_keys(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    return [
+        (band, sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+class SimilarityIndex:
+    """LSH buckets of MinHash signatures, per project"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._changes = change_events.LoadBuffer()
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._docs: Dict[str, Tuple[str, str]] = {}  # testcase_id -> (project_id, title)
+        self._buckets: Dict[str, Dict[Tuple[int, bytes], Set[str]]] = defaultdict(lambda: defaultdict(set))
+
+    def _add(self, testcase: dict) -> None:
+        testcase_id = testcase['id']
+        self._remove(testcase_id)
+        sig = signature(testcase)
+        if sig is None:
+            return
+        project_id = testcase.get('project_id')
+        self._signatures[testcase_id] = sig
+        self._docs[testcase_id] = (project_id, testcase.get('title') or '')
+        buckets = self._buckets[project_id]
+        for key in _band_keys(sig):
+            buckets[key].add(testcase_id)
+
+    def _remove(self, testcase_id: Optional[str]) -> None:
+        sig = self._signatures.pop(testcase_id, None)
+        if sig is None:
+            return
+        project_id, _ = self._docs.pop(testcase_id)
+        buckets = self._buckets[project_id]
+        for key in _band_keys(sig):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(testcase_id)
+                if not members:
+                    del buckets[key]
+
+    def _ensure_loaded(self) -> None:
+        if self._changes.loaded:
+            return
+        with self._lock:
+            if self._changes.loaded:
+                return
+            # Writes landing while the rows are read are replayed afterwards
+            self._changes.start()
+            try:
+                for testcase in testcases_collection.iter_rows(columns=['project_id'] + TEXT_FIELDS):
+                    self._add(testcase)
+            except Exception:
+                self._changes.abort()
+                self._signatures.clear()
+                self._docs.clear()
+                self._buckets.clear()
+                raise
+            self._changes.finish(self._apply)
+            logger.info(f"Similarity index loaded: {len(self._signatures)} test cases")
+
+    def _apply(self, before: Optional[dict], after: Optional[dict]) -> None:
+        with self._lock:
+            if after:
+                self._add(after)
+            elif before:
+                self._remove(before.get('id'))
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        # Before the load nothing needs maintaining: the load reads current state
+        if self._changes.offer(before, after):
+            self._apply(before, after)
+
+    def find_similar(
+        self,
+        project_id: str,
+        testcase: dict,
+        threshold: float = DEFAULT_THRESHOLD,
+        limit: int = MAX_MATCHES
+    ) -> List[dict]:
+        """Existing cases of the project that look like `testcase` (which need not be saved)"""
+        self._ensure_loaded()
+        sig = signature(testcase)
+        if sig is None:
+            return []
+        with self._lock:
+            buckets = self._buckets.get(project_id) or {}
+            candidates: Set[str] = set()
+            for key in _band_keys(sig):
+                candidates.update(buckets.get(key, ()))
+            candidates.discard(testcase.get('id'))
+
+            matches = []
+            for candidate in candidates:
+                score = similarity(sig, self._signatures[candidate])
+                if score >= threshold:
+                    matches.append({
+                        'id': candidate,
+                        'title': self._docs[candidate][1],
+                        'similarity': round(score, 3)
+                    })
+        matches.sort(key=lambda match: match['similarity'], reverse=True)
+        return matches[:limit]
+
+    def clusters(self, project_id: str, threshold: float = DEFAULT_THRESHOLD) -> List[dict]:
+        """Groups of near-duplicate cases (connected by pairs above threshold), largest first"""
+        self._ensure_loaded()
+        parent: Dict[str, str] = {}
+
+        def find(x: str) -> str:
+            while parent.setdefault(x, x) != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        best: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            checked: Set[Tuple[str, str]] = set()
+            for members in (self._buckets.get(project_id) or {}).values():
+                if len(members) < 2:
+                    continue
+                ordered = sorted(members)
+                for i, a in enumerate(ordered):
+                    for b in ordered[i + 1:]:
+                        if (a, b) in checked:
+                            continue
+                        checked.add((a, b))
+                        score = similarity(self._signatures[a], self._signatures[b])
+                        if score >= threshold:
+                            parent[find(a)] = find(b)
+                            best[a] = max(best[a], score)
+                            best[b] = max(best[b], score)
+
+            groups: Dict[str, List[str]] = defaultdict(list)
+            for testcase_id in parent:
+                groups[find(testcase_id)].append(testcase_id)
+
+            clusters = []
+            for members in groups.values():
+                if len(members) < 2:
+                    continue
+                clusters.append({
+                    'size': len(members),
+                    'max_similarity': round(max(best[m] for m in members), 3),
+                    'testcases': [
+                        {'id': m, 'title': self._docs[m][1], 'similarity': round(best[m], 3)}
+                        for m in sorted(members, key=lambda m: best[m], reverse=True)
+                    ]
+                })
+        clusters.sort(key=lambda c: (c['size'], c['max_similarity']), reverse=True)
+        return clusters
+
+
+similarity_index = SimilarityIndex()
+change_events.subscribe('testcase', similarity_index.apply_change)
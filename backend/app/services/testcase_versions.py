@@ -0,0 +1,160 @@
+"""
+Test case version allocation
+
+testcases.version is a per-case counter. Before an edit, the current state is
+snapshotted into testcase_history under the current version and the counter
+is incremented, both inside the record_testcase_versions() Postgres function
+(migrations/add_testcase_version_counter.sql). Allocation is O(1) per case,
+batch-capable, and serialized by the row lock instead of by reading the
+whole history.
+
+The snapshot is delta-compressed against the new state unless its version
+is a full-snapshot version (see testcase_history). Edits go through
+update_versions(), which applies them and writes their snapshots in one
+statement (update_testcases_versioned(), migrations/add_versioned_testcase_update.sql),
+guarded by the version the edit was made against.
+"""
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.db.supabase import call_rpc, testcases_collection, testcase_history_collection
+from app.services.testcase_history import encode_delta, history_store, is_snapshot_version
+
+logger = logging.getLogger(__name__)
+
+# Fields copied from the current row into a history snapshot
+HISTORY_FIELDS = [
+    'title', 'description', 'preconditions', 'steps', 'expected_result', 'priority', 'test_type', 'tags'
+]
+
+
+def history_entry(testcase: dict, version: int, modified_by: str, change_note: Optional[str]) -> dict:
+    """Snapshot of a test case's current state for testcase_history"""
+    entry = {field: testcase.get(field) for field in HISTORY_FIELDS}
+    entry.update({
+        'testcase_id': testcase['id'],
+        'version': version,
+        'modified_by': modified_by,  # Supabase uses modified_by instead of changed_by
+        'change_note': change_note
+    })
+    return entry
+
+
+def _rpc_missing(e: Exception) -> bool:
+    # PostgREST: function not found in the schema cache
+    return getattr(e, 'code', None) == 'PGRST202'
+
+
+def _delta(testcase: dict, update_data: dict) -> Optional[dict]:
+    if is_snapshot_version(testcase.get('version') or 1):
+        return None
+    return encode_delta({**testcase, **update_data}, testcase)
+
+
+def _record_versions_fallback(testcases: List[dict], notes: Dict[str, Optional[str]], modified_by: str) -> Dict[str, int]:
+    # Databases without the migration: number from the history's max version
+    latest = {tc['id']: 0 for tc in testcases}
+    for record in testcase_history_collection.iter_rows_in(
+        'testcase_id', list(latest), columns=['testcase_id', 'version']
+    ):
+        latest[record['testcase_id']] = max(latest[record['testcase_id']], record.get('version') or 0)
+
+    entries = [history_entry(tc, latest[tc['id']] + 1, modified_by, notes.get(tc['id'])) for tc in testcases]
+    try:
+        testcase_history_collection.create_many(entries)
+    except Exception as e:
+        # testcase_history.tags comes with add_testcase_version_counter.sql
+        if "Could not find the 'tags' column" not in str(e):
+            raise
+        testcase_history_collection.create_many(
+            [{k: v for k, v in entry.items() if k != 'tags'} for entry in entries]
+        )
+    return {testcase_id: version + 2 for testcase_id, version in latest.items()}
+
+
+def record_versions(
+    entries: List[Tuple[dict, dict, Optional[str]]],
+    modified_by: str
+) -> Dict[str, int]:
+    """Snapshot (testcase, update_data, change_note) entries into history and bump their versions
+
+    Returns testcase_id -> the test case's new version.
+    """
+    if not entries:
+        return {}
+    notes: Dict[str, Optional[str]] = {}
+    deltas: Dict[str, Optional[dict]] = {}
+    for testcase, update_data, change_note in entries:
+        notes[testcase['id']] = change_note
+        deltas[testcase['id']] = _delta(testcase, update_data)
+
+    try:
+        rows = call_rpc('record_testcase_versions', {
+            'p_testcase_ids': list(notes),
+            'p_change_notes': list(notes.values()),
+            'p_modified_by': modified_by,
+            'p_deltas': list(deltas.values())
+        })
+        return {row['testcase_id']: row['new_version'] for row in rows}
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+        logger.warning("record_testcase_versions() is not installed; run the testcase version migrations")
+
+    versions = _record_versions_fallback([tc for tc, _, _ in entries], notes, modified_by)
+    for testcase, _, _ in entries:
+        # Rows read without a version key come from a table without the column yet
+        if 'version' in testcase:
+            testcases_collection.update(testcase['id'], {'version': versions[testcase['id']]})
+        # Fallback history numbering may not follow testcases.version
+        history_store.invalidate(testcase['id'])
+    return versions
+
+
+def _update_versions_fallback(
+    entries: List[Tuple[dict, dict, Optional[str]]],
+    modified_by: str
+) -> Dict[str, dict]:
+    # Not atomic: history first, then one UPDATE ... WHERE id IN (...) per distinct change set
+    record_versions(entries, modified_by)
+    groups: Dict[str, Tuple[dict, List[str]]] = {}
+    for testcase, update_data, _ in entries:
+        key = json.dumps(update_data, sort_keys=True, default=str)
+        groups.setdefault(key, (update_data, []))[1].append(testcase['id'])
+
+    updated: Dict[str, dict] = {}
+    for update_data, testcase_ids in groups.values():
+        for row in testcases_collection.update_where([('id', 'in', testcase_ids)], update_data):
+            updated[row['id']] = row
+    return updated
+
+
+def update_versions(
+    entries: List[Tuple[dict, dict, Optional[str]]],
+    modified_by: str
+) -> Dict[str, dict]:
+    """Apply (testcase, update_data, change_note) edits, each with its history snapshot
+
+    `testcase` is the row the edit was made against. Only update_data's keys
+    are written. A case whose version changed in the meantime is left alone
+    and is missing from the result, so callers can report a conflict.
+    Returns testcase_id -> updated row.
+    """
+    if not entries:
+        return {}
+    try:
+        rows = call_rpc('update_testcases_versioned', {
+            'p_testcase_ids': [testcase['id'] for testcase, _, _ in entries],
+            'p_versions': [testcase.get('version') or 1 for testcase, _, _ in entries],
+            'p_updates': [update_data for _, update_data, _ in entries],
+            'p_change_notes': [change_note for _, _, change_note in entries],
+            'p_modified_by': modified_by,
+            'p_deltas': [_delta(testcase, update_data) for testcase, update_data, _ in entries]
+        })
+        return {row['id']: row for row in rows}
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+        logger.warning("update_testcases_versioned() is not installed; run migrations/add_versioned_testcase_update.sql")
+    return _update_versions_fallback(entries, modified_by)
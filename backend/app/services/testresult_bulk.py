@@ -0,0 +1,244 @@
+"""
+Bulk result submission for a test run
+
+A run holds one current result per test case: a submitted verdict updates
+the existing result of its case or creates one; only the fields the caller
+sent are written. Existing results are read with chunked `testcase_id IN
+(...)` queries, and each chunk is written with one UPSERT plus one bulk
+INSERT of testresult_history rows, so hundreds of verdicts cost a handful of
+round trips. New results are inserted with ON CONFLICT (testrun_id,
+testcase_id) DO NOTHING (migrations/add_testresult_run_case_unique.sql); one
+created concurrently since the read is updated instead. An UPSERT that
+fails as a whole is retried entry by entry; a failed history INSERT is
+retried on its own, so no result is written (or published) twice. Change
+events go out once both writes are done.
+"""
+import logging
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from app.db.supabase import testresult_history_collection, testresults_collection
+from app.schemas.testrun import TestResultBulkEntry
+from app.services import change_events
+from app.services.testrun_cache import testrun_cache
+from app.services.testrun_membership import get_testcase_ids
+
+logger = logging.getLogger(__name__)
+
+BULK_CHUNK_SIZE = 500
+
+RESULT_FIELDS = ['status', 'actual_result', 'comment']
+
+UNTESTED = 'untested'
+
+
+class ResultReport:
+    """Per-entry outcome of a bulk result write"""
+
+    def __init__(self):
+        self.results: List[dict] = []
+
+    def ok(self, index: int, testcase_id: str, result_id: str, status: str) -> None:
+        self.results.append({
+            'index': index, 'testcase_id': testcase_id, 'id': result_id, 'status': status, 'error': None
+        })
+
+    def error(self, index: int, message: str, testcase_id: Optional[str] = None) -> None:
+        self.results.append({
+            'index': index, 'testcase_id': testcase_id, 'id': None, 'status': 'error', 'error': message
+        })
+
+    def to_dict(self) -> dict:
+        results = sorted(self.results, key=lambda item: item['index'])
+        failed = sum(1 for item in results if item['status'] == 'error')
+        return {'succeeded': len(results) - failed, 'failed': failed, 'results': results}
+
+
+def _chunks(items: List, size: int = BULK_CHUNK_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def count_statuses(testcase_ids: Iterable[str], latest: Dict[str, dict]) -> Dict[str, int]:
+    """Latest result of each case by status; cases without one count as untested"""
+    return dict(Counter(
+        latest[testcase_id]['status'] if testcase_id in latest else UNTESTED for testcase_id in testcase_ids
+    ))
+
+
+def status_counts(testrun_id: str) -> Dict[str, int]:
+    """count_statuses() of the run's cases (cached per results version)"""
+    def count() -> Dict[str, int]:
+        latest = latest_results(testrun_id, columns=['testcase_id', 'status', 'updated_at'])
+        return count_statuses(get_testcase_ids(testrun_id), latest)
+
+    return dict(testrun_cache.get_or_compute('status_counts', testrun_id, count))
+
+
+def latest_results(
+    testrun_id: str,
+    testcase_ids: Optional[List[str]] = None,
+    columns: Optional[List[str]] = None
+) -> Dict[str, dict]:
+    """Most recent result of each case in the run (of the given cases only, if any)
+
+    columns must include testcase_id and updated_at when given.
+    """
+    latest: Dict[str, dict] = {}
+    filters = [('testrun_id', '==', testrun_id)]
+    if testcase_ids is None:
+        rows = testresults_collection.iter_rows(filters=filters, columns=columns)
+    else:
+        rows = testresults_collection.iter_rows_in('testcase_id', testcase_ids, filters=filters, columns=columns)
+    for row in rows:
+        current = latest.get(row['testcase_id'])
+        if current is None or (row.get('updated_at') or '') > (current.get('updated_at') or ''):
+            latest[row['testcase_id']] = row
+    return latest
+
+
+def _upsert(rows: List[dict], on_conflict: str = 'id', ignore_duplicates: bool = False) -> Dict[str, dict]:
+    """Written rows by testcase_id"""
+    # Rows of one request must carry the same keys, as PostgREST bulk writes require
+    groups: Dict[frozenset, List[dict]] = defaultdict(list)
+    for row in rows:
+        groups[frozenset(row)].append(row)
+    written = {}
+    for group in groups.values():
+        for row in testresults_collection.upsert_many(
+            group, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates
+        ):
+            written[row['testcase_id']] = row
+    return written
+
+
+def _write(testrun_id: str, rows: List[dict], existing: Dict[str, dict]) -> Dict[str, dict]:
+    """Update the existing result of each row's case or insert one; written rows by testcase_id
+
+    Results found to exist only now are added to `existing`.
+    """
+    updates = [{**row, 'id': existing[row['testcase_id']]['id']} for row in rows if row['testcase_id'] in existing]
+    inserts = [{**row, 'id': str(uuid.uuid4())} for row in rows if row['testcase_id'] not in existing]
+    written = _upsert(updates)
+    if not inserts:
+        return written
+
+    written.update(_upsert(inserts, on_conflict='testrun_id,testcase_id', ignore_duplicates=True))
+    raced = [row for row in inserts if row['testcase_id'] not in written]
+    if raced:
+        # Created by a concurrent submission since `existing` was read
+        current = latest_results(testrun_id, [row['testcase_id'] for row in raced])
+        existing.update(current)
+        written.update(_upsert([
+            {**row, 'id': current[row['testcase_id']]['id']} for row in raced if row['testcase_id'] in current
+        ]))
+    return written
+
+
+def _history_row(row: dict) -> dict:
+    return {
+        'testresult_id': row['id'],
+        'status': row['status'],
+        'actual_result': row.get('actual_result'),
+        'comment': row.get('comment'),
+        'executed_by': row['executed_by'],
+        'executed_at': row['executed_at']
+    }
+
+
+def _record_history(rows: List[dict]) -> None:
+    """History rows of written results; retried row by row, never re-writing the results"""
+    if not rows:
+        return
+    try:
+        testresult_history_collection.create_many([_history_row(row) for row in rows])
+        return
+    except Exception as e:
+        logger.warning(f"History insert of {len(rows)} results failed, retrying one by one: {e}")
+    for row in rows:
+        try:
+            testresult_history_collection.create(_history_row(row))
+        except Exception as e:
+            logger.error(f"History of result {row['id']} could not be recorded: {e}")
+
+
+def upsert_results(
+    testrun_id: str,
+    entries: List[Tuple[int, str, dict]],
+    executed_by: str,
+    report: ResultReport
+) -> None:
+    """Write (index, testcase_id, {status, actual_result, comment}) entries of one run
+
+    Fields missing from an entry keep their current value (null for a new result).
+    """
+    executed_at = datetime.utcnow().isoformat()
+    for chunk in _chunks(entries):
+        existing = latest_results(testrun_id, [testcase_id for _, testcase_id, _ in chunk])
+        pending = [
+            (index, {
+                'testrun_id': testrun_id,
+                'testcase_id': testcase_id,
+                **{field: fields[field] for field in RESULT_FIELDS if field in fields},
+                'executed_by': executed_by,
+                'executed_at': executed_at
+            })
+            for index, testcase_id, fields in chunk
+        ]
+
+        written: Dict[str, dict] = {}
+        errors: Dict[str, str] = {}
+        try:
+            written = _write(testrun_id, [row for _, row in pending], existing)
+        except Exception as e:
+            logger.warning(f"Bulk write of {len(pending)} results failed, retrying one by one: {e}")
+            for _, row in pending:
+                try:
+                    written.update(_write(testrun_id, [row], existing))
+                except Exception as e:
+                    errors[row['testcase_id']] = str(e)
+
+        _record_history([written[row['testcase_id']] for _, row in pending if row['testcase_id'] in written])
+
+        for index, row in pending:
+            testcase_id = row['testcase_id']
+            if testcase_id in written:
+                before = existing.get(testcase_id)
+                change_events.publish('testresult', before, written[testcase_id])
+                report.ok(index, testcase_id, written[testcase_id]['id'], 'updated' if before else 'created')
+            else:
+                report.error(index, errors.get(testcase_id, "Result was not written"), testcase_id)
+
+
+def submit_results(testrun_id: str, items: List[dict], executed_by: str) -> ResultReport:
+    """Validate and write verdicts for cases of the run"""
+    report = ResultReport()
+    members = get_testcase_ids(testrun_id)
+    entries: List[Tuple[int, str, dict]] = []
+    seen = set()
+    for index, item in enumerate(items):
+        try:
+            entry = TestResultBulkEntry(**item)
+        except ValidationError as e:
+            report.error(index, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()
+            ), item.get('testcase_id') if isinstance(item, dict) else None)
+            continue
+        if entry.testcase_id in seen:
+            report.error(index, "Duplicate testcase_id in request", entry.testcase_id)
+            continue
+        if entry.testcase_id not in members:
+            report.error(index, "Test case is not part of this test run", entry.testcase_id)
+            continue
+        seen.add(entry.testcase_id)
+        # Omitted fields are left as they are, not cleared
+        fields = entry.dict(exclude={'testcase_id'}, exclude_unset=True)
+        fields['status'] = entry.status.value
+        entries.append((index, entry.testcase_id, fields))
+
+    upsert_results(testrun_id, entries, executed_by, report)
+    return report
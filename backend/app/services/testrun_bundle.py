@@ -0,0 +1,90 @@
+"""
+Test run detail bundle
+
+Everything the run detail page needs in one response: the run, its test
+cases (projected summary columns, embedded in the junction query through
+the testcases foreign key), the latest result of each case and the status
+counters. Past the run itself it takes two queries, issued concurrently,
+however many cases the run has. Hidden (soft-deleted) cases are left out.
+
+The ETag is derived before the bundle is built, from what the bundle
+depends on: the run's updated_at, its results/membership version in
+testrun_cache and a counter of test case changes (titles and the like are
+embedded). Versions are per process, so the ETag also carries a per-process
+epoch; a restart only costs clients one full response.
+"""
+import hashlib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from app.db.supabase import testrun_testcases_collection
+from app.services import change_events
+from app.services.testresult_bulk import count_statuses, latest_results
+from app.services.testrun_cache import testrun_cache
+
+CASE_COLUMNS = ['title', 'priority', 'test_type', 'folder_id']
+RESULT_COLUMNS = ['testcase_id', 'status', 'comment', 'executed_by', 'executed_at', 'updated_at']
+
+_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='testrun-bundle')
+
+_EPOCH = uuid.uuid4().hex
+_testcases_lock = threading.Lock()
+_testcases_version = 0
+
+
+def _on_testcase_change(before: Optional[dict], after: Optional[dict]) -> None:
+    global _testcases_version
+    with _testcases_lock:
+        _testcases_version += 1
+
+
+def bundle_etag(testrun: dict) -> str:
+    """ETag of the run's bundle, to be taken before building it
+
+    A write landing during the build then makes the ETag stale, never the body.
+    """
+    testrun_id = testrun['id']
+    key = f"{_EPOCH}:{testrun_id}:{testrun.get('updated_at')}:{testrun_cache.version(testrun_id)}:{_testcases_version}"
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def _members(testrun_id: str) -> List[dict]:
+    rows = testrun_testcases_collection.iter_rows(
+        filters=[('testrun_id', '==', testrun_id)],
+        columns=['testcase_id', f"testcase:testcases({','.join(CASE_COLUMNS + ['deleted_at'])})"]
+    )
+    # Hidden cases stay in the junction table until their cascade delete removes them
+    return [row for row in rows if row.get('testcase') and not row['testcase'].get('deleted_at')]
+
+
+def build_bundle(testrun: dict) -> dict:
+    """Detail bundle of an existing run (its row as loaded by the caller)"""
+    testrun_id = testrun['id']
+    members_future = _executor.submit(_members, testrun_id)
+    results_future = _executor.submit(latest_results, testrun_id, None, RESULT_COLUMNS)
+    members = members_future.result()
+    latest = results_future.result()
+
+    testcases = []
+    for member in members:
+        testcase_id = member['testcase_id']
+        summary = member['testcase']
+        result = latest.get(testcase_id)
+        testcases.append({
+            'id': testcase_id,
+            **{column: summary.get(column) for column in CASE_COLUMNS},
+            'latest_result': {k: v for k, v in result.items() if k != 'testcase_id'} if result else None
+        })
+
+    testrun = {**testrun, 'test_case_ids': [testcase['id'] for testcase in testcases]}
+    return {
+        'testrun': testrun,
+        'testcases': testcases,
+        'status_counts': count_statuses(testrun['test_case_ids'], latest),
+        'total': len(testcases)
+    }
+
+
+change_events.subscribe('testcase', _on_testcase_change)
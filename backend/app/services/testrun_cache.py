@@ -0,0 +1,63 @@
+"""
+Per-test-run cache keyed by result version
+
+Every result write for a test run bumps that run's version (through result
+change events), so a value cached under (kind, testrun_id, version) is
+fresh by construction: a hit needs no TTL guessing and a write simply makes
+the old entry unreachable until the LRU evicts it.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services import change_events
+
+MAX_ENTRIES = 512
+
+
+class TestRunCache:
+    """LRU of per-run values, keyed by (kind, testrun_id, results version)"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._entries: 'OrderedDict[Tuple[str, str, int], Any]' = OrderedDict()
+        self._max_entries = max_entries
+
+    def version(self, testrun_id: str) -> int:
+        with self._lock:
+            return self._versions[testrun_id]
+
+    def bump(self, testrun_id: Optional[str]) -> None:
+        if not testrun_id:
+            return
+        with self._lock:
+            self._versions[testrun_id] += 1
+
+    def get_or_compute(self, kind: str, testrun_id: str, compute: Callable[[], Any]) -> Any:
+        """Return the cached value for the run's current version, computing it on a miss"""
+        with self._lock:
+            key = (kind, testrun_id, self._versions[testrun_id])
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        value = compute()
+
+        with self._lock:
+            # Only store if no write happened while computing
+            if key[2] == self._versions[testrun_id]:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def apply_change(self, before: Optional[dict], after: Optional[dict]) -> None:
+        testrun_ids = {row.get('testrun_id') for row in (before, after) if row}
+        for testrun_id in testrun_ids:
+            self.bump(testrun_id)
+
+
+testrun_cache = TestRunCache()
+change_events.subscribe('testresult', testrun_cache.apply_change)
@@ -0,0 +1,76 @@
+"""
+Clone a test run, optionally keeping only cases with given latest results
+
+The new run's membership is copied by clone_testrun_testcases() (see
+migrations/add_clone_testrun_testcases.sql) with one INSERT ... SELECT, so
+cloning costs the same number of round trips for any run size. Databases
+without the migration fall back to one projected read of the membership and
+the latest results, and bulk inserts.
+"""
+import logging
+from typing import List, Optional
+
+from app.db.supabase import call_rpc, testruns_collection
+from app.services.testresult_bulk import latest_results
+from app.services.testrun_membership import add_testcases, get_testcase_ids
+
+logger = logging.getLogger(__name__)
+
+COPIED_FIELDS = ['name', 'description', 'project_id', 'environment', 'assignee_id']
+
+
+def _rpc_missing(e: Exception) -> bool:
+    # PostgREST: function not found in the schema cache
+    return getattr(e, 'code', None) == 'PGRST202'
+
+
+def _copy_membership_fallback(source_id: str, target_id: str, statuses: Optional[List[str]]) -> int:
+    testcase_ids = sorted(get_testcase_ids(source_id))
+    if statuses is not None:
+        latest = latest_results(source_id, columns=['testcase_id', 'status', 'updated_at'])
+        testcase_ids = [
+            testcase_id for testcase_id in testcase_ids
+            if (latest[testcase_id]['status'] if testcase_id in latest else 'untested') in statuses
+        ]
+    return len(add_testcases(target_id, testcase_ids))
+
+
+def copy_membership(source_id: str, target_id: str, statuses: Optional[List[str]] = None) -> int:
+    """Add the source run's cases (with a latest status in `statuses`, if given) to the target run"""
+    try:
+        rows = call_rpc('clone_testrun_testcases', {
+            'p_source_id': source_id,
+            'p_target_id': target_id,
+            'p_statuses': statuses
+        })
+        return int(rows[0]) if rows else 0
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+        logger.warning("clone_testrun_testcases() is not installed; run migrations/add_clone_testrun_testcases.sql")
+    return _copy_membership_fallback(source_id, target_id, statuses)
+
+
+def clone_testrun(
+    source: dict,
+    statuses: Optional[List[str]] = None,
+    environment: Optional[str] = None,
+    name: Optional[str] = None
+) -> dict:
+    """Create a planned copy of a run; returns the new run with test_case_ids"""
+    data = {field: source.get(field) for field in COPIED_FIELDS}
+    data['name'] = name or f"{source['name']} ({'re-run' if statuses else 'copy'})"
+    if environment is not None:
+        data['environment'] = environment
+    data['status'] = 'planned'
+
+    testrun = testruns_collection.create(data)
+    try:
+        copy_membership(source['id'], testrun['id'], statuses)
+    except Exception:
+        # Don't leave a run with half of its cases behind
+        testruns_collection.delete(testrun['id'])
+        raise
+
+    testrun['test_case_ids'] = sorted(get_testcase_ids(testrun['id']))
+    return testrun
@@ -0,0 +1,88 @@
+"""
+Run-to-run comparison
+
+Both runs' memberships (with embedded case titles) and latest results are
+read with projected, concurrent scans and aligned by testcase_id through
+dicts (a hash join), so comparing two 20k-case runs is four paged scans and
+one linear pass.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.db.supabase import testrun_testcases_collection
+from app.services.testresult_bulk import latest_results
+
+FAILING = 'failed'
+PASSING = 'passed'
+UNTESTED = 'untested'
+CATEGORIES = ['newly_failing', 'fixed', 'still_failing', 'untested_in_head', 'added', 'removed']
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='testrun-compare')
+
+
+def _members(testrun_id: str) -> Dict[str, Optional[str]]:
+    """testcase_id -> title of every case in the run"""
+    rows = testrun_testcases_collection.iter_rows(
+        filters=[('testrun_id', '==', testrun_id)],
+        columns=['testcase_id', 'testcase:testcases(title)']
+    )
+    return {row['testcase_id']: (row.get('testcase') or {}).get('title') for row in rows}
+
+
+def _statuses(testrun_id: str) -> Dict[str, str]:
+    latest = latest_results(testrun_id, columns=['testcase_id', 'status', 'updated_at'])
+    return {testcase_id: row['status'] for testcase_id, row in latest.items()}
+
+
+def compare_runs(base_id: str, head_id: str) -> dict:
+    futures = [
+        _executor.submit(_members, base_id),
+        _executor.submit(_members, head_id),
+        _executor.submit(_statuses, base_id),
+        _executor.submit(_statuses, head_id)
+    ]
+    base_members, head_members, base_statuses, head_statuses = (future.result() for future in futures)
+
+    # Cases with a result belong to the run even if their junction row is gone
+    for members, statuses in ((base_members, base_statuses), (head_members, head_statuses)):
+        for testcase_id in statuses:
+            members.setdefault(testcase_id, None)
+
+    categories: Dict[str, List[dict]] = {category: [] for category in CATEGORIES}
+
+    def entry(testcase_id: str, base_status: Optional[str], head_status: Optional[str]) -> dict:
+        return {
+            'testcase_id': testcase_id,
+            'title': head_members.get(testcase_id) or base_members.get(testcase_id),
+            'base_status': base_status,
+            'head_status': head_status
+        }
+
+    for testcase_id in head_members:
+        head_status = head_statuses.get(testcase_id, UNTESTED)
+        if testcase_id not in base_members:
+            categories['added'].append(entry(testcase_id, None, head_status))
+            continue
+        base_status = base_statuses.get(testcase_id, UNTESTED)
+        if head_status == UNTESTED:
+            categories['untested_in_head'].append(entry(testcase_id, base_status, head_status))
+        elif head_status == FAILING:
+            category = 'still_failing' if base_status == FAILING else 'newly_failing'
+            categories[category].append(entry(testcase_id, base_status, head_status))
+        elif head_status == PASSING and base_status == FAILING:
+            categories['fixed'].append(entry(testcase_id, base_status, head_status))
+
+    for testcase_id in base_members:
+        if testcase_id not in head_members:
+            categories['removed'].append(entry(testcase_id, base_statuses.get(testcase_id, UNTESTED), None))
+
+    return {
+        'base_id': base_id,
+        'head_id': head_id,
+        'counts': {
+            'base_total': len(base_members),
+            'head_total': len(head_members),
+            **{category: len(items) for category, items in categories.items()}
+        },
+        **categories
+    }
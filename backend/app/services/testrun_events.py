@@ -0,0 +1,162 @@
+"""
+Live test run events (pub/sub behind the SSE endpoint)
+
+Result change events are reduced to small per-run messages (the changed
+result's summary plus its previous status) and handed to a backend, which
+delivers them to every stream subscribed to that run. Streams send a fresh
+status_counts() after each batch of messages; it is cached per results
+version, so a write costs at most one recount per process however many
+streams are open. Messages from other workers bump the local version too.
+
+The default "memory" backend delivers within this process. With
+EVENTS_BACKEND="redis", messages go through a Redis channel on REDIS_URL
+(the `redis` package must be installed) so streams on every worker see
+writes made on any worker.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Set
+
+from app.core.config import settings
+from app.services import change_events
+# Imported first so its listener bumps the version before streams are notified
+from app.services.testrun_cache import testrun_cache
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = 'tcms:testrun-events'
+MAX_QUEUED_EVENTS = 1000
+
+RESULT_SUMMARY_FIELDS = ['id', 'testcase_id', 'status', 'executed_by', 'executed_at']
+
+
+class Subscription:
+    """Queue of one stream, fed from any thread"""
+
+    def __init__(self, testrun_id: str, loop: asyncio.AbstractEventLoop):
+        self.testrun_id = testrun_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+
+    def _put(self, message: dict) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # A stream that can't keep up starts over from a fresh snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync', 'testrun_id': self.testrun_id})
+
+    def deliver(self, message: dict) -> None:
+        self.loop.call_soon_threadsafe(self._put, message)
+
+
+class LocalBroker:
+    """Subscriptions of this process, per test run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def subscribe(self, testrun_id: str) -> Subscription:
+        subscription = Subscription(testrun_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[testrun_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.testrun_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.testrun_id]
+
+    def has_subscribers(self, testrun_id: str) -> bool:
+        with self._lock:
+            return bool(self._subscriptions.get(testrun_id))
+
+    def dispatch(self, message: dict) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(message.get('testrun_id'), ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+
+class MemoryBackend:
+    """Delivers messages to the streams of this process only"""
+
+    def __init__(self, dispatch: Callable[[dict], None]):
+        self._dispatch = dispatch
+
+    def publish(self, message: dict) -> None:
+        self._dispatch(message)
+
+
+class RedisBackend:
+    """Fans messages out to every worker through a Redis pub/sub channel"""
+
+    def __init__(self, dispatch: Callable[[dict], None], url: str):
+        import redis  # Only needed when this backend is configured
+
+        self._dispatch = dispatch
+        self._client = redis.Redis.from_url(url)
+        self._thread = threading.Thread(target=self._listen, name='testrun-events', daemon=True)
+        self._thread.start()
+
+    def publish(self, message: dict) -> None:
+        self._client.publish(REDIS_CHANNEL, json.dumps(message, default=str))
+
+    def _listen(self) -> None:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(REDIS_CHANNEL)
+        for item in pubsub.listen():
+            try:
+                message = json.loads(item['data'])
+                # Writes on other workers never reach this process's cache listener
+                testrun_cache.bump(message.get('testrun_id'))
+                self._dispatch(message)
+            except Exception as e:
+                logger.error(f"Invalid test run event from Redis: {e}")
+
+
+def _create_backend(dispatch: Callable[[dict], None]):
+    if settings.EVENTS_BACKEND == 'redis':
+        try:
+            return RedisBackend(dispatch, settings.REDIS_URL)
+        except Exception as e:
+            logger.error(f"Redis event backend unavailable, using in-process events: {e}")
+    return MemoryBackend(dispatch)
+
+
+broker = LocalBroker()
+backend = _create_backend(broker.dispatch)
+
+
+def result_message(before: Optional[dict], after: Optional[dict]) -> Optional[dict]:
+    row = after or before
+    if not row or not row.get('testrun_id'):
+        return None
+    return {
+        'type': 'result',
+        'testrun_id': row['testrun_id'],
+        'result': {field: row.get(field) for field in RESULT_SUMMARY_FIELDS},
+        'deleted': after is None,
+        'previous_status': before.get('status') if before else None
+    }
+
+
+def _on_result_change(before: Optional[dict], after: Optional[dict]) -> None:
+    message = result_message(before, after)
+    if message is None:
+        return
+    # Without Redis, nobody outside this process can be listening
+    if isinstance(backend, MemoryBackend) and not broker.has_subscribers(message['testrun_id']):
+        return
+    backend.publish(message)
+
+
+change_events.subscribe('testresult', _on_result_change)
@@ -0,0 +1,81 @@
+"""
+Test run membership (testrun_testcases junction rows)
+
+New cases go in with one bulk INSERT ... ON CONFLICT (testrun_id,
+testcase_id) DO NOTHING per chunk, so concurrent adds of the same case
+cannot collide and adding cases costs one write whatever the run's size.
+Removed cases go out with one `testcase_id IN (...)` DELETE per chunk.
+"""
+import uuid
+from typing import Iterable, List, Set, Tuple
+
+from app.db.supabase import testrun_testcases_collection
+from app.services.testrun_cache import testrun_cache
+
+# testcase ids per `IN (...)` filter, to keep request URLs short
+ID_CHUNK_SIZE = 100
+
+
+def _unique(testcase_ids: Iterable[str]) -> List[str]:
+    """Drop duplicates, keeping the requested order"""
+    return list(dict.fromkeys(testcase_id for testcase_id in testcase_ids if testcase_id))
+
+
+def get_testcase_ids(testrun_id: str) -> Set[str]:
+    rows = testrun_testcases_collection.iter_rows(
+        filters=[('testrun_id', '==', testrun_id)],
+        columns=['testcase_id']
+    )
+    return {row['testcase_id'] for row in rows}
+
+
+def _insert(testrun_id: str, testcase_ids: List[str]) -> List[str]:
+    """Insert junction rows, skipping existing members; returns the ids inserted"""
+    if not testcase_ids:
+        return []
+    inserted = testrun_testcases_collection.upsert_many(
+        [
+            {'id': str(uuid.uuid4()), 'testrun_id': testrun_id, 'testcase_id': testcase_id}
+            for testcase_id in testcase_ids
+        ],
+        on_conflict='testrun_id,testcase_id',
+        ignore_duplicates=True
+    )
+    inserted_ids = {row['testcase_id'] for row in inserted}
+    if inserted_ids:
+        # Membership is part of the run's status counts
+        testrun_cache.bump(testrun_id)
+    return [testcase_id for testcase_id in testcase_ids if testcase_id in inserted_ids]
+
+
+def _delete(testrun_id: str, testcase_ids: List[str]) -> int:
+    removed = 0
+    for i in range(0, len(testcase_ids), ID_CHUNK_SIZE):
+        removed += testrun_testcases_collection.delete_where([
+            ('testrun_id', '==', testrun_id),
+            ('testcase_id', 'in', testcase_ids[i:i + ID_CHUNK_SIZE])
+        ])
+    if removed:
+        testrun_cache.bump(testrun_id)
+    return removed
+
+
+def add_testcases(testrun_id: str, testcase_ids: Iterable[str]) -> List[str]:
+    """Add cases that are not members yet; returns the ids actually added"""
+    return _insert(testrun_id, _unique(testcase_ids))
+
+
+def remove_testcases(testrun_id: str, testcase_ids: Iterable[str]) -> int:
+    """Remove cases from the run; returns the number of junction rows deleted"""
+    return _delete(testrun_id, _unique(testcase_ids))
+
+
+def sync_testcases(testrun_id: str, testcase_ids: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """Make the run's membership exactly testcase_ids; returns (added, removed)"""
+    requested = _unique(testcase_ids)
+    current = get_testcase_ids(testrun_id)
+    requested_set = set(requested)
+    removed = sorted(current - requested_set)
+    _delete(testrun_id, removed)
+    added = _insert(testrun_id, [testcase_id for testcase_id in requested if testcase_id not in current])
+    return added, removed
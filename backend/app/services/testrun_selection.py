@@ -0,0 +1,42 @@
+"""
+Rule-based test run membership
+
+Selection rules (folder with or without subfolders, tags, priorities, test
+types, a full-text query) are resolved on the server: the column criteria
+become filters of one projected id query (split by folder id chunks when a
+folder subtree is selected), and a full-text query is answered by the
+Postgres search index and intersected with those ids, so clients never
+download cases to filter them.
+"""
+from typing import List, Optional
+
+from app.db.supabase import testcases_collection
+from app.services.folder_tree import subtree_folder_ids
+from app.services import testcase_search
+
+
+def resolve_rules(project_id: str, rules: dict, folder: Optional[dict] = None) -> List[str]:
+    """Ids of the project's test cases matching all given rules
+
+    `folder` is the already loaded rules['folder_id'] row, if any.
+    """
+    filters = [('project_id', '==', project_id)]
+    if rules.get('tags'):
+        # AND: case has every tag (@>), OR: case has any of them (&&)
+        filters.append(('tags', 'contains' if rules.get('tag_mode', 'and') == 'and' else 'overlaps', rules['tags']))
+    if rules.get('priorities'):
+        filters.append(('priority', 'in', rules['priorities']))
+    if rules.get('test_types'):
+        filters.append(('test_type', 'in', rules['test_types']))
+
+    if folder:
+        folder_ids = subtree_folder_ids(folder) if rules.get('recursive', True) else [folder['id']]
+        rows = testcases_collection.iter_rows_in('folder_id', folder_ids, filters=filters, columns=['folder_id'])
+    else:
+        rows = testcases_collection.iter_rows(filters=filters, columns=['folder_id'])
+    testcase_ids = [row['id'] for row in rows]
+
+    if rules.get('search'):
+        matches = testcase_search.matching_ids(rules['search'], project_id)
+        testcase_ids = [testcase_id for testcase_id in testcase_ids if testcase_id in matches]
+    return testcase_ids
@@ -0,0 +1,121 @@
+"""
+Line-level diff (Myers' O(ND) algorithm)
+
+Common prefix and suffix are trimmed first and lines are interned to ints,
+so the edit-graph search only runs over the changed middle part and compares
+integers. Typical revisions of a 10 KB field differ in a few lines, where
+O(ND) is effectively linear. Only the 2d+1 live diagonals of each round are
+kept for the backtrack, and past MAX_EDIT_DISTANCE (a near-total rewrite)
+the search gives way to difflib's matcher, which is not minimal but stays
+fast on large unrelated texts.
+"""
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple
+
+EQUAL = 'equal'
+INSERT = 'insert'
+DELETE = 'delete'
+
+MAX_EDIT_DISTANCE = 500
+
+
+def _myers(a: Sequence[int], b: Sequence[int]) -> List[Tuple[str, int, int]]:
+    """Shortest edit script as (op, index in a, index in b) steps"""
+    n, m = len(a), len(b)
+    max_d = n + m
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(min(max_d, MAX_EDIT_DISTANCE) + 1):
+        # Round d only reads diagonals -d..d of the previous round
+        trace.append(v[offset - d:offset + d + 1])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, a, b, d)
+    return _matcher_steps(a, b)
+
+
+def _matcher_steps(a: Sequence[int], b: Sequence[int]) -> List[Tuple[str, int, int]]:
+    """Edit script from difflib (not necessarily the shortest), same step format as _myers"""
+    steps = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == EQUAL:
+            steps.extend((EQUAL, i1 + i, j1 + i) for i in range(i2 - i1))
+            continue
+        steps.extend((DELETE, i, j1) for i in range(i1, i2))
+        steps.extend((INSERT, i2, j) for j in range(j1, j2))
+    return steps
+
+
+def _backtrack(trace: List[List[int]], a: Sequence[int], b: Sequence[int], d_final: int):
+    x, y = len(a), len(b)
+    steps = []
+    for d in range(d_final, -1, -1):
+        # trace[d][i] is diagonal i - d
+        v = trace[d]
+        k = x - y
+        if d == 0:
+            prev_k = k
+        elif k == -d or (k != d and v[d + k - 1] < v[d + k + 1]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[d + prev_k] if d > 0 else 0
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            steps.append((EQUAL, x, y))
+        if d > 0:
+            if x == prev_x:
+                y -= 1
+                steps.append((INSERT, x, y))
+            else:
+                x -= 1
+                steps.append((DELETE, x, y))
+    steps.reverse()
+    return steps
+
+
+def diff_lines(old: Optional[str], new: Optional[str]) -> List[Dict]:
+    """Diff two texts line by line into runs of {'type', 'lines'}"""
+    a = (old or '').splitlines()
+    b = (new or '').splitlines()
+
+    prefix = 0
+    while prefix < len(a) and prefix < len(b) and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(a) - prefix and suffix < len(b) - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+
+    a_mid = a[prefix:len(a) - suffix]
+    b_mid = b[prefix:len(b) - suffix]
+    interned: Dict[str, int] = {}
+    a_ids = [interned.setdefault(line, len(interned)) for line in a_mid]
+    b_ids = [interned.setdefault(line, len(interned)) for line in b_mid]
+
+    chunks: List[Dict] = []
+
+    def emit(op: str, line: str) -> None:
+        if chunks and chunks[-1]['type'] == op:
+            chunks[-1]['lines'].append(line)
+        else:
+            chunks.append({'type': op, 'lines': [line]})
+
+    for line in a[:prefix]:
+        emit(EQUAL, line)
+    for op, x, y in _myers(a_ids, b_ids):
+        emit(op, b_mid[y] if op == INSERT else a_mid[x])
+    for line in a[len(a) - suffix:]:
+        emit(EQUAL, line)
+    return chunks
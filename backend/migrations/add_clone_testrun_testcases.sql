@@ -0,0 +1,43 @@
+-- =============================================
+-- Test Run Clone Migration
+-- =============================================
+-- This migration adds:
+-- 1. clone_testrun_testcases(): copies a run's test case membership into
+--    another run with one INSERT ... SELECT, optionally only the cases whose
+--    latest result in the source run has one of the given statuses
+--    (cases without a result count as 'untested')
+-- 2. Index for the latest-result lookup per (run, case)
+
+CREATE INDEX IF NOT EXISTS idx_testresults_run_case_updated
+ON testresults(testrun_id, testcase_id, updated_at DESC);
+
+CREATE OR REPLACE FUNCTION clone_testrun_testcases(
+    p_source_id TEXT,
+    p_target_id TEXT,
+    p_statuses TEXT[] DEFAULT NULL
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    inserted INTEGER;
+BEGIN
+    INSERT INTO testrun_testcases (id, testrun_id, testcase_id, created_at, updated_at)
+    SELECT gen_random_uuid()::text, target.id, m.testcase_id, NOW(), NOW()
+    FROM testrun_testcases m
+    CROSS JOIN (SELECT t.id FROM testruns t WHERE t.id::text = p_target_id) target
+    LEFT JOIN LATERAL (
+        SELECT r.status
+        FROM testresults r
+        WHERE r.testrun_id = m.testrun_id AND r.testcase_id = m.testcase_id
+        ORDER BY r.updated_at DESC NULLS LAST
+        LIMIT 1
+    ) latest ON TRUE
+    WHERE m.testrun_id::text = p_source_id
+      AND (p_statuses IS NULL OR COALESCE(latest.status, 'untested') = ANY(p_statuses))
+    ON CONFLICT (testrun_id, testcase_id) DO NOTHING;
+
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+    RETURN inserted;
+END;
+$$;
@@ -0,0 +1,84 @@
+-- =============================================
+-- Folder Materialized Path Migration
+-- =============================================
+-- This migration adds:
+-- 1. path column to folders: '/<root id>/<child id>/.../<own id>/', so a
+--    subtree is one prefix match (path LIKE '<folder path>%')
+-- 2. move_folder(): re-parents a folder and rewrites its subtree's paths in one transaction
+-- 3. folder_tree_counts(): all folders of a project with their direct test case counts
+-- 4. list_subtree_testcases(): test cases of a folder and all of its subfolders
+-- Required: the folder API (create, move, tree) has no fallback for databases
+-- without it
+
+ALTER TABLE folders
+ADD COLUMN IF NOT EXISTS path TEXT;
+
+-- Backfill paths from parent_id
+WITH RECURSIVE tree AS (
+    SELECT f.id, '/' || f.id::text || '/' AS path
+    FROM folders f
+    WHERE f.parent_id IS NULL
+    UNION ALL
+    SELECT f.id, tree.path || f.id::text || '/'
+    FROM folders f
+    JOIN tree ON f.parent_id = tree.id
+)
+UPDATE folders
+SET path = tree.path
+FROM tree
+WHERE folders.id = tree.id;
+
+CREATE INDEX IF NOT EXISTS idx_folders_path ON folders(path text_pattern_ops);
+
+CREATE OR REPLACE FUNCTION move_folder(p_folder_id TEXT, p_new_parent_id TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_old_path TEXT;
+    v_new_path TEXT;
+BEGIN
+    SELECT f.path INTO v_old_path FROM folders f WHERE f.id::text = p_folder_id FOR UPDATE;
+    IF p_new_parent_id IS NULL THEN
+        v_new_path := '/' || p_folder_id || '/';
+    ELSE
+        SELECT f.path || p_folder_id || '/' INTO v_new_path FROM folders f WHERE f.id::text = p_new_parent_id;
+    END IF;
+
+    IF v_new_path LIKE v_old_path || '%' THEN
+        RAISE EXCEPTION 'Cannot move folder % into its own subtree', p_folder_id;
+    END IF;
+
+    UPDATE folders
+    SET parent_id = (SELECT p.id FROM folders p WHERE p.id::text = p_new_parent_id)
+    WHERE id::text = p_folder_id;
+
+    UPDATE folders
+    SET path = v_new_path || substr(path, length(v_old_path) + 1)
+    WHERE path LIKE v_old_path || '%';
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION folder_tree_counts(p_project_id TEXT)
+RETURNS TABLE (id TEXT, name TEXT, parent_id TEXT, path TEXT, testcase_count BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT f.id::text, f.name, f.parent_id::text, f.path, COUNT(t.id)
+    FROM folders f
+    LEFT JOIN testcases t ON t.folder_id = f.id
+    WHERE f.project_id::text = p_project_id
+    GROUP BY f.id
+    ORDER BY f.path;
+$$;
+
+CREATE OR REPLACE FUNCTION list_subtree_testcases(p_folder_id TEXT)
+RETURNS SETOF testcases
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT t.*
+    FROM testcases t
+    JOIN folders f ON f.id = t.folder_id
+    WHERE f.path LIKE (SELECT root.path FROM folders root WHERE root.id::text = p_folder_id) || '%';
+$$;
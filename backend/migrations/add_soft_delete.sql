@@ -0,0 +1,61 @@
+-- =============================================
+-- Soft Delete Migration
+-- =============================================
+-- This migration adds:
+-- 1. deleted_at column to projects, testruns, testcases and folders. A
+--    delete request only sets it; the API hides such rows, and a background
+--    job removes their dependents (publishing change events for them) before
+--    deleting the row itself
+-- 2. folder_tree_counts() and list_subtree_testcases() skipping hidden
+--    folders (with their subtrees) and hidden test cases
+-- Required: the API filters every read of these tables on deleted_at
+-- Requires add_folder_paths.sql
+
+ALTER TABLE projects
+ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+ALTER TABLE testruns
+ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+ALTER TABLE testcases
+ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+ALTER TABLE folders
+ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+CREATE OR REPLACE FUNCTION folder_tree_counts(p_project_id TEXT)
+RETURNS TABLE (id TEXT, name TEXT, parent_id TEXT, path TEXT, testcase_count BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT f.id::text, f.name, f.parent_id::text, f.path, COUNT(t.id)
+    FROM folders f
+    LEFT JOIN testcases t ON t.folder_id = f.id AND t.deleted_at IS NULL
+    WHERE f.project_id::text = p_project_id
+      AND NOT EXISTS (
+          SELECT 1 FROM folders d
+          WHERE d.deleted_at IS NOT NULL
+            AND d.project_id = f.project_id
+            AND f.path LIKE d.path || '%'
+      )
+    GROUP BY f.id
+    ORDER BY f.path;
+$$;
+
+CREATE OR REPLACE FUNCTION list_subtree_testcases(p_folder_id TEXT)
+RETURNS SETOF testcases
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT t.*
+    FROM testcases t
+    JOIN folders f ON f.id = t.folder_id
+    WHERE f.path LIKE (SELECT root.path FROM folders root WHERE root.id::text = p_folder_id) || '%'
+      AND t.deleted_at IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM folders d
+          WHERE d.deleted_at IS NOT NULL
+            AND d.project_id = f.project_id
+            AND f.path LIKE d.path || '%'
+      );
+$$;
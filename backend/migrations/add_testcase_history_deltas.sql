@@ -0,0 +1,64 @@
+-- =============================================
+-- Delta-Compressed Test Case History Migration
+-- =============================================
+-- This migration adds:
+-- 1. delta column to testcase_history: reverse delta of description /
+--    preconditions / steps / expected_result against the next newer version
+--    (NULL = full snapshot; existing rows stay full snapshots). steps and
+--    expected_result become nullable, since delta rows leave them empty
+-- 2. p_deltas parameter to record_testcase_versions(); for entries with a
+--    delta the large text fields are not stored
+-- Requires add_testcase_version_counter.sql
+
+ALTER TABLE testcase_history
+ADD COLUMN IF NOT EXISTS delta JSONB;
+
+ALTER TABLE testcase_history
+ALTER COLUMN steps DROP NOT NULL,
+ALTER COLUMN expected_result DROP NOT NULL;
+
+DROP FUNCTION IF EXISTS record_testcase_versions(TEXT[], TEXT[], TEXT);
+
+-- p_deltas is a JSON array parallel to p_testcase_ids (null elements = full snapshot)
+CREATE OR REPLACE FUNCTION record_testcase_versions(
+    p_testcase_ids TEXT[],
+    p_change_notes TEXT[],
+    p_modified_by TEXT,
+    p_deltas JSONB DEFAULT NULL
+)
+RETURNS TABLE (testcase_id TEXT, new_version INTEGER)
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT ON (r.id)
+            r.id,
+            r.change_note,
+            NULLIF(p_deltas -> (r.ord - 1)::int, 'null'::jsonb) AS delta
+        FROM unnest(p_testcase_ids, p_change_notes) WITH ORDINALITY AS r(id, change_note, ord)
+    ),
+    bumped AS (
+        UPDATE testcases tc
+        SET version = COALESCE(tc.version, 1) + 1
+        FROM requested r
+        WHERE tc.id::text = r.id
+        RETURNING tc.id, tc.version, tc.title, tc.description, tc.preconditions, tc.steps,
+                  tc.expected_result, tc.priority, tc.test_type, tc.tags, r.change_note, r.delta
+    ),
+    history AS (
+        INSERT INTO testcase_history (
+            id, testcase_id, version, title, description, preconditions, steps,
+            expected_result, priority, test_type, tags, modified_by, change_note, delta
+        )
+        SELECT gen_random_uuid()::text, b.id, b.version - 1, b.title,
+               CASE WHEN b.delta IS NULL THEN b.description END,
+               CASE WHEN b.delta IS NULL THEN b.preconditions END,
+               CASE WHEN b.delta IS NULL THEN b.steps END,
+               CASE WHEN b.delta IS NULL THEN b.expected_result END,
+               b.priority, b.test_type, b.tags,
+               (SELECT u.id FROM users u WHERE u.id::text = p_modified_by),
+               b.change_note, b.delta
+        FROM bumped b
+        RETURNING 1
+    )
+    SELECT b.id::text, b.version FROM bumped b;
+$$;
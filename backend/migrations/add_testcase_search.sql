@@ -0,0 +1,126 @@
+-- =============================================
+-- Test Case Full-Text Search Migration
+-- =============================================
+-- This migration adds:
+-- 1. pg_trgm and a trigram GIN index over the searchable text of a test case
+--    (title, tags, description, steps, expected result), so substring
+--    queries work for Korean (no spaces between morphemes, no stemming
+--    needed) as well as Latin text without scanning the table
+-- 2. search_testcases(): ranked, paginated search; every query word must
+--    occur in the case, title and tag matches rank first
+-- 3. search_testcase_ids(): ids of every matching case, for selection rules
+-- Replaces the in-memory search index of the API
+-- Requires add_soft_delete.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Declared IMMUTABLE so it can back an expression index (array_to_string is only STABLE)
+CREATE OR REPLACE FUNCTION testcase_search_text(
+    p_title TEXT,
+    p_tags TEXT[],
+    p_description TEXT,
+    p_steps TEXT,
+    p_expected_result TEXT
+)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT lower(concat_ws(' ', p_title, array_to_string(p_tags, ' '), p_description, p_steps, p_expected_result));
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_testcases_search_trgm ON testcases
+USING GIN (testcase_search_text(title, tags, description, steps, expected_result) gin_trgm_ops);
+
+-- LIKE patterns ('%word%') of the query's words; _ and % are escaped
+CREATE OR REPLACE FUNCTION testcase_search_patterns(p_query TEXT)
+RETURNS TEXT[]
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT COALESCE(array_agg(DISTINCT '%' || replace(replace(w, '%', '\%'), '_', '\_') || '%'), '{}')
+    FROM regexp_split_to_table(lower(p_query), '[^[:alnum:]_]+') AS w
+    WHERE w <> '';
+$$;
+
+-- One `text LIKE pattern` condition per word, so each one can use the trigram index
+CREATE OR REPLACE FUNCTION testcase_search_where(p_pattern_count INTEGER)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT string_agg(
+        format('testcase_search_text(t.title, t.tags, t.description, t.steps, t.expected_result) LIKE ($1)[%s]', i),
+        ' AND '
+    )
+    FROM generate_series(1, p_pattern_count) AS i;
+$$;
+
+CREATE OR REPLACE FUNCTION search_testcases(
+    p_query TEXT,
+    p_project_id TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 20,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    id TEXT, project_id TEXT, folder_id TEXT, title TEXT, priority TEXT, test_type TEXT,
+    score REAL, total BIGINT
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_patterns TEXT[] := testcase_search_patterns(p_query);
+BEGIN
+    IF cardinality(v_patterns) = 0 THEN
+        RETURN;
+    END IF;
+    RETURN QUERY EXECUTE format(
+        'SELECT t.id::text, t.project_id::text, t.folder_id::text, t.title, t.priority, t.test_type,
+                ((CASE WHEN lower(t.title) LIKE ALL ($1) THEN 3 ELSE 0 END)
+                 + (CASE WHEN lower(array_to_string(t.tags, '' '')) LIKE ALL ($1) THEN 2 ELSE 0 END)
+                 + word_similarity(lower($2),
+                     testcase_search_text(t.title, t.tags, t.description, t.steps, t.expected_result)))::real AS score,
+                count(*) OVER () AS total
+         FROM testcases t
+         WHERE t.deleted_at IS NULL
+           AND ($3::text IS NULL OR t.project_id::text = $3)
+           AND %s
+         ORDER BY score DESC, t.id
+         LIMIT $4 OFFSET $5',
+        testcase_search_where(cardinality(v_patterns))
+    ) USING v_patterns, p_query, p_project_id, p_limit, p_offset;
+END;
+$$;
+
+-- Keyset-paginated on id (p_after = last id of the previous page), as
+-- PostgREST caps the rows of one response
+CREATE OR REPLACE FUNCTION search_testcase_ids(
+    p_query TEXT,
+    p_project_id TEXT DEFAULT NULL,
+    p_after TEXT DEFAULT NULL,
+    p_limit INTEGER DEFAULT 1000
+)
+RETURNS TABLE (id TEXT)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_patterns TEXT[] := testcase_search_patterns(p_query);
+BEGIN
+    IF cardinality(v_patterns) = 0 THEN
+        RETURN;
+    END IF;
+    RETURN QUERY EXECUTE format(
+        'SELECT t.id::text
+         FROM testcases t
+         WHERE t.deleted_at IS NULL
+           AND ($2::text IS NULL OR t.project_id::text = $2)
+           AND ($3::text IS NULL OR t.id::text > $3)
+           AND %s
+         ORDER BY t.id::text
+         LIMIT $4',
+        testcase_search_where(cardinality(v_patterns))
+    ) USING v_patterns, p_project_id, p_after, p_limit;
+END;
+$$;
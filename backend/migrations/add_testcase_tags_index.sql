@@ -0,0 +1,8 @@
+-- =============================================
+-- Test Case Tags Index Migration
+-- =============================================
+-- This migration adds:
+-- 1. GIN index on testcases.tags so that tag filters
+--    (tags @> '{a,b}' for AND, tags && '{a,b}' for OR) do not scan the table
+
+CREATE INDEX IF NOT EXISTS idx_testcases_tags ON testcases USING GIN (tags);
@@ -0,0 +1,69 @@
+-- =============================================
+-- Test Case Version Counter Migration
+-- =============================================
+-- This migration adds:
+-- 1. Backfill of testcases.version from existing history (current = last history version + 1)
+-- 2. change_note and tags columns to testcase_history (written by the API)
+-- 3. record_testcase_versions() RPC that bumps the counter and writes the
+--    history snapshot in one statement, so concurrent edits cannot allocate
+--    the same version and the API never has to read the history to number it
+
+ALTER TABLE testcases
+ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1;
+
+ALTER TABLE testcase_history
+ADD COLUMN IF NOT EXISTS change_note TEXT;
+
+ALTER TABLE testcase_history
+ADD COLUMN IF NOT EXISTS tags TEXT[];
+
+-- Backfill: history versions 1..n are snapshots of earlier states, the live row is n + 1
+UPDATE testcases tc
+SET version = COALESCE(
+    (SELECT MAX(h.version) FROM testcase_history h WHERE h.testcase_id = tc.id),
+    0
+) + 1;
+
+ALTER TABLE testcases ALTER COLUMN version SET DEFAULT 1;
+ALTER TABLE testcases ALTER COLUMN version SET NOT NULL;
+
+-- Snapshot the current state of each test case into testcase_history and
+-- increment its version. Batch-capable: p_testcase_ids and p_change_notes are
+-- parallel arrays. The UPDATE takes the row lock, so concurrent callers on the
+-- same test case are serialized and each gets its own version.
+-- Returns the version the test case has after the call.
+CREATE OR REPLACE FUNCTION record_testcase_versions(
+    p_testcase_ids TEXT[],
+    p_change_notes TEXT[],
+    p_modified_by TEXT
+)
+RETURNS TABLE (testcase_id TEXT, new_version INTEGER)
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT ON (r.id) r.id, r.change_note
+        FROM unnest(p_testcase_ids, p_change_notes) AS r(id, change_note)
+    ),
+    bumped AS (
+        UPDATE testcases tc
+        SET version = COALESCE(tc.version, 1) + 1
+        FROM requested r
+        WHERE tc.id::text = r.id
+        RETURNING tc.id, tc.version, tc.title, tc.description, tc.preconditions, tc.steps,
+                  tc.expected_result, tc.priority, tc.test_type, tc.tags, r.change_note
+    ),
+    history AS (
+        INSERT INTO testcase_history (
+            id, testcase_id, version, title, description, preconditions, steps,
+            expected_result, priority, test_type, tags, modified_by, change_note
+        )
+        -- testcase_history.id has no default; the API used to fill it in with uuid4
+        SELECT gen_random_uuid()::text, b.id, b.version - 1, b.title, b.description, b.preconditions, b.steps,
+               b.expected_result, b.priority, b.test_type, b.tags,
+               (SELECT u.id FROM users u WHERE u.id::text = p_modified_by),
+               b.change_note
+        FROM bumped b
+        RETURNING 1
+    )
+    SELECT b.id::text, b.version FROM bumped b;
+$$;
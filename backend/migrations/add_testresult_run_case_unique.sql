@@ -0,0 +1,37 @@
+-- =============================================
+-- One Result per Test Case and Run Migration
+-- =============================================
+-- This migration adds:
+-- 1. Removal of duplicate results (same testrun_id and testcase_id): the
+--    latest one by updated_at is kept and the history of the others is
+--    moved to it
+-- 2. Unique index on testresults(testrun_id, testcase_id), so concurrent
+--    submissions of a case's first verdict cannot create two results
+-- Required: result writes (POST /testresults, POST /testruns/{id}/results/bulk,
+-- JUnit ingestion) use ON CONFLICT (testrun_id, testcase_id)
+
+CREATE TEMP TABLE duplicate_testresults AS
+SELECT id, keep_id
+FROM (
+    SELECT id,
+           first_value(id) OVER (
+               PARTITION BY testrun_id, testcase_id
+               ORDER BY updated_at DESC NULLS LAST, id
+           ) AS keep_id
+    FROM testresults
+) ranked
+WHERE id <> keep_id;
+
+UPDATE testresult_history h
+SET testresult_id = d.keep_id
+FROM duplicate_testresults d
+WHERE h.testresult_id = d.id;
+
+DELETE FROM testresults t
+USING duplicate_testresults d
+WHERE t.id = d.id;
+
+DROP TABLE duplicate_testresults;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_testresults_run_case_unique
+ON testresults(testrun_id, testcase_id);
@@ -0,0 +1,81 @@
+-- =============================================
+-- Atomic Versioned Test Case Update Migration
+-- =============================================
+-- This migration adds:
+-- 1. update_testcases_versioned() RPC that applies edits to test cases and
+--    writes their history snapshots in one statement. An edit is applied only
+--    if the case still has the version it was made against, so the history
+--    delta (computed by the API from that version) always describes the row
+--    actually replaced, and a failed or conflicting edit leaves no history.
+--    Only the keys present in each edit are written.
+-- Requires add_testcase_version_counter.sql and add_testcase_history_deltas.sql
+
+-- p_versions, p_change_notes, p_updates (JSON array of objects) and p_deltas
+-- (JSON array, null elements = full snapshot) are parallel to p_testcase_ids.
+-- Cases whose version no longer matches are skipped and missing from the result.
+CREATE OR REPLACE FUNCTION update_testcases_versioned(
+    p_testcase_ids TEXT[],
+    p_versions INTEGER[],
+    p_updates JSONB,
+    p_change_notes TEXT[],
+    p_modified_by TEXT,
+    p_deltas JSONB DEFAULT NULL
+)
+RETURNS SETOF testcases
+LANGUAGE sql
+AS $$
+    WITH requested AS (
+        SELECT DISTINCT ON (r.id)
+            r.id,
+            r.version,
+            r.change_note,
+            COALESCE(p_updates -> (r.ord - 1)::int, '{}'::jsonb) AS data,
+            NULLIF(p_deltas -> (r.ord - 1)::int, 'null'::jsonb) AS delta
+        FROM unnest(p_testcase_ids, p_versions, p_change_notes) WITH ORDINALITY AS r(id, version, change_note, ord)
+    ),
+    updated AS (
+        UPDATE testcases tc
+        SET title = CASE WHEN r.data ? 'title' THEN r.data ->> 'title' ELSE tc.title END,
+            description = CASE WHEN r.data ? 'description' THEN r.data ->> 'description' ELSE tc.description END,
+            preconditions = CASE WHEN r.data ? 'preconditions' THEN r.data ->> 'preconditions' ELSE tc.preconditions END,
+            steps = CASE WHEN r.data ? 'steps' THEN r.data ->> 'steps' ELSE tc.steps END,
+            expected_result = CASE WHEN r.data ? 'expected_result' THEN r.data ->> 'expected_result' ELSE tc.expected_result END,
+            priority = CASE WHEN r.data ? 'priority' THEN r.data ->> 'priority' ELSE tc.priority END,
+            test_type = CASE WHEN r.data ? 'test_type' THEN r.data ->> 'test_type' ELSE tc.test_type END,
+            tags = CASE
+                WHEN NOT r.data ? 'tags' THEN tc.tags
+                WHEN jsonb_typeof(r.data -> 'tags') = 'array'
+                    THEN ARRAY(SELECT jsonb_array_elements_text(r.data -> 'tags'))
+            END,
+            folder_id = CASE WHEN r.data ? 'folder_id' THEN r.data ->> 'folder_id' ELSE tc.folder_id END,
+            version = tc.version + 1,
+            updated_at = NOW()
+        FROM requested r, testcases old
+        -- The version check is re-evaluated on the locked row, so a concurrent
+        -- edit that got there first makes this one skip the case
+        WHERE tc.id::text = r.id
+          AND tc.version = r.version
+          AND old.id = tc.id
+          AND old.version = r.version
+        RETURNING tc AS new_row, old.id, old.version, old.title, old.description, old.preconditions,
+                  old.steps, old.expected_result, old.priority, old.test_type, old.tags,
+                  r.change_note, r.delta
+    ),
+    history AS (
+        INSERT INTO testcase_history (
+            id, testcase_id, version, title, description, preconditions, steps,
+            expected_result, priority, test_type, tags, modified_by, change_note, delta
+        )
+        SELECT gen_random_uuid()::text, u.id, u.version, u.title,
+               CASE WHEN u.delta IS NULL THEN u.description END,
+               CASE WHEN u.delta IS NULL THEN u.preconditions END,
+               CASE WHEN u.delta IS NULL THEN u.steps END,
+               CASE WHEN u.delta IS NULL THEN u.expected_result END,
+               u.priority, u.test_type, u.tags,
+               (SELECT usr.id FROM users usr WHERE usr.id::text = p_modified_by),
+               u.change_note, u.delta
+        FROM updated u
+        RETURNING 1
+    )
+    SELECT (u.new_row).* FROM updated u;
+$$;